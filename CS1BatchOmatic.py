@@ -0,0 +1,229 @@
+'''
+The CS1BatchOmatic module is a headless (no GUI) engine for running the same
+operation over every GradeSheet.txt in a lab directory at once, such as
+retroactively replacing comments, prettifying, or sorting comments.
+
+GradeSheets are independent of one another, so the parsing, transforming and
+writing of each one is fanned out to a pool of worker processes. Each
+GradeSheet produces a BatchResult, with whether it changed and how long it took.
+
+Usage (from the terminal):
+    python3 CS1BatchOmatic.py /grading-cs1/lab02 prettify
+    python3 CS1BatchOmatic.py /grading-cs1/lab02 replace "old comment" "new comment"
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import os, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import CS1GradeOmaticUtils as gom_utils
+from CS1GradeSheet import GradeSheet
+from CS1FileTransaction import atomic_write
+
+__all__ = ['BatchOmatic', 'BatchResult', 'process_gradesheet']
+
+#############################
+###      OPERATIONS       ###
+#############################
+# Each operation takes a GradeSheet filename (plus any extra args) and returns
+# a pair: (new GradeSheet text to write or None if nothing to write, any extra data)
+
+def _op_replace(fname:str, pairs=()) -> tuple:
+    ''' Retroactively replaces each (old, new) comment pair in the GradeSheet at fname.
+    Same rules as the Rubric-O-Matic: only returns text to write if something was
+    found, and if there wasn't *significant* data loss (more than 50% characters lost).
+    '''
+    gradesheet = GradeSheet.parse_gradesheet_fromfile(fname)
+    len_gs_orig = len(str(gradesheet))
+    found = False
+    for (former_cmnt, new_cmnt) in pairs:
+        found = gradesheet.replace_comment(former_cmnt, new_cmnt) or found
+    new_txt = str(gradesheet)
+    if found and len_gs_orig//2 < len(new_txt):
+        return (new_txt, found)
+    return (None, found)
+
+def _op_prettify(fname:str) -> tuple:
+    ''' Prettifies the comments section of the GradeSheet at fname.
+    '''
+    gs_txt = gom_utils.read_str_file(fname)
+    new_txt = GradeSheet.prettify_str(gs_txt)
+    return (new_txt if new_txt != gs_txt else None, None)
+
+def _op_sort(fname:str) -> tuple:
+    ''' Sorts the comments section of the GradeSheet at fname.
+    '''
+    gs_txt = gom_utils.read_str_file(fname)
+    new_txt = GradeSheet.sort_str(gs_txt)
+    return (new_txt if new_txt != gs_txt else None, None)
+
+def _op_comments(fname:str) -> tuple:
+    ''' Read-only: parses the GradeSheet at fname and returns its top-level
+    comments as [severity, filename, text] lists (see CS1CommentIndex).
+    '''
+    gradesheet = GradeSheet.parse_gradesheet_fromfile(fname)
+    return (None, [[c.severity, c.filename, c.text] for c in gradesheet.comments])
+
+OPERATIONS = {'replace': _op_replace, 'prettify': _op_prettify, 'sort': _op_sort, 'comments': _op_comments}
+
+#############################
+###   BATCHRESULT CLASS   ###
+#############################
+class BatchResult:
+    ''' The outcome of running one operation on one GradeSheet.
+    '''
+    __slots__ = ['fname', 'changed', 'written', 'error', 'seconds', 'data']
+
+    def __init__(self, fname:str):
+        ''' Creates an empty result for the GradeSheet at fname
+        >>> r = BatchResult('lab02/student1/GradeSheet.txt')
+        >>> [r.changed, r.written, r.error]
+        [False, False, '']
+        '''
+        self.fname = fname
+        self.changed = False # operation produced different text
+        self.written = False # different text was written to file
+        self.error = '' # error message, if the operation failed
+        self.seconds = 0.0 # time to read, transform and write
+        self.data = None # any extra data the operation returns
+
+    @property
+    def subdir(self) -> str:
+        ''' Returns the student subdirectory name of this result.
+        >>> BatchResult('lab02/student1/GradeSheet.txt').subdir
+        'student1'
+        '''
+        return gom_utils.get_filename(gom_utils.get_filepath(self.fname))
+
+    def __repr__(self):
+        ''' Short representation of this result, mostly for printing.
+        >>> BatchResult('lab02/student1/GradeSheet.txt')
+        <BatchResult student1: unchanged>
+        '''
+        status = 'ERROR ' + self.error if self.error else ('changed' if self.changed else 'unchanged')
+        return '<BatchResult ' + self.subdir + ': ' + status + '>'
+
+def process_gradesheet(fname:str, operation:str, args=(), write=True) -> BatchResult:
+    ''' Runs the operation on the single GradeSheet at fname, writing it back to
+    file if it changed (and write is True). Needs to be a module-level function
+    so worker processes can run it.
+    >>> r = process_gradesheet('test/GradeSheet-fixprettify.txt', 'prettify', write=False)
+    >>> [r.changed, r.written, r.error]
+    [True, False, '']
+    >>> process_gradesheet('test/does-not-exist.txt', 'prettify').error
+    'FileNotFoundError'
+    '''
+    start = time.perf_counter()
+    result = BatchResult(fname)
+    try:
+        (new_txt, result.data) = OPERATIONS[operation](fname, *args)
+        result.changed = new_txt is not None
+        if result.changed and write:
+            atomic_write(fname, new_txt) # never leave a half-written GradeSheet
+            result.written = True
+    except Exception as e: # one bad GradeSheet shouldn't stop the whole batch
+        result.error = type(e).__name__
+    result.seconds = time.perf_counter() - start
+    return result
+
+#############################
+###   BATCHOMATIC CLASS   ###
+#############################
+class BatchOmatic:
+    ''' Runs operations over all GradeSheets in a lab directory, in parallel.
+    '''
+    __slots__ = ['_labdir', '_workers', '_elapsed']
+
+    def __init__(self, lab_directory:str, workers=gom_utils.BATCH_WORKERS):
+        ''' Creates a batch engine for the given lab directory, using the given
+        number of worker processes (None uses the number of CPUs).
+        >>> bom = BatchOmatic('test', 1)
+        >>> bom.workers
+        1
+        '''
+        self._labdir = lab_directory
+        self._workers = workers if workers else (os.cpu_count() or 1)
+        self._elapsed = 0.0
+
+    def gradesheet_files(self, subdirs=None) -> list:
+        ''' Returns the GradeSheet.txt filepath for each student subdirectory
+        (all of the lab directory's subdirectories, if subdirs not given)
+        >>> BatchOmatic('test').gradesheet_files(['test/student1'])
+        ['test/student1/GradeSheet.txt']
+        '''
+        if subdirs is None:
+            subdirs = gom_utils.list_subdirs(self._labdir)
+        return [gom_utils.format_filename(sd, gom_utils.FILENAME_GS) for sd in subdirs]
+
+    def iter_run(self, operation:str, *args, subdirs=None, write=True):
+        ''' Runs operation over each GradeSheet, yielding each BatchResult as it
+        finishes (not necessarily in subdirectory order).
+        '''
+        if operation not in OPERATIONS:
+            raise ValueError('BatchOmatic: unknown operation ' + str(operation))
+        fnames = self.gradesheet_files(subdirs)
+        start = time.perf_counter()
+        if self._workers == 1 or len(fnames) < gom_utils.BATCH_MIN_PARALLEL:
+            # not worth starting up worker processes
+            for fname in fnames:
+                yield process_gradesheet(fname, operation, args, write)
+        else:
+            with ProcessPoolExecutor(max_workers=self._workers) as pool:
+                futures = [pool.submit(process_gradesheet, fname, operation, args, write) for fname in fnames]
+                for future in as_completed(futures):
+                    yield future.result()
+        self._elapsed = time.perf_counter() - start
+
+    def run(self, operation:str, *args, subdirs=None, write=True) -> list:
+        ''' Runs operation over each GradeSheet, returning the list of BatchResults
+        in subdirectory order.
+        >>> BatchOmatic('test', 1).run('prettify', subdirs=[])
+        []
+        '''
+        results = list(self.iter_run(operation, *args, subdirs=subdirs, write=write))
+        return sorted(results, key=lambda r: r.fname)
+
+    @staticmethod
+    def summarize(results:list) -> str:
+        ''' Returns a one-line summary of a list of BatchResults.
+        >>> r1 = BatchResult('a/s1/GradeSheet.txt'); r1.changed = True
+        >>> r2 = BatchResult('a/s2/GradeSheet.txt'); r2.error = 'ValueError'
+        >>> BatchOmatic.summarize([r1, r2])
+        '2 GradeSheets: 1 changed, 0 written, 1 errors'
+        '''
+        changed = sum(1 for r in results if r.changed)
+        written = sum(1 for r in results if r.written)
+        errors = sum(1 for r in results if r.error)
+        return str(len(results)) + ' GradeSheets: ' + str(changed) + ' changed, ' + str(written) + ' written, ' + str(errors) + ' errors'
+
+    #############################
+    ###      PROPERTIES      ###
+    @property
+    def workers(self) -> int:
+        ''' Returns the number of worker processes this engine uses '''
+        return self._workers
+
+    @property
+    def elapsed(self) -> float:
+        ''' Returns the wall-clock seconds the last (completed) run took '''
+        return self._elapsed
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 3 or sys.argv[2] not in OPERATIONS:
+        print("Usage: python3 CS1BatchOmatic.py LAB_DIRECTORY [" + '|'.join(OPERATIONS) + "] [OLD NEW ...]")
+        print("-=-=- Doctests of basic functions -=-=-")
+        import doctest
+        doctest.testmod()
+        sys.exit()
+
+    bom = BatchOmatic(sys.argv[1])
+    op_args = ()
+    if sys.argv[2] == 'replace': # pairs of old, new comments
+        op_args = (list(zip(sys.argv[3::2], sys.argv[4::2])),)
+    results = bom.run(sys.argv[2], *op_args)
+    for res in results:
+        print(res, '%.3fs' % res.seconds)
+    print(BatchOmatic.summarize(results), 'in %.2fs' % bom.elapsed)
@@ -0,0 +1,64 @@
+'''
+The CS1Benchmarks module holds micro-benchmarks for the Grade-O-Matic's hot
+paths, to check how they scale with the size of their input.
+
+Usage (from the terminal):
+    python3 CS1Benchmarks.py
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import timeit
+import CS1GradeOmaticUtils as gom_utils
+from CS1GradeSheet import GradeSheet
+
+# One sentence of a (made-up) grader paragraph pasted from the autograder,
+# with the file & function names that split_by_chars shouldn't split on.
+PARAGRAPH = "See TestResults.txt for details, AutoComplete._init_() fails on empty input. "
+# Autograder output also has long runs without any spaces (rules, tracebacks, paths)
+UNSPACED = "=====test_match_words.FAILED;AutoComplete.py:42!"
+SIZES = [1000, 2000, 4000, 8000, 16000]
+
+def make_paragraph(num_chars:int, sentence=PARAGRAPH) -> str:
+    ''' Returns an un-bulleted grader paragraph of num_chars characters, made by
+    repeating the given sentence
+    >>> len(make_paragraph(100))
+    100
+    >>> make_paragraph(10, 'abc')
+    'abcabcabca'
+    '''
+    return (sentence * (num_chars//len(sentence) + 1))[:num_chars]
+
+def time_per_size(func, sizes=SIZES, sentence=PARAGRAPH, repeat=5) -> list:
+    ''' Returns the best-of-repeat seconds func takes for an input of each size
+    '''
+    times = []
+    for size in sizes:
+        paragraph = make_paragraph(size, sentence)
+        times.append(min(timeit.repeat(lambda: func(paragraph), number=1, repeat=repeat)))
+    return times
+
+def report(name:str, sizes:list, times:list):
+    ''' Prints a table of input size vs. time. For a linear-time function,
+    the time per character stays (roughly) the same as the input grows.
+    '''
+    print('-=-=-', name, '-=-=-')
+    print('%10s %12s %14s' % ('chars', 'ms', 'us/char'))
+    for (size, t) in zip(sizes, times):
+        print('%10d %12.3f %14.4f' % (size, t*1000, t*1e6/size))
+
+def bench_split_by_chars():
+    ''' Scaling of GradeSheet.split_by_chars against paragraph length '''
+    report('GradeSheet.split_by_chars: paragraph', SIZES, time_per_size(GradeSheet.split_by_chars))
+    report('GradeSheet.split_by_chars: no spaces', SIZES, time_per_size(GradeSheet.split_by_chars, sentence=UNSPACED))
+
+def bench_format_comment():
+    ''' Scaling of gom_utils.format_comment (line wrapping) against comment length '''
+    report('gom_utils.format_comment: paragraph', SIZES, time_per_size(gom_utils.format_comment))
+    report('gom_utils.format_comment: no spaces', SIZES, time_per_size(gom_utils.format_comment, sentence=UNSPACED))
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    bench_split_by_chars()
+    bench_format_comment()
@@ -0,0 +1,338 @@
+'''
+The CommentIndex module keeps an inverted index of the grader comments in every
+GradeSheet of a lab directory: each (lowercased) word maps to the student
+subdirectories, and comment positions within them, where that word appears.
+
+This lets questions like "which students got this rubric item?" and the
+Rubric-O-Matic's retroactive replacement only look at the GradeSheets that
+could possibly have the comment, rather than parsing the whole cohort.
+The index is saved alongside the lab (see gom_utils.FILENAME_CMNT_INDEX) and
+only GradeSheets modified since they were indexed get re-parsed. Just each
+GradeSheet's comments are saved; the word -> student postings are rebuilt
+from them when it's loaded.
+
+Like GradeSheet.replace_comment, only top-level comments are indexed.
+It's safe to share between threads.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import os, json, threading
+import CS1GradeOmaticUtils as gom_utils
+from CS1FileTransaction import atomic_write
+from CS1GradeSheet import GradeSheet, Comment
+from CS1Similarity import match_matrix
+
+__all__ = ['CommentIndex']
+
+#############################
+###  COMMENTINDEX CLASS   ###
+#############################
+class CommentIndex:
+    ''' Inverted index of token -> {subdir: [comment positions]} for a lab directory.
+    '''
+    __slots__ = ['_labdir', '_sheets', '_postings', '_dirty', '_lock']
+
+    VERSION = 2 # bump if the saved format changes
+
+    def __init__(self, lab_directory:str, load=True):
+        ''' Creates an index for the given lab directory, loading the saved index
+        from the lab directory if there is one (and load is True).
+        >>> ci = CommentIndex('test', load=False)
+        >>> len(ci)
+        0
+        '''
+        self._labdir = lab_directory
+        self._sheets = {} # subdir -> {'mtime': float, 'comments': [[sev, fname, text], ...]}
+        self._postings = {} # token -> {subdir: [positions]}
+        self._dirty = False # changed since loading/saving?
+        self._lock = threading.RLock() # refreshed from the Rubric-O-Matic's background jobs, too
+        if load:
+            self.load()
+
+    #############################
+    ###       UPDATING        ###
+    def update(self, subdir:str, comments:list, mtime=0.0):
+        ''' (Re-)indexes the given student subdir (name, not full path) to have the given
+        comments, a list of Comments or [severity, filename, text] lists.
+        >>> ci = CommentIndex('test', load=False)
+        >>> ci.update('student1', [['++', '', 'Great work!'], ['-', 'intro.py', 'Needs comments']])
+        >>> ci.postings('great')
+        {'student1': [0]}
+        >>> ci.update('student1', [['-', 'intro.py', 'Needs comments']])
+        >>> ci.postings('great')
+        {}
+        '''
+        with self._lock:
+            self.remove(subdir)
+            triples = [[c.severity, c.filename, c.text] if isinstance(c, Comment) else list(c) for c in comments]
+            self._sheets[subdir] = {'mtime': mtime, 'comments': triples}
+            self._add_postings(subdir, triples)
+            self._dirty = True
+
+    def _add_postings(self, subdir:str, triples:list):
+        ''' Adds each word of the subdir's comments to the postings '''
+        for pos in range(len(triples)):
+            for token in set(triples[pos][2].lower().split()):
+                self._postings.setdefault(token, {}).setdefault(subdir, []).append(pos)
+
+    def update_str(self, subdir:str, gs_txt:str, mtime=0.0):
+        ''' (Re-)indexes the given student subdir from the text of its GradeSheet.
+        >>> ci = CommentIndex('test', load=False)
+        >>> ci.update_str('student1', "GRADE SHEET FOR CS1 LAB 2\\nRequirements of this lab:\\nGrade:   A\\n\\nComments from Graders:\\n++ Great work!")
+        >>> ci.postings('work!')
+        {'student1': [0]}
+        '''
+        self.update(subdir, GradeSheet.parse_gradesheet_fromstr(gs_txt).comments, mtime)
+
+    def remove(self, subdir:str):
+        ''' Removes the given student subdir from the index, if it's there.
+        '''
+        with self._lock:
+            old = self._sheets.pop(subdir, None)
+            if not old:
+                return
+            self._dirty = True
+            for triple in old['comments']:
+                for token in set(triple[2].lower().split()):
+                    posting = self._postings.get(token)
+                    if posting and subdir in posting:
+                        del posting[subdir]
+                        if not posting:
+                            del self._postings[token]
+
+    def stale(self, subdirs:list) -> list:
+        ''' Returns the (full path) subdirs whose GradeSheet changed since it was indexed.
+        Subdirs that no longer have a GradeSheet are removed from the index.
+        '''
+        with self._lock:
+            to_update = []
+            for sd in subdirs:
+                name = gom_utils.get_filename(sd)
+                try:
+                    mtime = os.stat(gom_utils.format_filename(sd, gom_utils.FILENAME_GS)).st_mtime
+                except FileNotFoundError:
+                    self.remove(name)
+                    continue
+                if name not in self._sheets or self._sheets[name]['mtime'] != mtime:
+                    to_update.append(sd)
+            return to_update
+
+    def refresh(self, subdirs:list, workers=gom_utils.BATCH_WORKERS, save=True) -> int:
+        ''' Brings the index up to date for the given (full path) subdirs, re-parsing
+        only GradeSheets modified since they were indexed (in parallel, via the BatchOmatic).
+        Saves the index if anything changed (and save is True). Returns the number of
+        re-indexed GradeSheets.
+        '''
+        from CS1BatchOmatic import BatchOmatic # avoid circular import
+        to_update = self.stale(subdirs)
+        if not to_update:
+            return 0
+        results = BatchOmatic(self._labdir, workers).run('comments', subdirs=to_update, write=False) # (not locked, can be slow)
+        with self._lock:
+            for res in results:
+                if res.error:
+                    print("CommentIndex:: refresh: could not parse", res.fname, res.error)
+                    self.remove(res.subdir)
+                else:
+                    self.update(res.subdir, res.data, os.stat(res.fname).st_mtime)
+        if save:
+            self.save()
+        return len(to_update)
+
+    #############################
+    ###       SEARCHING       ###
+    def postings(self, token:str) -> dict:
+        ''' Returns {subdir: [comment positions]} for a single (lowercased) word.
+        '''
+        return self._postings.get(token.lower(), {})
+
+    def find(self, cmnt:str) -> dict:
+        ''' Returns {subdir: [comment positions]} of the comments that
+        GradeSheet.replace_comment(cmnt, ...) would replace: every 'exact match'
+        (same severity and containing the text), or if a GradeSheet has none of those,
+        its first 'loose match'.
+        >>> ci = CommentIndex('test', load=False)
+        >>> ci.update('s1', [['++', '', 'Great work! Nice job.'], ['-', '', 'Needs more comments in the code']])
+        >>> ci.update('s2', [['-', '', 'Needs more comments in your code']])
+        >>> ci.update('s3', [['++', '', 'Great work!']])
+        >>> ci.find('++ Great work!')
+        {'s1': [0], 's3': [0]}
+        >>> ci.find('- Needs more comments in the code')
+        {'s1': [1], 's2': [0]}
+        >>> ci.find('~ Something nobody said')
+        {}
+        '''
+        return self.find_many([cmnt])[0]
+
+    def find_many(self, cmnts:list) -> list:
+        ''' Returns find(cmnt) for each of the given comments (e.g., a whole rubric).
+        The loose matches are all scored together, in one match_matrix of
+        these comments against every distinct candidate comment text in the lab.
+        >>> ci = CommentIndex('test', load=False)
+        >>> ci.update('s1', [['++', '', 'Great work! Nice job.'], ['-', '', 'Needs more comments in the code']])
+        >>> ci.update('s2', [['-', '', 'Needs more comments in your code']])
+        >>> ci.find_many(['- Needs more comments in the code', '+ Nice job.', '~ Nope'])
+        [{'s1': [1], 's2': [0]}, {}, {}]
+        '''
+        with self._lock:
+            ocs = [Comment(c, GradeSheet.code_loc(c)>=0, GradeSheet.get_indent(c)) for c in cmnts] # same as replace_comment
+            found = [{} for oc in ocs]
+            loose = [] # (which comment, subdir, positions) without an exact match
+            for (i, oc) in enumerate(ocs):
+                for (subdir, positions) in self._candidates(oc.text).items():
+                    triples = self._sheets[subdir]['comments']
+                    exact = [p for p in positions if triples[p][0] == oc.severity and oc.text in triples[p][2]]
+                    if exact:
+                        found[i][subdir] = exact
+                    else:
+                        loose.append((i, subdir, positions))
+
+            if loose: # Comment._loose_equals, for every (comment, candidate) pair at once
+                rows = sorted(set(i for (i, sd, ps) in loose))
+                row_of = {i: r for (r, i) in enumerate(rows)}
+                cols = sorted(set(self._sheets[sd]['comments'][p][2] for (i, sd, ps) in loose for p in ps))
+                col_of = {txt: c for (c, txt) in enumerate(cols)}
+                percents = match_matrix([ocs[i].text for i in rows], cols)
+                for (i, subdir, positions) in loose:
+                    triples = self._sheets[subdir]['comments']
+                    row = percents[row_of[i]]
+                    for p in positions:
+                        if row[col_of[triples[p][2]]] > gom_utils.LOOSE_MATCH:
+                            found[i][subdir] = [p]
+                            break
+            return [dict(sorted(f.items())) for f in found]
+
+    def students_with(self, cmnt:str) -> list:
+        ''' Returns the (sorted) student subdirs that have the given comment
+        (by the same matching rules as find())
+        >>> ci = CommentIndex('test', load=False)
+        >>> ci.update('s1', [['++', '', 'Great work!']])
+        >>> ci.students_with('++ Great work!')
+        ['s1']
+        '''
+        return list(self.find(cmnt))
+
+    def comments(self, subdir:str) -> list:
+        ''' Returns the indexed [severity, filename, text] comments of the given
+        student subdir (name, not full path), or [] if it isn't indexed.
+        >>> ci = CommentIndex('test', load=False)
+        >>> ci.update('s1', [['++', '', 'Great work!']])
+        >>> [ci.comments('s1'), ci.comments('s2')]
+        [[['++', '', 'Great work!']], []]
+        '''
+        sheet = self._sheets.get(subdir)
+        return [list(triple) for triple in sheet['comments']] if sheet else []
+
+    def _candidates(self, txt:str) -> dict:
+        ''' Returns {subdir: sorted positions} of every comment that *could* match txt
+        exactly (contains it) or loosely (shares words with it). Never misses a match,
+        but may include extra comments (find() checks each one).
+        '''
+        tokens = txt.lower().split()
+        if ' ' not in txt or not tokens: # letter-based matching, can't narrow it down
+            return {sd: list(range(len(sheet['comments']))) for (sd, sheet) in self._sheets.items()}
+
+        pairs = set()
+        # Contains the text: first word can be the end of a word, last word the start of a word
+        if len(tokens) == 1:
+            postings = [self._matching_postings(lambda t: tokens[0] in t)]
+        else:
+            postings = [self._matching_postings(lambda t: t.endswith(tokens[0]))]
+            postings += [self._postings.get(t, {}) for t in tokens[1:-1]]
+            postings.append(self._matching_postings(lambda t: t.startswith(tokens[-1])))
+        exact = None
+        for posting in postings:
+            in_posting = set((sd, p) for (sd, ps) in posting.items() for p in ps)
+            exact = in_posting if exact is None else exact & in_posting
+        pairs |= exact
+        # Shares any word: loose matches (and comments without spaces match by letter)
+        for t in set(tokens):
+            pairs |= set((sd, p) for (sd, ps) in self._postings.get(t, {}).items() for p in ps)
+        for (sd, sheet) in self._sheets.items():
+            pairs |= set((sd, p) for p in range(len(sheet['comments'])) if ' ' not in sheet['comments'][p][2])
+
+        candidates = {}
+        for (sd, p) in sorted(pairs):
+            candidates.setdefault(sd, []).append(p)
+        return candidates
+
+    def _matching_postings(self, is_match) -> dict:
+        ''' Merges the postings of every indexed token where is_match(token) is True.
+        '''
+        merged = {}
+        for (token, posting) in self._postings.items():
+            if is_match(token):
+                for (sd, ps) in posting.items():
+                    merged.setdefault(sd, set()).update(ps)
+        return merged
+
+    #############################
+    ###      LOAD / SAVE      ###
+    @property
+    def filename(self) -> str:
+        ''' Returns where this index is saved.
+        >>> CommentIndex('test', load=False).filename
+        'test/.gradeomatic-comments.json'
+        '''
+        return gom_utils.format_filename(self._labdir, gom_utils.FILENAME_CMNT_INDEX)
+
+    def load(self) -> bool:
+        ''' Loads the saved index from the lab directory (rebuilding its postings). Returns
+        False (and starts an empty index) if there isn't one, or it can't be read.
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as lab:
+        ...     ci = CommentIndex(lab, load=False)
+        ...     ci.update('student1', [['++', '', 'Great work!']])
+        ...     ci.save()
+        ...     with open(ci.filename) as f:
+        ...         saved = sorted(json.load(f))
+        ...     [saved, CommentIndex(lab).postings('great')]
+        [['sheets', 'version'], {'student1': [0]}]
+        '''
+        with self._lock:
+            self._sheets = {}
+            self._postings = {}
+            self._dirty = False
+            try:
+                with open(self.filename, 'r') as f:
+                    saved = json.load(f)
+                if saved.get('version') != CommentIndex.VERSION:
+                    raise ValueError('old version')
+                for (subdir, sheet) in saved['sheets'].items():
+                    self._sheets[subdir] = {'mtime': sheet['mtime'], 'comments': sheet['comments']}
+                    self._add_postings(subdir, sheet['comments'])
+                return True
+            except (OSError, ValueError, KeyError, TypeError, AttributeError, IndexError):
+                self._sheets = {}
+                self._postings = {}
+                return False
+
+    def save(self):
+        ''' Saves the index's GradeSheet comments to the lab directory (overwriting),
+        if anything changed.
+        '''
+        with self._lock:
+            if not self._dirty:
+                return
+            txt = json.dumps({'version': CommentIndex.VERSION, 'sheets': self._sheets})
+            self._dirty = False
+        try:
+            atomic_write(self.filename, txt)
+        except OSError as e:
+            print("CommentIndex:: save: could not save the comment index:", e)
+
+    def __contains__(self, subdir:str):
+        ''' Returns True if the student subdir (name, not full path) is indexed '''
+        return subdir in self._sheets
+
+    def __len__(self):
+        ''' Returns the number of GradeSheets in this index '''
+        return len(self._sheets)
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,81 @@
+'''
+The EditJournal module remembers each comment the Grade-O-Matic appends to the
+GradeSheet text area, and where it went, so undoing it is just deleting that
+range of text: no re-reading or re-parsing the whole GradeSheet.
+
+Each appended comment is bracketed by a pair of Tk text marks, which move
+along with any edits made elsewhere in the text. Before undoing, the journal
+checks the text between the marks is still exactly what it appended, and that
+nothing's been typed after it; if not (the grader edited by hand), undo()
+returns None and the caller falls back to parsing the comments section.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import tkinter as tk # abbrev
+
+__all__ = ['EditJournal']
+
+#############################
+###  EDITJOURNAL CLASS    ###
+#############################
+class EditJournal:
+    ''' Journal of the text appended to a tk.Text, most recent last.
+    '''
+    __slots__ = ['_text', '_edits', '_count']
+
+    MARK = 'journal' # prefix of the Tk mark names
+
+    def __init__(self, text_widget):
+        ''' Creates an empty journal for the given tk.Text
+        >>> len(EditJournal(None))
+        0
+        '''
+        self._text = text_widget
+        self._edits = [] # (start mark, end mark, appended text)
+        self._count = 0 # for unique mark names
+
+    def append(self, txt:str):
+        ''' Appends txt to the end of the text widget, and records where it went
+        '''
+        start = self._text.index(tk.END+'-1c')
+        self._text.insert(tk.END, txt)
+        (start_mark, end_mark) = (EditJournal.MARK + str(self._count) + 's', EditJournal.MARK + str(self._count) + 'e')
+        self._count += 1
+        self._text.mark_set(start_mark, start)
+        self._text.mark_gravity(start_mark, tk.RIGHT) # typing right before it isn't part of it
+        self._text.mark_set(end_mark, tk.END+'-1c')
+        self._text.mark_gravity(end_mark, tk.LEFT) # nor is typing right after it
+        self._edits.append((start_mark, end_mark, txt))
+
+    def undo(self):
+        ''' Deletes the most recently appended text, and returns it. Returns None
+        (deleting nothing) if there's nothing to undo, or the text was edited by hand
+        since it was appended: changed, or typed after.
+        '''
+        if not self._edits:
+            return None
+        (start_mark, end_mark, txt) = self._edits.pop()
+        unchanged = self._text.compare(end_mark, '==', tk.END+'-1c') and self._text.get(start_mark, end_mark) == txt
+        if unchanged:
+            self._text.delete(start_mark, end_mark)
+        self._text.mark_unset(start_mark, end_mark)
+        return txt if unchanged else None
+
+    def clear(self):
+        ''' Forgets everything appended, e.g., when the whole text is replaced
+        '''
+        for (start_mark, end_mark, txt) in self._edits:
+            self._text.mark_unset(start_mark, end_mark)
+        self._edits = []
+
+    def __len__(self):
+        ''' Returns the number of appends that could be undone '''
+        return len(self._edits)
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,253 @@
+'''
+The FileTransaction module writes a batch of GradeSheets (e.g., a Rubric-O-Matic
+retroactive replacement across a whole lab) all-or-nothing, and keeps what
+they said before so the whole batch can be undone later.
+
+Each file is written to a temporary file next to it, flushed to disk, then
+swapped in with os.replace, so a GradeSheet is only ever the old text or the
+new text, never half of each. Before anything is swapped, the original text of
+every file in the batch is saved to a pending journal, which only replaces the
+last batch's journal (.gradeomatic-journal.json in the lab directory) once
+every file's been written, so a batch that fails can't lose the undo of the
+one before. A file that's changed since it was read (e.g., the grader
+saved it while a replacement was running) isn't written, rather than losing
+those changes, and is listed in the transaction's conflicts. If any write
+fails, the files already written are put back; and rollback() undoes the last
+batch, skipping any GradeSheet someone has saved since (for the same reason).
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import os, json, tempfile
+from concurrent.futures import ThreadPoolExecutor
+import CS1GradeOmaticUtils as gom_utils
+
+__all__ = ['FileTransaction', 'atomic_write']
+
+def atomic_write(fname:str, txt):
+    ''' Writes txt (a str, or bytes) to fname (overwriting) so that fname is never partly written:
+    writes a temporary file in the same directory, syncs it to disk, then renames it over fname.
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as lab:
+    ...     fname = os.path.join(lab, 'GradeSheet.txt')
+    ...     atomic_write(fname, 'old')
+    ...     atomic_write(fname, 'new')
+    ...     [gom_utils.read_str_file(fname), os.listdir(lab)]
+    ['new', ['GradeSheet.txt']]
+    '''
+    directory = os.path.dirname(fname) or '.'
+    (fd, tmp_fname) = tempfile.mkstemp(dir=directory, prefix='.'+os.path.basename(fname)+'.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(txt, bytes) else 'w') as f:
+            f.write(txt)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(fname): # keep the original's permissions (mkstemp's are owner-only)
+            os.chmod(tmp_fname, os.stat(fname).st_mode & 0o777)
+        else:
+            os.chmod(tmp_fname, 0o644)
+        os.replace(tmp_fname, fname)
+    except BaseException:
+        if os.path.exists(tmp_fname):
+            os.remove(tmp_fname)
+        raise
+    try: # make the rename itself survive a crash (not possible on Windows)
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+def _read_or_none(fname:str):
+    ''' Returns the text of fname, or None if it doesn't exist '''
+    try:
+        return gom_utils.read_str_file(fname)
+    except FileNotFoundError:
+        return None
+
+def _swap(fname:str, txt:str, orig) -> bool:
+    ''' Writes txt to fname (atomically) if it still has the text orig (None if it didn't exist),
+    and returns whether it did.
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as lab:
+    ...     fname = os.path.join(lab, 'GradeSheet.txt')
+    ...     gom_utils.write_str_file('saved since', fname)
+    ...     [_swap(fname, 'new', 'old'), _read_or_none(fname), _swap(fname, 'new', 'saved since'), _read_or_none(fname)]
+    [False, 'saved since', True, 'new']
+    '''
+    if _read_or_none(fname) != orig: # compare & swap: someone else got there first
+        return False
+    atomic_write(fname, txt)
+    return True
+
+def _restore(fname:str, txt):
+    ''' Puts fname back to txt, deleting it if txt is None (it didn't exist) '''
+    if txt is None:
+        if os.path.exists(fname):
+            os.remove(fname)
+    else:
+        atomic_write(fname, txt)
+
+#############################
+### FILETRANSACTION CLASS ###
+#############################
+class FileTransaction:
+    ''' A batch of file writes, made all at once by commit(), and undone by rollback().
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as lab:
+    ...     (gs1, gs2) = (os.path.join(lab, 'GradeSheet1.txt'), os.path.join(lab, 'GradeSheet2.txt'))
+    ...     gom_utils.write_str_file('old 1', gs1)
+    ...     trans = FileTransaction(lab)
+    ...     trans.write(gs1, 'new 1')
+    ...     trans.write(gs2, 'new 2')
+    ...     written = trans.commit()
+    ...     after = [_read_or_none(gs1), _read_or_none(gs2)]
+    ...     undone = FileTransaction(lab).rollback()
+    ...     [len(written), after, len(undone), _read_or_none(gs1), _read_or_none(gs2)]
+    [2, ['new 1', 'new 2'], 2, 'old 1', None]
+
+    A file that's changed since it was read (its expected text) is left alone:
+
+    >>> with tempfile.TemporaryDirectory() as lab:
+    ...     (gs1, gs2) = (os.path.join(lab, 'GradeSheet1.txt'), os.path.join(lab, 'GradeSheet2.txt'))
+    ...     gom_utils.write_str_file('old 1', gs1)
+    ...     gom_utils.write_str_file('old 2', gs2)
+    ...     trans = FileTransaction(lab)
+    ...     trans.write(gs1, 'new 1', expected='old 1')
+    ...     trans.write(gs2, 'new 2', expected='old 2')
+    ...     gom_utils.write_str_file('saved by the grader', gs2)
+    ...     written = trans.commit()
+    ...     [len(written), trans.conflicts == [gs2], _read_or_none(gs1), _read_or_none(gs2)]
+    [1, True, 'new 1', 'saved by the grader']
+
+    A batch that fails is put back, and the last batch can still be undone:
+
+    >>> import contextlib, io
+    >>> with tempfile.TemporaryDirectory() as lab:
+    ...     gs1 = os.path.join(lab, 'GradeSheet1.txt')
+    ...     gom_utils.write_str_file('old 1', gs1)
+    ...     trans = FileTransaction(lab)
+    ...     trans.write(gs1, 'new 1')
+    ...     _ = trans.commit()
+    ...     trans.write(gs1, 'newer 1')
+    ...     trans.write(os.path.join(lab, 'no-such-student', 'GradeSheet.txt'), 'new 2')
+    ...     with contextlib.redirect_stdout(io.StringIO()): # (the warning)
+    ...         try:
+    ...             _ = trans.commit()
+    ...         except OSError as e:
+    ...             failed = type(e).__name__
+    ...     after = _read_or_none(gs1)
+    ...     undone = FileTransaction(lab).rollback()
+    ...     [failed, after, len(undone), _read_or_none(gs1), os.listdir(lab)]
+    ['FileNotFoundError', 'new 1', 1, 'old 1', ['GradeSheet1.txt']]
+    '''
+    __slots__ = ['_labdir', '_writes', '_workers', 'conflicts']
+
+    VERSION = 1 # of the saved journal, bump if its format changes
+
+    def __init__(self, lab_directory:str, workers=gom_utils.WRITE_WORKERS):
+        ''' Creates an empty transaction, journaled in lab_directory
+        '''
+        self._labdir = lab_directory
+        self._writes = {} # filename -> (text to write, text it was read as or None), in the order they were added
+        self._workers = workers
+        self.conflicts = [] # filenames the last commit() didn't write, as they'd changed since they were read
+
+    @property
+    def journal(self) -> str:
+        ''' Returns where the journal of the last committed batch is saved.
+        >>> FileTransaction('test').journal
+        'test/.gradeomatic-journal.json'
+        '''
+        return gom_utils.format_filename(self._labdir, gom_utils.FILENAME_JOURNAL)
+
+    @property
+    def pending_journal(self) -> str:
+        ''' Returns where the journal of the batch being committed is saved, until it's written.
+        >>> FileTransaction('test').pending_journal
+        'test/.gradeomatic-journal.json.pending'
+        '''
+        return self.journal + '.pending'
+
+    def write(self, fname:str, txt:str, expected=None):
+        ''' Adds writing txt to fname (overwriting) to the batch. Nothing's written until commit().
+        expected is the text fname had when txt was worked out from it: if it's changed since,
+        fname isn't written (see conflicts).
+        '''
+        self._writes[fname] = (txt, expected)
+
+    def commit(self) -> list:
+        ''' Writes every file in the batch (atomically, several at once) and returns the
+        filenames written. First journals each file's current text, which replaces the last
+        batch's journal once they're all written. Files that changed since they were read (their expected text, or since they
+        were journaled) aren't written, and are listed in conflicts instead.
+        If any write fails, puts back the files already written and re-raises the error.
+        '''
+        self.conflicts = []
+        if not self._writes:
+            return []
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            originals = dict(zip(self._writes, pool.map(_read_or_none, self._writes)))
+            for (fname, (txt, expected)) in self._writes.items():
+                if expected is not None and originals[fname] != expected:
+                    self.conflicts.append(fname)
+            conflicted = set(self.conflicts)
+            fnames = [fname for fname in self._writes if fname not in conflicted]
+            if not fnames:
+                self._writes = {}
+                return []
+            journal = {'version': FileTransaction.VERSION,
+                       'files': [[fname, originals[fname], self._writes[fname][0]] for fname in fnames]}
+            atomic_write(self.pending_journal, json.dumps(journal))
+
+            futures = [pool.submit(_swap, fname, self._writes[fname][0], originals[fname]) for fname in fnames]
+            errors = [f.exception() for f in futures if f.exception() is not None]
+            swapped = [fname for (fname, f) in zip(fnames, futures) if f.exception() is None and f.result()]
+            if errors:
+                print("FileTransaction:: commit: rolling back,", len(errors), "of", len(fnames), "files couldn't be written:", errors[0])
+                list(pool.map(_restore, swapped, [originals[fname] for fname in swapped]))
+                os.remove(self.pending_journal) # (the last batch's journal is left as it was)
+                raise errors[0]
+        os.replace(self.pending_journal, self.journal)
+        self.conflicts += [fname for (fname, f) in zip(fnames, futures) if not f.result()] # changed while being journaled
+        self._writes = {}
+        return swapped
+
+    def rollback(self) -> list:
+        ''' Undoes the last committed batch (from its journal): puts each file back to what it was,
+        unless it's changed since the batch wrote it. Returns the filenames put back.
+        Returns [] if there's no journal.
+        '''
+        try:
+            with open(self.journal, 'r') as f:
+                saved = json.load(f)
+            if saved.get('version') != FileTransaction.VERSION:
+                raise ValueError('old version')
+            files = saved['files']
+        except (OSError, ValueError, KeyError) as e:
+            print("FileTransaction:: rollback: no batch to roll back:", e)
+            return []
+
+        restore = []
+        for (fname, orig, written) in files:
+            if _read_or_none(fname) == written:
+                restore.append((fname, orig))
+            else:
+                print("FileTransaction:: rollback: skipping, changed since it was written:", fname)
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            list(pool.map(_restore, [fname for (fname, orig) in restore], [orig for (fname, orig) in restore]))
+        os.remove(self.journal)
+        return [fname for (fname, orig) in restore]
+
+    def __len__(self):
+        ''' Returns the number of files waiting to be written '''
+        return len(self._writes)
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
@@ -7,10 +7,21 @@ Held together by duct tape & if-loops by Iris Howley (2023)
 
 import tkinter as tk # abbrev
 from tkinter import filedialog as fd
-import os, re
+import difflib, os, re
 from CS1Rubric import *
 from CS1GradeSheet import GradeSheet, Comment
 from CS1RubricOmatic import RubricOmatic
+from CS1CommentIndex import CommentIndex
+from CS1GradeSheetCache import GradeSheetCache
+from CS1ParsedCache import ParsedCache
+from CS1Prefetcher import Prefetcher
+from CS1Launcher import Launcher
+from CS1LabIndex import LabIndex
+from CS1Roster import Roster
+from CS1GradeStatus import GradeStatus
+from CS1EditJournal import EditJournal
+from CS1TextPatch import patch_text
+from CS1VirtualList import VirtualList
 import CS1GradeOmaticUtils as gom_utils
 from VerticalScrollWheel import VerticalScrolledFrame
 
@@ -23,17 +34,24 @@ class GradeOmatic(tk.Frame):
 
     __slots__ = ['entry_dir', 'entry_rubpath', 'entry_start', 'btn_loadfiles', 'btn_modrubric']  
     __slots__ = ['open_cmt_entries']               
-    __slots__ += ['lbl_error', 'lbl_currentgrading']
-    __slots__ += ['rubric', 'rubgridframe', 'rubric_btns', 'btn_saverub']
+    __slots__ += ['lbl_error', 'lbl_currentgrading', 'lbl_progress']
+    __slots__ += ['rubric', 'rubric_list', 'rubgridframe', 'rubric_btns', 'btn_saverub']
+    __slots__ += ['rubric_stat', 'rubric_rows', 'rubric_keys']
     __slots__ += ['chk_py', 'chk_txt', 'chk_img', 'chk_jva', 'chk_prettify']
-    __slots__ += ['text_gradesheet', 'stk_redocomments']
-    __slots__ += ['current_subdir', 'all_subdirs']
+    __slots__ += ['text_gradesheet', 'stk_redocomments', 'journal']
+    __slots__ += ['current_subdir', 'roster', 'comment_index', 'gs_cache', 'prefetcher', 'launcher', 'lab_index', 'grade_status']
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, launcher=None):
         # Not entirely sure what this code does
         # src: https://pythonbasics.org/tkinter-button/
         tk.Frame.__init__(self, parent)        
         self.parent = parent
+        self.gs_cache = GradeSheetCache() # recently seen GradeSheets, shared with the RubricOmatic
+        self.comment_index = None # CommentIndex of the lab, once one's loaded
+        self.prefetcher = Prefetcher(self.gs_cache) # gets the next/prev students ready in the background
+        self.after(gom_utils.PREFETCH_POLL_MS, self.poll_prefetch)
+        self.launcher = launcher if launcher is not None else Launcher() # opens student files in the background
+        self.grade_status = GradeStatus() # who's been graded so far
 
         # scrolling: https://stackoverflow.com/a/16198198/4730538
         self.frame = VerticalScrolledFrame(parent)
@@ -45,6 +63,7 @@ class GradeOmatic(tk.Frame):
         self.parent.bind('<Control-s>', self.save_overwrite) # save
         self.parent.bind('<Control-w>', self.nosave_next) # skip
         self.parent.bind('<Control-p>', self.nosave_prev) # previous
+        self.parent.bind('<Control-u>', self.nosave_next_ungraded) # skip to next ungraded
         self.parent.bind('<Control-o>', self.select_directory) # search for file name for the directory
         self.parent.bind('<Control-z>', self.undo_comment) # undo adding comment to gradesheet
         self.parent.bind('<Control-f>', self.prettify) # prettify / format
@@ -168,6 +187,8 @@ class GradeOmatic(tk.Frame):
         lbl_grade_title.pack(side=tk.LEFT)
         self.lbl_currentgrading = tk.Label(currentframe, text=self.EMPTY, font = gom_utils.FONT_H1, anchor='w')
         self.lbl_currentgrading.pack(side=tk.LEFT)
+        self.lbl_progress = tk.Label(currentframe, text='', font = gom_utils.FONT_H2, anchor='w')
+        self.lbl_progress.pack(side=tk.LEFT)
 
         ###     GradeSheet     ###
         # https://realpython.com/python-gui-tkinter/#getting-multiline-user-input-with-text-widgets
@@ -176,6 +197,7 @@ class GradeOmatic(tk.Frame):
         gsareaframe = tk.Frame(gsframe)
         gsareaframe.pack(side=tk.TOP)
         self.text_gradesheet = tk.Text(gsareaframe, width=gom_utils.TEXT_GRADESHEET, height=40)
+        self.journal = EditJournal(self.text_gradesheet) # appended comments, for undo
         self.text_gradesheet.configure(font=gom_utils.FONT_GRADESHEET, state=tk.NORMAL)
         self.text_gradesheet.insert(tk.INSERT, self.EMPTY)
         self.text_gradesheet.pack(side=tk.TOP, fill=tk.BOTH, expand=tk.TRUE)
@@ -212,6 +234,11 @@ class GradeOmatic(tk.Frame):
         header_txt = 'Severity' + gom_utils.RUBRIC_SPACING + 'Filename' + gom_utils.RUBRIC_SPACING + 'Comment'
         lbl_rub_sev = tk.Label(rubricframe, text=header_txt, font = gom_utils.FONT_H2)
         lbl_rub_sev.pack(side=tk.TOP, expand=tk.TRUE)
+        self.rubric_list = VirtualList(rubricframe) # criteria buttons, only made when scrolled to
+        self.rubric_list.pack(side=tk.TOP, fill=tk.BOTH, expand=tk.TRUE)
+        self.rubric_stat = None # (filename, mtime, size) of the rubric when last read
+        self.rubric_rows = [] # (text, is it a criteria?) in rubric_list
+        self.rubric_keys = [] # criteria text bound to each keyboard shortcut
         self.rubgridframe = tk.Frame(rubricframe)
         self.rubgridframe.pack(side=tk.TOP)        
 
@@ -224,6 +251,8 @@ class GradeOmatic(tk.Frame):
         btn_nosave_next.pack(side=tk.LEFT) 
         btn_save_next = tk.Button(navbtnframe, text='Save & Next', command=self.save_next)
         btn_save_next.pack(side=tk.LEFT) 
+        btn_next_ungraded = tk.Button(navbtnframe, text='Skip to Ungraded', command=self.nosave_next_ungraded)
+        btn_next_ungraded.pack(side=tk.LEFT) 
         btn_save_overwrite = tk.Button(navbtnframe, text='Save (Overwrite)', command=self.save_overwrite)
         btn_save_overwrite.pack(side=tk.LEFT) 
         btn_save_exit = tk.Button(navbtnframe, text='Save & Exit', command=self.save_exit)
@@ -242,7 +271,7 @@ class GradeOmatic(tk.Frame):
         if GradeSheet.code_loc(cmnt_str) < 0: # not code, format
             cmnt_str = gom_utils.format_comment(cmnt_str)
         
-        self.text_gradesheet.insert(tk.END, '\n'+cmnt_str)
+        self.journal.append('\n'+cmnt_str)
         self.text_gradesheet.see(tk.END)  # scroll to bottom of text area
     
     def undo_comment(self, event=None):
@@ -250,6 +279,14 @@ class GradeOmatic(tk.Frame):
         '''
         self.status_clear()
 
+        # Just appended it? Delete exactly what was appended
+        appended_txt = self.journal.undo()
+        if appended_txt is not None:
+            self.text_gradesheet.see(tk.END)  # scroll to bottom of text area
+            self.stk_redocomments.append(appended_txt) # exactly as it was, subcomments & all
+            return
+
+        # Edited by hand since, so find the last comment in the text
         # indexing isn't really easy with multiline Text objects:
         # https://realpython.com/python-gui-tkinter/#getting-multiline-user-input-with-text-widgets
 
@@ -257,23 +294,21 @@ class GradeOmatic(tk.Frame):
         curr_gs_txt = self.text_gradesheet.get(gom_utils.TEXT_0, tk.END+'-1c')
         comments_line = curr_gs_txt.rfind(gom_utils.COMMENT_TXT)
         start_pos = comments_line + len(gom_utils.COMMENT_TXT+':')
-        stk_comments = [] # current comments
+        last_comment = None # only need the last of the current comments
         if comments_line >= 0 and start_pos < len(curr_gs_txt) - 5: # at least 5 characters for a meaningful comment 
-            crits = GradeSheet.parse_comments_section(curr_gs_txt[start_pos:].rstrip()) # list of Comments (with subcomments)
-            stk_comments.extend(crits)
+            for last_comment in GradeSheet.iter_comments_section(curr_gs_txt[start_pos:].rstrip()): # Comments (with subcomments)
+                pass
 
-        if len(stk_comments) > 0:
-            last_comment = stk_comments[-1]
+        if last_comment is not None:
             if last_comment.subcomments:
                 last_comment = last_comment.pop() # last comment is actually a subcomment
-            else:
-                last_comment = stk_comments.pop()
             
             # remove last comment
             location = curr_gs_txt.rfind(last_comment.comment[:20]) # location of last comment
             location = curr_gs_txt.rfind('\n', 0, location) # newline before last comment
-            self.text_gradesheet.delete(gom_utils.TEXT_0, tk.END) # clear gradesheet
-            self.text_gradesheet.insert(gom_utils.TEXT_0, curr_gs_txt[: location]) # refill gradesheet
+            if location < 0: # (like curr_gs_txt[:-1])
+                location = len(curr_gs_txt)-1
+            self.text_gradesheet.delete(gom_utils.TEXT_0 + '+' + str(location) + 'c', tk.END) # clear from there to the end
             self.text_gradesheet.see(tk.END)  # scroll to bottom of text area
             # place last comment onto redocomments
             self.stk_redocomments.append(last_comment) # will lose subcomment structure, but shouldn't matter
@@ -286,8 +321,12 @@ class GradeOmatic(tk.Frame):
         self.status_clear()
 
         if len(self.stk_redocomments) > 0:       
-            # append_comment will add it back to the appended comments list
-            self.append_comment(self.stk_redocomments.pop())     
+            redo = self.stk_redocomments.pop()
+            if isinstance(redo, str): # undone from the journal, put back exactly
+                self.journal.append(redo)
+                self.text_gradesheet.see(tk.END)  # scroll to bottom of text area
+            else: # append_comment will add it back to the appended comments list
+                self.append_comment(redo)     
         else:
             self.status('!', "There aren't any comments from this session to redo!")
 
@@ -324,22 +363,8 @@ class GradeOmatic(tk.Frame):
         and attempts to prettify existing comments therein
         '''
         gs_txt = self.text_gradesheet.get(gom_utils.TEXT_0, tk.END+'-1c')
-        comment_line = gs_txt.find(gom_utils.COMMENT_TXT)
-        # If someone deleted Comments line, put it back in, after Grade:
-        if comment_line < 0:
-            end_grade_ind = gs_txt.find(gom_utils.GRADE_TXT.strip())
-            newline_grade_ind = gs_txt.find('\n', end_grade_ind)
-            gs_txt = gs_txt[:newline_grade_ind] + '\n\n' + gom_utils.COMMENT_TXT + '\n' + gs_txt[newline_grade_ind:]
-            comment_line = gs_txt.find(gom_utils.COMMENT_TXT)
-
-        new_gs = gs_txt[:comment_line+len(gom_utils.COMMENT_TXT)] # just the gradesheet
-        if new_gs[-1] != '\n': # add newline after comment title, if needed
-            new_gs += '\n'
-        comments_gs = gs_txt[comment_line+len(gom_utils.COMMENT_TXT): ] # just the comments
-        comments = GradeSheet.parse_comments_section(comments_gs)
-        new_gs = new_gs + '\n'.join([str(c) for c in comments]) 
-        self.text_gradesheet.delete(gom_utils.TEXT_0, tk.END)
-        self.text_gradesheet.insert(gom_utils.TEXT_0, new_gs)
+        new_gs = GradeSheet.prettify_str(gs_txt)
+        patch_text(self.text_gradesheet, new_gs, gs_txt) # only the lines that changed
         self.text_gradesheet.see(tk.END)  # scroll to bottom of text area
 
     def sort_comments(self, event=None):
@@ -347,16 +372,8 @@ class GradeOmatic(tk.Frame):
         or comment itself. No fname? Goes first.
         '''
         gs_txt = self.text_gradesheet.get(gom_utils.TEXT_0, tk.END+'-1c')
-        comment_line = gs_txt.rfind(gom_utils.COMMENT_TXT)
-        just_gs = gs_txt[:comment_line+len(gom_utils.COMMENT_TXT)] # just the gradesheet
-        comments_gs = gs_txt[comment_line+len(gom_utils.COMMENT_TXT): ] # just the comments
-        comments = GradeSheet.parse_comments_section(comments_gs)
-    
-        sorted_cmnts = [str(c) for c in GradeSheet.sort_comments(comments)]
-
-        new_gs = just_gs + '\n' + '\n'.join(sorted_cmnts)
-        self.text_gradesheet.delete(gom_utils.TEXT_0, tk.END)
-        self.text_gradesheet.insert(gom_utils.TEXT_0, new_gs)
+        new_gs = GradeSheet.sort_str(gs_txt)
+        patch_text(self.text_gradesheet, new_gs, gs_txt) # only the lines that changed
         self.text_gradesheet.focus_set() # sets focus to the text area so you can type
 
         self.text_gradesheet.see(tk.END)  # scroll to bottom of text area
@@ -378,8 +395,7 @@ class GradeOmatic(tk.Frame):
                 replaced.append(line)
 
         new_gs = just_gs + '\n'.join(replaced)
-        self.text_gradesheet.delete(gom_utils.TEXT_0, tk.END)
-        self.text_gradesheet.insert(gom_utils.TEXT_0, new_gs)
+        patch_text(self.text_gradesheet, new_gs, gs_txt) # only the lines that changed
         self.text_gradesheet.focus_set() # sets focus to the text area so you can type
 
     def replace_bullet(self, ch:str, bullet:str):
@@ -399,8 +415,7 @@ class GradeOmatic(tk.Frame):
                 replaced.append(line)
 
         new_gs = '\n'.join(replaced) + comments_gs
-        self.text_gradesheet.delete(gom_utils.TEXT_0, tk.END)
-        self.text_gradesheet.insert(gom_utils.TEXT_0, new_gs)
+        patch_text(self.text_gradesheet, new_gs, gs_txt) # only the lines that changed
         
     def return_asterisk(self, chrs:str):
         ''' Goes through GradeSheet (prior to comments section) 
@@ -419,8 +434,7 @@ class GradeOmatic(tk.Frame):
                 replaced.append(line)
 
         new_gs = '\n'.join(replaced) + comments_gs
-        self.text_gradesheet.delete(gom_utils.TEXT_0, tk.END)
-        self.text_gradesheet.insert(gom_utils.TEXT_0, new_gs)
+        patch_text(self.text_gradesheet, new_gs, gs_txt) # only the lines that changed
         
 
     def choose_directory(self, event=None): 
@@ -437,23 +451,29 @@ class GradeOmatic(tk.Frame):
             return
 
         # Loading new directory, throw out old subdirs!
-        self.all_subdirs = []
-
-        for (roots, subdirs, f) in os.walk(directory, topdown=True):
-            subdirs.sort()
-            for subdir in subdirs:
-                if subdir not in gom_utils.IGNORE_DIRS: #ignore some subdirectories
-                    # give student subdirs full file path name
-                    self.all_subdirs.append(os.path.join(roots, subdir))
-            break # only go one level deep into subdirectories
+        # (only re-lists student subdirs that changed since this lab was last opened)
+        try:
+            self.lab_index = LabIndex(directory)
+            self.lab_index.refresh()
+        except OSError:
+            self.status('ERROR', "Can't open lab directory: "+directory)
+            return
+        self.roster = Roster(self.lab_index.subdirs())
+        self.prefetcher.lister = self.lab_index.files
 
-        if len(self.all_subdirs) < 1:
+        if len(self.roster) < 1:
             # Error for empty subdirs      
             self.status('ERROR',"No student subdirectories: "+directory)
             return
-
-        start_subdir = gom_utils.format_filename(directory,self.entry_start.get())
-        if len(self.entry_start.get()) > 0 and start_subdir not in self.all_subdirs:
+        if self.comment_index is not None: # keep what was indexed in the last lab
+            self.comment_index.save()
+        self.comment_index = CommentIndex(directory) # loads the saved index, if there is one
+        if self.gs_cache.parsed is not None: # keep what was parsed in the last lab
+            self.gs_cache.parsed.save()
+        self.gs_cache.parsed = ParsedCache(directory) # loads the saved parsed GradeSheets, if there are any
+
+        start_subdir = self.roster.jump(self.entry_start.get())
+        if len(self.entry_start.get()) > 0 and start_subdir is None:
             # Error for starting subdir not in our directories               
             self.status('ERROR', "Specified Student subdir not in dir: "+directory)
             return
@@ -462,9 +482,10 @@ class GradeOmatic(tk.Frame):
             self.current_subdir = start_subdir
         else:
             # just start with the first subdir in the list
-            self.current_subdir = self.all_subdirs[0]
+            self.current_subdir = self.roster[0]
 
         self.load_subdir()
+        self.poll_grade_status(self.grade_status.start_refresh(self.roster)) # only reads Grade: lines, in the background
 
     def load_subdir(self):
         ''' Loads the relevant files from the current subdirectory.
@@ -487,34 +508,43 @@ class GradeOmatic(tk.Frame):
         self.text_gradesheet.delete(gom_utils.TEXT_0, tk.END)
 
         # clear out previous undo list
-        self.stk_comments = []
+        self.journal.clear()
         self.stk_redocomments = []
 
-        # iterate over files
-        for (r2, d2, files) in os.walk(self.current_subdir, topdown=True):
-            for fle in files:
-                # only file-explorer open specified filetypes
-                if (self.chk_py.get() and fle.endswith('.py')) \
-                    or (self.chk_jva.get()  and fle.endswith('.java')) \
-                    or (self.chk_txt.get()  and fle.endswith('.txt') and not fle.endswith(gom_utils.FILENAME_GS)) \
-                    or (self.chk_img.get()  and (fle.endswith('.jpg') or fle.endswith('.png') or fle.endswith('.gif'))) : 
-                            
-                    # Uses system command to open python files
-                    currfile = gom_utils.format_filename(self.current_subdir, fle) 
-                    os.system('open '+currfile)
-
-                    # User must manually close each file!!
-                    #os.close(currfile)
-
-                # It's the GradeSheet file, let's load it!
-                elif fle == gom_utils.FILENAME_GS:
-                    gradesheet = gom_utils.read_str_file(gom_utils.format_filename(self.current_subdir, gom_utils.FILENAME_GS))
-                    self.text_gradesheet.delete(gom_utils.TEXT_0, tk.END)
-                    #self.text_gradesheet.insert(tk.INSERT, self.quick_fix_lab6(str(gradesheet)))
-                    self.text_gradesheet.insert(tk.INSERT, str(gradesheet))
-                    if self.chk_prettify.get(): # pre-prettify if selected
-                        self.prettify() 
-
+        # iterate over files (already walked in the background, if the prefetcher got to it)
+        files = self.prefetcher.take(self.current_subdir)
+        if files is None:
+            files = self.lab_index.files(self.current_subdir)
+        to_open = []
+        for fle in files:
+            # only file-explorer open specified filetypes
+            if (self.chk_py.get() and fle.endswith('.py')) \
+                or (self.chk_jva.get()  and fle.endswith('.java')) \
+                or (self.chk_txt.get()  and fle.endswith('.txt') and not fle.endswith(gom_utils.FILENAME_GS)) \
+                or (self.chk_img.get()  and (fle.endswith('.jpg') or fle.endswith('.png') or fle.endswith('.gif'))) : 
+                        
+                # Opened all at once, after we've found them all
+                to_open.append(gom_utils.format_filename(self.current_subdir, fle))
+
+                # User must manually close each file!!
+
+            # It's the GradeSheet file, let's load it!
+            elif fle == gom_utils.FILENAME_GS:
+                gs_fname = gom_utils.format_filename(self.current_subdir, gom_utils.FILENAME_GS)
+                self.text_gradesheet.delete(gom_utils.TEXT_0, tk.END)
+                #self.text_gradesheet.insert(tk.INSERT, self.quick_fix_lab6(str(gradesheet)))
+                if self.chk_prettify.get(): # pre-prettify if selected
+                    self.text_gradesheet.insert(tk.INSERT, self.gs_cache.prettified(gs_fname))
+                    self.text_gradesheet.see(tk.END)  # scroll to bottom of text area
+                else:
+                    self.text_gradesheet.insert(tk.INSERT, self.gs_cache.text(gs_fname))
+        # Uses system command to open the files (in the background)
+        self.launcher.launch(to_open)
+
+        # get the students either side ready, while this one's being graded
+        if self.current_subdir in self.roster:
+            self.prefetcher.request(self.roster.neighbors(self.current_subdir), self.chk_prettify.get())
+        self.show_progress()
 
     def quick_fix_lab6(self, whole_gs:str) -> str:
         """
@@ -618,41 +648,76 @@ class GradeOmatic(tk.Frame):
                 self.entry_dir.insert(len(self.entry_dir.get()), '/lab'+lab_num)
 
 
-        # clear out previous Rubric
-        for widgets in self.rubgridframe.winfo_children():
-            widgets.destroy()     
+        # add/update the rubric buttons
+        if not self.refresh_rubric():
+            return
+        self.stk_comments = []
+
+        # custom comments, undo/redo etc. only the first time (keeping anything typed in them)
+        if not self.rubgridframe.winfo_children():
+            self.load_custom_comments()
 
-        # add the rubric buttons
-        try:            
-            self.rubric = Rubric(Rubric.parse_rubric_from_file(self.entry_rubpath.get()))
+        # If rubric loaded, re-enable 'Load Files' button
+        self.btn_loadfiles['state'] = tk.NORMAL
+        self.btn_saverub['state'] = tk.NORMAL
+
+    def refresh_rubric(self) -> bool:
+        ''' (Re-)reads the rubric file, if it changed since it was last read, and updates
+        just the rubric buttons & keyboard shortcuts that changed.
+        Returns False if the rubric file doesn't exist.
+        '''
+        fname = self.entry_rubpath.get()
+        try:
+            stat = os.stat(fname)
         except FileNotFoundError:
-            self.status('WARNING', "FileNotFoundError: "+str(self.entry_rubpath.get()))
-            return
+            self.status('WARNING', "FileNotFoundError: "+str(fname))
+            return False
+        rubric_stat = (fname, stat.st_mtime_ns, stat.st_size)
+        if rubric_stat == self.rubric_stat: # nothing's changed
+            return True
+        self.rubric = Rubric(Rubric.parse_rubric_from_file(fname))
+        self.rubric_stat = rubric_stat
         self.rubric_btns = []
-        self.stk_comments = []
 
-        count_crits = 0 # used to generate SHIFT+# keyboard shortcuts
+        rows = [] # (text, is it a criteria?) for the rubric list
         for crit in self.rubric.criteria: 
             if len(crit) == 3: # it's a criteria
                 crit[1] = crit[1]+':' if crit[1] else crit[1]
                 crit_txt = crit[0] + gom_utils.RUBRIC_SPACING + crit[1] + gom_utils.RUBRIC_SPACING + crit[2]
-                btn_criteria = tk.Button(self.rubgridframe, text=crit_txt, command=lambda crit_txt=crit_txt: self.append_comment(crit_txt), justify=tk.LEFT, wraplength=gom_utils.ENTRY_LG*20, anchor='w', font=gom_utils.FONT_RUBRIC)
-                btn_criteria.pack(side=tk.TOP,fill=tk.BOTH, expand=tk.TRUE) 
-
-                # Keyboard SHIFT+# shortcuts
-                if count_crits < len(gom_utils.SHIFT_KEYBD_SHORTCUTS): 
-                    key_binding = '<'+ gom_utils.RUBRIC_KEYBD + '-Key-'+ str(count_crits)+'>' # use number instead of symbol
-                    self.parent.bind(key_binding, lambda event, crit_txt=crit_txt: self.append_comment(crit_txt))
-                    count_crits+=1
+                rows.append((crit_txt, True))
             elif len(crit) == 1: # it's a header
-                lbl_rub_header = tk.Label(self.rubgridframe, text=crit[0], fg='#666', font = gom_utils.FONT_H2)
-                lbl_rub_header.pack(side=tk.TOP,fill=tk.BOTH, expand=tk.TRUE) 
+                rows.append((crit[0], False))
+
+        # only replace the rows that changed (last first, so the earlier row numbers still hold)
+        opcodes = difflib.SequenceMatcher(None, self.rubric_rows, rows, autojunk=False).get_opcodes()
+        for (tag, i1, i2, j1, j2) in reversed(opcodes):
+            if tag != 'equal':
+                self.rubric_list.replace_rows(i1, i2, [(txt, (lambda crit_txt=txt: self.append_comment(crit_txt)) if is_crit else None)
+                                                      for (txt, is_crit) in rows[j1:j2]])
+        self.rubric_rows = rows
+
+        # Keyboard SHIFT+# shortcuts, for the first criteria
+        crit_txts = [txt for (txt, is_crit) in rows if is_crit][:len(gom_utils.SHIFT_KEYBD_SHORTCUTS)]
+        for count_crits in range(len(gom_utils.SHIFT_KEYBD_SHORTCUTS)):
+            old_txt = self.rubric_keys[count_crits] if count_crits < len(self.rubric_keys) else None
+            crit_txt = crit_txts[count_crits] if count_crits < len(crit_txts) else None
+            if crit_txt != old_txt: # only re-bind the ones that changed
+                key_binding = '<'+ gom_utils.RUBRIC_KEYBD + '-Key-'+ str(count_crits)+'>' # use number instead of symbol
+                if crit_txt is None:
+                    self.parent.unbind(key_binding)
+                else:
+                    self.parent.bind(key_binding, lambda event, crit_txt=crit_txt: self.append_comment(crit_txt))
+        self.rubric_keys = crit_txts
+        return True
 
+    def load_custom_comments(self):
+        ''' Adds the entries for open/custom comments, and the undo/redo/modify rubric buttons
+        below the rubric.
+        '''
         # header for custom comments
         lbl_custom_header = tk.Label(self.rubgridframe, text='Custom', fg='#666', font = gom_utils.FONT_H2)
         lbl_custom_header.pack(side=tk.TOP,fill=tk.BOTH, expand=tk.TRUE) 
 
-        
         # add open/custom comments
         self.open_cmt_entries = []
         comment_btns = []
@@ -684,13 +749,11 @@ class GradeOmatic(tk.Frame):
         btn_redo.pack(side=tk.LEFT)
         self.btn_modrubric = tk.Button(rubbtnframe, text='Modify Rubric', command=self.modify_rubric, state=tk.DISABLED)
         self.btn_modrubric.pack(side=tk.RIGHT)
-        # If rubric loaded, re-enable 'Load Files' button
-        self.btn_loadfiles['state'] = tk.NORMAL
-        self.btn_saverub['state'] = tk.NORMAL
 
     def save_rubric(self):
-        ''' Will add the custom/open comments to the rubric file.
-        Will need to close and re-open file to see them as buttons rather than entries.
+        ''' Will add the custom/open comments to the rubric file (clearing their entries, so
+        they're not added again next time). Then re-reads the rubric, so they show up as buttons
+        (leaving the rest of the rubric's buttons as they are).
         '''
         self.status_clear()
 
@@ -698,7 +761,9 @@ class GradeOmatic(tk.Frame):
             for cmt_entry in self.open_cmt_entries:
                 if len(cmt_entry.get()) > 3: # don't save empty comments
                     self.rubric.add_criteria(gom_utils.parse_criteria(cmt_entry.get()))
+                    cmt_entry.delete(0, tk.END) # it's a rubric button now
             self.rubric.overwrite(self.entry_rubpath.get())
+            self.refresh_rubric()
         else:
             self.status('ERROR', "No rubric loaded, can't save the file!")
         
@@ -712,7 +777,7 @@ class GradeOmatic(tk.Frame):
             open_crits.append(cmnt_entry.get())
 
         root = tk.Tk()
-        app = RubricOmatic(self.rubric, open_crits, self.all_subdirs, fname, root)
+        app = RubricOmatic(self.rubric, open_crits, self.roster, fname, root, comment_index=self.comment_index, gs_cache=self.gs_cache)
         # TODO: Once you figure out how to pass variables between GUIS::
         # new_filename = ?? # grab new filename from RubricOmatic GUI?
         # Set current rubric filename to the RubricOmatic one: 
@@ -734,6 +799,10 @@ class GradeOmatic(tk.Frame):
         format_root = gom_utils.format_filename(self.entry_dir.get(), self.lbl_currentgrading.cget('text'))
         format_fname = gom_utils.format_filename(format_root,gom_utils.FILENAME_GS)
         gom_utils.write_str_file(gs_txt, format_fname)
+        self.gs_cache.invalidate(format_fname)
+        self.grade_status.grade(self.current_subdir) # might be graded now
+        self.show_progress()
+        # (the comment index re-parses it the next time it's refreshed, as its modification time changed)
 
     def save_next(self):
         ''' Saves current modifications to GradeSheet and then moves to next student
@@ -753,9 +822,32 @@ class GradeOmatic(tk.Frame):
         '''
         self.status_clear()
         self.next()
+
+    def nosave_next_ungraded(self, event=None):
+        ''' Moves to the next student directory that hasn't been graded yet (empty Grade: line),
+        without saving current changes to GradeSheet
+        '''
+        self.status_clear()
+        if not self.roster :
+            # Error for not having any subdirectories to load
+            self.status('ERROR', "No subdirectories in: "+self.current_subdir)
+            return
+        next_subdir = self.grade_status.next_ungraded(self.roster, self.current_subdir)
+        if next_subdir is None:
+            self.status('!', "No other ungraded student subdirectories!")
+            return
+        self.current_subdir = next_subdir
+        self.load_subdir() # do the actual setting up of files
+
     def nosave_exit(self, event=None):
         ''' Exits the CS1 Grader without saving the current GradeSheet.
         '''
+        self.prefetcher.stop()
+        self.launcher.shutdown()
+        if self.gs_cache.parsed is not None:
+            self.gs_cache.parsed.save()
+        if self.comment_index is not None:
+            self.comment_index.save()
         self.parent.destroy() 
 
     def save_exit(self):
@@ -772,13 +864,13 @@ class GradeOmatic(tk.Frame):
         '''        
         self.status_clear()
 
-        ind_curr_subdir = self.all_subdirs.index(self.current_subdir)
-        if  ind_curr_subdir < 1 :
+        prev_subdir = self.roster.prev(self.current_subdir)
+        if  prev_subdir is None :
             # Error for being at beginning of student directories!
             self.status('ERROR', "Likely at the beginning of student subdirectories: "+self.current_subdir)
             return
         
-        self.current_subdir = self.all_subdirs[ind_curr_subdir-1] # update to the previous subdirectory in our list        
+        self.current_subdir = prev_subdir # update to the previous subdirectory in our list        
         self.load_subdir() # do the actual setting up of files
 
     def next(self):
@@ -788,21 +880,46 @@ class GradeOmatic(tk.Frame):
         User will have to manually close all *.py files from previous student.
         '''        
         self.status_clear()
-        if not self.all_subdirs :
+        if not self.roster :
             # Error for not having any subdirectories to load
             self.status('ERROR', "No subdirectories in: "+self.current_subdir)
             return
-        ind_curr_subdir = self.all_subdirs.index(self.current_subdir)
-        if  ind_curr_subdir>= len(self.all_subdirs)-1 :
+        next_subdir = self.roster.next(self.current_subdir)
+        if  next_subdir is None :
             # Error for being at end of student directories!
             self.status('ERROR', "Likely at the end of student subdirectories: "+self.current_subdir)
             return
         
-        self.current_subdir = self.all_subdirs[ind_curr_subdir+1] # update to the next subdirectory in our list        
+        self.current_subdir = next_subdir # update to the next subdirectory in our list        
         self.load_subdir() # do the actual setting up of files
     
     #############################
     ###    INSTANCE METHODS   ###
+    def show_progress(self):
+        ''' Shows how many students have been graded so far (from what's already known,
+        doesn't re-read any GradeSheets)
+        '''
+        (graded, total) = self.grade_status.progress(self.roster, refresh=False)
+        self.lbl_progress.config(text=' (' + str(graded) + '/' + str(total) + ' graded)')
+
+    def poll_grade_status(self, thread):
+        ''' Shows how many students have been graded as the lab's Grade: lines are read
+        in the background (on thread), checking again in a bit until they've all been read.
+        '''
+        self.show_progress()
+        if thread.is_alive():
+            self.after(gom_utils.JOB_POLL_MS, lambda: self.poll_grade_status(thread))
+            return
+        unreadable = self.grade_status.unreadable(self.roster)
+        if unreadable:
+            self.status('WARNING', "Couldn't read the GradeSheets of: " + ', '.join(gom_utils.get_filename(sd) for sd in unreadable))
+
+    def poll_prefetch(self):
+        ''' Collects any students the prefetcher finished in the background,
+        then checks again in a bit. Never waits on the prefetcher.
+        '''
+        self.prefetcher.poll()
+        self.after(gom_utils.PREFETCH_POLL_MS, self.poll_prefetch)
 
     def status(self, level:str, txt:str):
         ''' Prints an error message to the error status in the GUI
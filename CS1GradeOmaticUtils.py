@@ -5,6 +5,7 @@ the modules, and functions used across multiple modules.
 
 Held together by duct tape & if-loops by Iris Howley (2023)
 '''
+import os
 
 ##################################
 ### CHANGEABLE CONSTANT VALUES ###
@@ -34,10 +35,34 @@ COMMENT_TXT = 'Comments from Graders:'
 GRADE_TXT = 'Grade:   '
 REQS_TXT = 'Requirements of this lab:'
 FILENAME_GS = 'GradeSheet.txt'    
+FILENAME_CMNT_INDEX = '.gradeomatic-comments.json' # inverted comment index, kept in the lab directory
+FILENAME_LAB_INDEX = '.gradeomatic-index.json' # listing of student subdirs & their files, kept in the lab directory
+FILENAME_JOURNAL = '.gradeomatic-journal.json' # original text of the last batch of GradeSheets written, kept in the lab directory
+FILENAME_PARSED = '.gradeomatic-parsed.bin' # already-parsed GradeSheets (see CS1ParsedCache), kept in the lab directory
 RUBRIC_QUOTE = '"' 
 
 # Other
 EXTENSIONS = ['.py', '.txt', '.java'] # detect if filename in a string
+LOOSE_MATCH = 0.8 # comments with more than this share of words (or letters) in common are 'loose matches'
+
+# batch (headless) processing
+BATCH_WORKERS = None # number of worker processes, None uses os.cpu_count()
+BATCH_MIN_PARALLEL = 16 # fewer GradeSheets than this are just processed serially
+
+# caching
+GS_CACHE_CAPACITY = 64 # most recently used GradeSheets kept in memory (see CS1GradeSheetCache)
+PREFETCH_POLL_MS = 100 # how often the GUI collects prefetched students (see CS1Prefetcher)
+STATUS_WORKERS = 8 # threads reading Grade: lines when checking a whole lab (see CS1GradeStatus)
+WRITE_WORKERS = 8 # threads writing a batch of GradeSheets at once (see CS1FileTransaction)
+PREVIEW_WORKERS = 4 # threads previewing a retroactive replacement in the background (see CS1ReplacePreview)
+JOB_POLL_MS = 100 # how often the GUI checks on a background job, e.g. a retroactive replacement (see CS1RetroJob)
+
+# reports
+REPORT_MIN_RECURRING = 3 # custom comments given to at least this many students are worth adding to the rubric
+
+# opening student files (see CS1Launcher)
+OPENER_CMD = ['open'] # e.g., ['xdg-open'] on Linux, or ['code', '--reuse-window']
+OPENER_MULTIPLE_FILES = True # can OPENER_CMD take more than one file at once? (xdg-open can't)
 
 #####################
 ### GUI CONSTANTS ###
@@ -49,6 +74,7 @@ ENTRY_SM = 10
 ENTRY_MED = ENTRY_SM*2
 ENTRY_LG = ENTRY_SM*4
 TEXT_GRADESHEET = ENTRY_SM*8
+RUBRIC_LIST_HEIGHT = 600 # pixels of rubric criteria shown at once (the rest scroll, see CS1VirtualList)
 
 # GUI constants
 TEXT_0 = '1.0' # row 1, column 0 
@@ -86,6 +112,22 @@ def write_str_file(a_string:str, fname='GradeSheet.txt'):
     with open(fname, 'w') as f:
         f.write(a_string)
 
+def list_subdirs(directory:str) -> list:
+    ''' Returns the (sorted) student subdirectories of a lab directory, as full
+    filepaths, skipping the IGNORE_DIRS. Only goes one level deep.
+    >>> list_subdirs('test') # just GradeSheets, no student subdirectories
+    []
+    '''
+    all_subdirs = []
+    for (roots, subdirs, f) in os.walk(directory, topdown=True):
+        subdirs.sort()
+        for subdir in subdirs:
+            if subdir not in IGNORE_DIRS: #ignore some subdirectories
+                # give student subdirs full file path name
+                all_subdirs.append(os.path.join(roots, subdir))
+        break # only go one level deep into subdirectories
+    return all_subdirs
+
 ##################################
 ### STATIC METHODS: formatting ###
 def format_filename(root:str, fname:str) -> str:
@@ -159,22 +201,22 @@ def format_comment(line:str, max_chars=75, indent=3) -> str:
 
     # limit comment text width
     # breaking words by SPACES, not mid-word!
+    # Whenever a line reaches max_chars, it ends at the last space at or before that point
+    # (rfind jumps straight there, rather than looking at every character)
     limited = []
     start_line = 0
-    last_spc = 0
-    max_chars = max_chars-indent
-    for i in range(0, len(line)):
-        if line[i].isspace(): # keep track of last seen space
-            last_spc = i
-        if (i-(start_line+indent)) == max_chars: # we've reached the max num chars
-            limited.append(line[start_line: last_spc])
+    wrap_at = max_chars # (start_line+indent) + (max_chars-indent)
+    while 0 <= wrap_at < len(line): # we've reached the max num chars
+        last_spc = max(line.rfind(' ', 0, wrap_at+1), 0)
+        limited.append(line[start_line: last_spc])
+        if last_spc < start_line: # no space to break on, the rest stays on this line
             start_line = last_spc+1
-            i = last_spc+1
+            break
+        start_line = last_spc+1
+        wrap_at = start_line + max_chars
     # add last line
     limited.append(line[start_line:])
 
-    #limited = [line[i:i+_Comment.COMMENT_CHARS] for i in range(0, len(line), _Comment.COMMENT_CHARS)]
-
     to_str = str('\n'+indent*' ').join(limited)
     return to_str
 
@@ -12,7 +12,9 @@ This may, in fact, cause problems with parsing non-standard things.
 
 Held together by duct tape & if-loops by Iris Howley (2023)
 '''
+import itertools, re
 import CS1GradeOmaticUtils as gom_utils
+from CS1Similarity import loose_matches
 
 __all__ = ['GradeSheet']
 
@@ -31,6 +33,10 @@ class GradeSheet:
     REQS_TXT = gom_utils.REQS_TXT[: gom_utils.REQS_TXT.rfind(':')]
     GRADE_TXT = gom_utils.GRADE_TXT[: gom_utils.GRADE_TXT.rfind(':')]
     COMMENTS_TXT = gom_utils.COMMENT_TXT[: gom_utils.COMMENT_TXT.rfind(':')]
+    # case-insensitive header searches, for scan_sections
+    _REQS_RE = re.compile(re.escape(REQS_TXT), re.IGNORECASE)
+    _GRADE_RE = re.compile(re.escape(GRADE_TXT), re.IGNORECASE)
+    _COMMENTS_RE = re.compile(re.escape(COMMENTS_TXT), re.IGNORECASE)
 
     #############################
     ###      INITIALIZING     ###
@@ -50,6 +56,18 @@ class GradeSheet:
         self._grade = grade
         self._comments = comments
 
+    def copy(self):
+        ''' Returns a copy of this GradeSheet that can be modified without changing this one
+        (much cheaper than copy.deepcopy, as the strings inside don't need copying)
+        >>> gs = GradeSheet('2', '', [], 'B-', [Comment("++ Great work!", False, 0)])
+        >>> gs2 = gs.copy()
+        >>> gs2.replace_comment('++ Great work!', '++ Nice!')
+        True
+        >>> [str(gs.comments[0]), str(gs2.comments[0])]
+        ['++ Great work!', '++ Nice!']
+        '''
+        return GradeSheet(self._num, self._desc, [r.copy() for r in self._reqs], self._grade, [c.copy() for c in self._comments])
+
     def write_file(self, fname='GradeSheet.txt'):
         ''' Writes the GradeSheet to a file (using 'w', does NOT append)
             GradeSheet.txt is the default filename
@@ -80,13 +98,11 @@ class GradeSheet:
                 f = nc.filename if nc.filename else ''
                 self._comments[loc] = Comment(s + ' ' + f + ' ' + t, GradeSheet.code_loc(t)>=0, GradeSheet.get_indent(t))
                 success = True
-        if not success: # try a loose equivalence + replace entire comment just once
-            loc = 0
-            while loc < len(self._comments) and not success:
-                if self._comments[loc]._loose_equals(oc): # found a loose match
-                    success = True
-                    self._comments[loc] = nc
-                loc += 1
+        if not success and self._comments: # try a loose equivalence + replace entire comment just once
+            matches = loose_matches([oc.text], [c.text for c in self._comments])[0] # Comment._loose_equals, all at once
+            if matches: # found a loose match
+                success = True
+                self._comments[matches[0]] = nc
 
         return success # return T/F if found/not     
 
@@ -124,7 +140,48 @@ class GradeSheet:
         combined = sorted(cmnts_nofnames, key=comments_key) + sorted(cmnts_fnames, key=lambda c: c.filename) + cmnts_final
         #print([str(c) for c in combined])
         return combined
-    
+
+    @staticmethod
+    def prettify_str(gs_txt:str) -> str:
+        ''' Returns the given GradeSheet text with its comments section (everything
+        after the Comments from Graders: line) re-parsed and consistently formatted.
+        Everything above the comments section is left exactly as-is.
+        >>> GradeSheet.prettify_str("Grade:   A\\n\\nComments from Graders:\\n++     Great   work!")
+        'Grade:   A\\n\\nComments from Graders:\\n++ Great work!'
+        >>> GradeSheet.prettify_str("Grade:   A\\n++ Missing header")
+        'Grade:   A\\n\\nComments from Graders:\\n++ Missing header'
+        '''
+        comment_line = gs_txt.find(gom_utils.COMMENT_TXT)
+        # If someone deleted Comments line, put it back in, after Grade:
+        if comment_line < 0:
+            end_grade_ind = gs_txt.find(gom_utils.GRADE_TXT.strip())
+            newline_grade_ind = gs_txt.find('\n', end_grade_ind)
+            gs_txt = gs_txt[:newline_grade_ind] + '\n\n' + gom_utils.COMMENT_TXT + '\n' + gs_txt[newline_grade_ind:]
+            comment_line = gs_txt.find(gom_utils.COMMENT_TXT)
+
+        new_gs = gs_txt[:comment_line+len(gom_utils.COMMENT_TXT)] # just the gradesheet
+        if new_gs[-1] != '\n': # add newline after comment title, if needed
+            new_gs += '\n'
+        comments_gs = gs_txt[comment_line+len(gom_utils.COMMENT_TXT): ] # just the comments
+        comments = GradeSheet.iter_comments_section(comments_gs)
+        return new_gs + '\n'.join([str(c) for c in comments])
+
+    @staticmethod
+    def sort_str(gs_txt:str) -> str:
+        ''' Returns the given GradeSheet text with its comments section sorted
+        based upon filename/functionname (see sort_comments). Like prettify_str,
+        the comments are re-formatted along the way.
+        >>> GradeSheet.sort_str("Comments from Graders:\\n+ b.py: Second\\n+ a.py: First")
+        'Comments from Graders:\\n+ a.py: First\\n+ b.py: Second'
+        '''
+        comment_line = gs_txt.rfind(gom_utils.COMMENT_TXT)
+        just_gs = gs_txt[:comment_line+len(gom_utils.COMMENT_TXT)] # just the gradesheet
+        comments_gs = gs_txt[comment_line+len(gom_utils.COMMENT_TXT): ] # just the comments
+        comments = GradeSheet.parse_comments_section(comments_gs)
+
+        sorted_cmnts = [str(c) for c in GradeSheet.sort_comments(comments) or []]
+        return just_gs + '\n' + '\n'.join(sorted_cmnts)
+
 
     #############################
     ###     STATIC METHODS     ###
@@ -140,9 +197,56 @@ class GradeSheet:
             str_gs = f.readlines()
         return GradeSheet.parse_gradesheet_fromstr(str_gs)
 
+    @staticmethod
+    def read_grade_fromfile(fname: str):
+        '''Reads just the grade from the GradeSheet file at fname, without parsing
+        the rest: reads line-by-line, and stops at the first Grade: line.
+        Returns '' if the Grade: line is empty (not graded yet) and None if there isn't one.
+        >>> GradeSheet.read_grade_fromfile('test/GradeSheet-filled.txt')
+        'A'
+        >>> GradeSheet.read_grade_fromfile('test/GradeSheet-new.txt')
+        ''
+        '''
+        with open(fname, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if GradeSheet.is_grade_line(line):
+                    return GradeSheet.get_grade(line)
+        return None
+
+    @staticmethod
+    def scan_sections(txt_gs: str) -> dict:
+        '''Finds where each header of a GradeSheet is, without lowercasing or otherwise
+        copying the text: each search starts where it can, and stops at its first match.
+        Returns a dict of section name -> (header location, location of the newline ending
+        the header line), for 'title', 'reqs', 'grade' & 'comments', with -1 for anything not found.
+        Headers are matched case-insensitively, except the title ('GRADE');
+        the grade header is only looked for after the requirements header line.
+        >>> s = GradeSheet.scan_sections("GRADE SHEET FOR CS1 LAB 2\\nRequirements of this lab:\\n1. Test it\\ngrade:   A\\n\\nComments from Graders:\\n++ Yes")
+        >>> s['title'], s['reqs'], s['grade'], s['comments']
+        ((0, 25), (26, 51), (63, 73), (75, 97))
+        >>> GradeSheet.scan_sections("Grade:   A\\n++ Yes")['reqs']
+        (-1, -1)
+        '''
+        def with_end(loc:int) -> tuple: # (header location, end of its line)
+            return (loc, txt_gs.find('\n', loc)) if loc >= 0 else (-1, -1)
+        def search(regex, pos=0) -> int: # location of the first match, or -1
+            match = regex.search(txt_gs, pos)
+            return match.start() if match else -1
+
+        found = {'title': with_end(txt_gs.find(GradeSheet.TITLE_TXT1.split()[0])),
+                 'reqs': with_end(search(GradeSheet._REQS_RE))}
+        end_reqs = found['reqs'][1]
+        found['grade'] = with_end(search(GradeSheet._GRADE_RE, end_reqs) if end_reqs >= 0 else -1)
+        found['comments'] = with_end(search(GradeSheet._COMMENTS_RE))
+        return found
+
     @staticmethod
     def parse_gradesheet_fromstr(txt_gs: str):
         '''Reads in a grade sheet from given string, returns a GradeSheet object
+        >>> gs = GradeSheet.parse_gradesheet_fromstr("GRADE SHEET FOR CS1 LAB 2\\nRequirements of this lab:\\n1. Test it\\nGrade:   A\\n\\nComments from Graders:\\n++ Yes")
+        >>> gs.grade, [str(c) for c in gs.comments]
+        ('A', ['++ Yes'])
         '''
         num = 0
         desc = ''
@@ -153,39 +257,36 @@ class GradeSheet:
         if type(txt_gs) == list: # if it's a list...make it a string
             txt_gs = '\n'.join(txt_gs) 
 
-        # Check for headers, insert if missing
+        # Find all the headers in one go, insert (and re-scan) if missing
+        sections = GradeSheet.scan_sections(txt_gs)
         # GRADE SHEET FOR CS1 LAB
-        loc_gstitle = txt_gs.find(GradeSheet.TITLE_TXT1.split()[0])
-        end_gstitle = txt_gs.find('\n', loc_gstitle)
+        (loc_gstitle, end_gstitle) = sections['title']
         if loc_gstitle < 0:
             print("GradeSheet:: WARNING: No 'GRADE SHEET:' text found!")
             # add header, update start/end location values
             txt_gs = GradeSheet.TITLE_TXT1 + ' :\n' + txt_gs 
-            loc_gstitle = loc_gstitle = txt_gs.find(GradeSheet.TITLE_TXT1)
-            end_gstitle = txt_gs.find('\n', loc_gstitle) # reset the end
+            sections = GradeSheet.scan_sections(txt_gs)
+            (loc_gstitle, end_gstitle) = sections['title']
         else: # can only grab lab num/title if it's specified...
             num = GradeSheet.get_lab_num(txt_gs[loc_gstitle: end_gstitle])
             desc = GradeSheet.get_lab_desc(txt_gs[loc_gstitle: end_gstitle])
 
         # Requirements of this lab:
-        loc_reqs = txt_gs.lower().find(GradeSheet.REQS_TXT.lower())
-        end_reqs = txt_gs.find('\n', loc_reqs) # reqs line end
-        if loc_reqs < 0:
+        if sections['reqs'][0] < 0:
             print("GradeSheet:: WARNING: No 'Requirements:' text found!")
             # add header, update start/end location values
             txt_gs = txt_gs[:end_gstitle] + '\n' + GradeSheet.REQS_TXT + ':' + txt_gs[end_gstitle:]
-            loc_reqs = txt_gs.find(GradeSheet.REQS_TXT)
-            end_reqs = txt_gs.find('\n', loc_reqs) # reqs line end
+            sections = GradeSheet.scan_sections(txt_gs)
+        end_reqs = sections['reqs'][1] # reqs line end
         
         # Grade
-        loc_grd = txt_gs.lower().find(GradeSheet.GRADE_TXT.lower(), end_reqs)
-        end_grd = txt_gs.find('\n', loc_grd) # grade line end
+        (loc_grd, end_grd) = sections['grade'] # grade line end
         if loc_grd < 0:
             print("GradeSheet:: ERROR: No 'Grade:' text found!")
+            end_grd = txt_gs.find('\n', loc_grd)
             
         # Comments from Graders:
-        loc_cmt = txt_gs.lower().find(GradeSheet.COMMENTS_TXT.lower())
-        end_cmt = txt_gs.find('\n', loc_cmt) # grade line end
+        loc_cmt = sections['comments'][0]
         if loc_cmt < 0:
             print("GradeSheet:: WARNING: No 'Comments:' text found!")
             # add header, update start/end location values
@@ -438,30 +539,49 @@ class GradeSheet:
         >>> str(code_crits[0])
         '         `\\n def flip_horizontal(image):\\n    new_image = []\\n    for row in image:\\n       new_image = new_image + [row[::-1]]\\n    return new_image\\n\\n def flip_vertical(image):\\n    return image[::-1]\\n`'
         '''
-        lines = comments.split('\n')
-        # Empty Check
-        if len(lines) < 1 or (len(lines)==1 and GradeSheet.is_comments_line(lines[0])):
-            print("!::GradeSheet.parse_comments_section: Has no items.", comments)
-            return []
-        
+        return list(GradeSheet.iter_comments_section(comments))
+
+    @staticmethod
+    def iter_comments_section(comments):
+        ''' Like parse_comments_section, but yields each Comment object as soon as it's
+        complete (i.e., once the next top-level comment starts, as it may have subcomments).
+        comments is either a string of the comments section, or an iterable of its lines,
+        such as an open file.
+        Un-bulleted comments still come first, so if there are any, nothing is
+        yielded until the first bulleted comment.
+        >>> cmnts = GradeSheet.iter_comments_section(["Comments from Graders:\\n", "++ Great work!\\n", "- Needs comments\\n"])
+        >>> str(next(cmnts))
+        '++ Great work!'
+        >>> [str(c) for c in cmnts]
+        ['- Needs comments']
+        >>> with open('test/GradeSheet-filled.txt') as f:
+        ...     lines = itertools.dropwhile(lambda line: not GradeSheet.is_comments_line(line.strip()), f)
+        ...     str(next(GradeSheet.iter_comments_section(lines)))[:14]
+        '++ Great work!'
+        '''
+        if isinstance(comments, str):
+            lines = iter(comments.split('\n'))
+        else: # lines from a file keep their newlines
+            lines = (line[:-1] if line.endswith('\n') else line for line in comments)
+        first = next(lines, '')
         # Header Handling
-        if GradeSheet.is_comments_line(lines[0]): # don't need to parse the header
-            lines = lines[1:]
-        elif GradeSheet.COMMENTS_TXT in lines[0]: # if comment is on same line as header
-            lines[0] = lines[0].removeprefix(GradeSheet.COMMENTS_TXT+':').strip()
-        
-        # check to see if this comments section uses sub-comments
-        indents = sorted(list(set([GradeSheet.get_indent(i) for i in lines if GradeSheet.get_indent(i) >= 0])))
-        # [], [0], [0, 3], [0,2,3],[0,3,6,9]
-        is_indented =  indents and len(indents) > 1 # these are indented comments...
-        if not is_indented:
-            indents = [0]
-        
-        cmnts = []
-        curr_cmnt_txt = ''
+        if GradeSheet.is_comments_line(first): # don't need to parse the header
+            second = next(lines, None)
+            if second is None: # Empty Check
+                print("!::GradeSheet.parse_comments_section: Has no items.", comments if isinstance(comments, str) else first)
+                return
+            lines = itertools.chain([second], lines)
+        elif GradeSheet.COMMENTS_TXT in first: # if comment is on same line as header
+            lines = itertools.chain([first.removeprefix(GradeSheet.COMMENTS_TXT+':').strip()], lines)
+        else:
+            lines = itertools.chain([first], lines)
+
+        curr_cmnt = [] # pieces of the current comment's text, joined once it's complete
+        top_cmnt = None # latest top-level comment, still collecting subcomments
+        ready = [] # complete top-level comments, waiting on any un-bulleted ones to go first
         found_bullet = False
         in_code = False
-        un_bulleted = ''
+        un_bulleted = []
         for line in lines:
             #print("line", line)
             if GradeSheet.code_loc(line) < 0 and len(line) < 4: # skip short lines, but not code denotes
@@ -469,35 +589,57 @@ class GradeSheet:
             # it's a new bulleted comment or new piece of code
             elif GradeSheet.starts_with_bullet(line) or (not in_code and GradeSheet.code_loc(line) >= 0): 
                 # save existing comment, if it exists
-                if len(curr_cmnt_txt): 
+                if curr_cmnt: 
+                    curr_cmnt_txt = ''.join(curr_cmnt)
                     prev_indent = GradeSheet.get_indent(curr_cmnt_txt) #+ gom_utils.COMMENT_INDENT
                     is_code = GradeSheet.code_loc(curr_cmnt_txt) >= 0
-                    if  cmnts and (prev_indent > 0 or is_code): # prev comment was sub-comment w. existing comment...or code
-                        cmnts[-1].add_subcomment(Comment(curr_cmnt_txt, is_code, prev_indent+ gom_utils.COMMENT_INDENT))
+                    if top_cmnt and (prev_indent > 0 or is_code): # prev comment was sub-comment w. existing comment...or code
+                        top_cmnt.add_subcomment(Comment(curr_cmnt_txt, is_code, prev_indent+ gom_utils.COMMENT_INDENT))
                     else: # prev comment was top-level comment
-                        cmnts.append(Comment(curr_cmnt_txt, is_code, prev_indent+ gom_utils.COMMENT_INDENT)) 
+                        if top_cmnt:
+                            ready.append(top_cmnt)
+                        top_cmnt = Comment(curr_cmnt_txt, is_code, prev_indent+ gom_utils.COMMENT_INDENT)
                 # START: a code comment
                 if not in_code and GradeSheet.code_loc(line) >= 0: 
                     in_code = True
                 # START: a bulleted comment
                 else: 
+                    if not found_bullet: # no more un-bulleted comments after this
+                        ready = GradeSheet._bullet_unbulleted(''.join(un_bulleted)) + ready
                     found_bullet = True
-                curr_cmnt_txt = line.rstrip()
+                curr_cmnt = [line.rstrip()]
+                if found_bullet:
+                    yield from ready
+                    ready = []
             elif in_code: # continuing a code comment
-                curr_cmnt_txt += '\n' + line.rstrip()
+                curr_cmnt.append('\n' + line.rstrip())
                 if GradeSheet.code_loc(line)>=0: # ending a code comment
                     in_code = False
-            elif found_bullet and len(curr_cmnt_txt): # it's part of the existing comment
-                curr_cmnt_txt += ' ' + line.strip()
+            elif found_bullet and curr_cmnt: # it's part of the existing comment
+                curr_cmnt.append(' ' + line.strip())
             elif not found_bullet: # it's an un-bulleted comment
-                un_bulleted += line.strip() + ' '
+                un_bulleted.append(line.strip() + ' ')
             else:
                 print("WARNING::GradeSheet.parse_comments_section: Can't parse this comments line", line) 
+        if not found_bullet:
+            ready = GradeSheet._bullet_unbulleted(''.join(un_bulleted)) + ready
+        yield from ready
+        if top_cmnt:
+            yield top_cmnt
         # add the last captured comment
-        is_code = GradeSheet.code_loc(curr_cmnt_txt) >= 0
-        indent = GradeSheet.get_indent(curr_cmnt_txt)+gom_utils.COMMENT_INDENT
-        if len(curr_cmnt_txt): cmnts.append(Comment(curr_cmnt_txt, is_code, indent)) 
+        if curr_cmnt:
+            curr_cmnt_txt = ''.join(curr_cmnt)
+            is_code = GradeSheet.code_loc(curr_cmnt_txt) >= 0
+            indent = GradeSheet.get_indent(curr_cmnt_txt)+gom_utils.COMMENT_INDENT
+            yield Comment(curr_cmnt_txt, is_code, indent)
 
+    @staticmethod
+    def _bullet_unbulleted(un_bulleted:str) -> list:
+        ''' Splits un-bulleted comment text into sentences, and guesses a bullet for each.
+        Returns the list of Comments.
+        >>> [str(c) for c in GradeSheet._bullet_unbulleted("Nice job! You should test more. ")]
+        ['+ Nice job!', '- You should test more.']
+        '''
         fixed = []
         for line in GradeSheet.split_by_chars(un_bulleted, '.?!;'): # split by sentence
             if len(line) > 3: # don't add bullets to empty strings
@@ -514,8 +656,7 @@ class GradeSheet:
                 elif neg & set(set_lowered):
                     bullet = '-'
                 fixed.append(Comment(bullet + ' ' + line, False, gom_utils.COMMENT_INDENT)) # add bullet
-        
-        return fixed + cmnts
+        return fixed
     
     @staticmethod
     def split_by_chars(line:str, chars='.;!?') -> list:
@@ -539,16 +680,39 @@ class GradeSheet:
         >>> GradeSheet.split_by_chars('')
         []
         '''
+        # Only split on chars that aren't part of a function or file name, i.e. where
+        # the rest of the word from that char on (up to the next space) doesn't look like
+        # gom_utils.is_function_name or gom_utils.get_file_extension. Walking backwards,
+        # we already know what the rest of each word holds, so this is a single pass.
+        splits = []
+        word_end = len(line)-1 # like line.find(' ', index) -> -1, the last char isn't part of the word
+        has_underscore = has_extension = False
+        l_paren = r_paren = -1 # nearest parentheses in the rest of the word
+        for index in range(len(line)-1, -1, -1):
+            ch = line[index]
+            if ch == ' ': # new word (and an empty rest of word)
+                word_end = index
+                has_underscore = has_extension = False
+                l_paren = r_paren = -1
+            elif index < word_end:
+                if ch == '_':
+                    has_underscore = True
+                elif ch == '(':
+                    l_paren = index
+                elif ch == ')':
+                    r_paren = index
+                for ext in gom_utils.EXTENSIONS:
+                    if ch == ext[0] and line.startswith(ext, index) and index+len(ext) <= word_end:
+                        has_extension = True
+            is_function = has_underscore or (0 <= l_paren < r_paren)
+            if ch in chars and not is_function and not has_extension:
+                splits.append(index)
+
         to_list = []
         start_split = 0
-        for index in range(len(line)):
-            next_word = line[index:line.find(' ', index)]
-            if gom_utils.is_function_name(next_word) or gom_utils.get_file_extension(next_word):
-                # ignore functions and filenames!
-                continue
-            elif line[index] in chars:
-                to_list.append(line[start_split: index+1])
-                start_split = index+1
+        for index in reversed(splits):
+            to_list.append(line[start_split: index+1])
+            start_split = index+1
         if line[start_split: ]:
             to_list.append(line[start_split: ]) # add the last item
         return to_list
@@ -562,6 +726,15 @@ class GradeSheet:
     def filename(self, f):
         self._filename = f
 
+    @property
+    def comments(self) -> list:
+        ''' Returns the (top-level) Comments of this GradeSheet as a list
+        >>> gs = GradeSheet('2', '("Day of the Week")', [], 'B-', [Comment("++ Nice!", False, 3)])
+        >>> str(gs.comments[0])
+        '++ Nice!'
+        '''
+        return self._comments
+
     @property
     def grade(self) -> str:
         ''' Returns the grade for this Gradesheet as a string
@@ -629,7 +802,7 @@ class Comment:
     ''' This class represents a single Comment in the GradeSheet.
     Basically, a mapping from comment to its severity and filenames
     '''
-    __slots__ = ['_severity', '_filename', '_text', '_subcomments', '_indent', '_is_code']
+    __slots__ = ['_severity', '_filename', '_text', '_subcomments', '_indent', '_is_code', '_rendered', '_memo']
 
     # class [constant] variables, pulled from gom_utils
     SEVERITY = gom_utils.COMMENT_SEVERITY
@@ -650,6 +823,8 @@ class Comment:
         '''
         self._indent = indent*' '
         self._is_code = is_code
+        self._rendered = None # cached str() of this comment (w/o subcomments), see __str__
+        self._memo = None # cached (rendered parts, str()) of this comment & its subcomments
         self.severity = ''
         self.filename = ''
         self.text = ''    
@@ -664,6 +839,21 @@ class Comment:
             self.text = txt    
             self._subcomments = []    
 
+    def copy(self):
+        ''' Returns a copy of this Comment (and its subcomments)
+        >>> c1 = Comment("++ A single comment.", False, 3)
+        >>> c1.add_subcomment(Comment("   ~ A subcomment", False, 6))
+        >>> c2 = c1.copy()
+        >>> c2.subcomments[0].text = 'Changed'
+        >>> [str(c1.subcomments[0]), str(c2.subcomments[0])]
+        ['   ~ A subcomment', '   ~ Changed']
+        '''
+        cmnt = Comment.__new__(Comment)
+        for slot in Comment.__slots__:
+            setattr(cmnt, slot, getattr(self, slot))
+        cmnt._subcomments = [sc.copy() if isinstance(sc, Comment) else sc for sc in self._subcomments]
+        return cmnt
+
     def add_subcomment(self, cmnt):
         ''' Takes a comment, cmnt, and adds it to our
         list of sub-comments
@@ -673,6 +863,7 @@ class Comment:
         '   ~ Testing subcomment'
         '''
         self._subcomments.append(cmnt)
+        self._memo = None
 
     def pop(self, index=-1):
         ''' Returns and removes the subcomment at the specified location, index.
@@ -687,6 +878,7 @@ class Comment:
         '   * Three subcomment'
         '''
         if index < len(self._subcomments): # only remove if valid!
+            self._memo = None
             return self._subcomments.pop(index)
         return -1
 
@@ -761,6 +953,8 @@ class Comment:
         '  -'
         '''
         self._severity = s
+        self._rendered = None
+        self._memo = None
         
     @property
     def filename(self) -> str:
@@ -801,6 +995,8 @@ class Comment:
             self._filename = gom_utils.format_function_name(f) 
         else:
             self._filename = f
+        self._rendered = None
+        self._memo = None
 
     @property
     def text(self) -> str:
@@ -825,6 +1021,8 @@ class Comment:
             self._text = t
         else:
             self._text = standardize(t)
+        self._rendered = None
+        self._memo = None
 
     @property
     def subcomments(self) -> list:
@@ -851,6 +1049,7 @@ class Comment:
         '   * Another sub subcomment'
         '''
         self._subcomments = l
+        self._memo = None
 
     @property
     def comment(self) -> str:
@@ -899,22 +1098,35 @@ class Comment:
         >>> c5 = Comment("** Try out a header", False, 3)
         >>> str(c5)
         '\\n** Try out a header'
+        >>> c5.text = 'Changed header' # re-rendered after a change
+        >>> str(c5)
+        '\\n** Changed header'
+        >>> c5.add_subcomment(Comment("   - Sub", False, 6))
+        >>> c5.subcomments[0].text = 'Changed sub'
+        >>> str(c5)
+        '\\n** Changed header\\n   - Changed sub'
         '''
         if self._is_code: # special formatting if this is a code block
             return self.text
 
-        s = self.severity+' ' if self.severity else ''
-        f = self.filename+': ' if self.filename else ''
-        cmt = s + f + self.text
-        cmt_str = gom_utils.format_comment(cmt, gom_utils.MAX_CHARS_GRADESHEET-len(self._indent), len(self._indent))
-        # headers have newline before them
-        #print("Look for **", s)
-        if gom_utils.COMMENT_HEADER in s: 
-            cmt_str = '\n' + cmt_str.lstrip() # not sure where the extra space _before_ severity is coming from...
+        # Only re-format if severity, filename, or text changed since last time
+        if self._rendered is None:
+            s = self.severity+' ' if self.severity else ''
+            f = self.filename+': ' if self.filename else ''
+            cmt = s + f + self.text
+            cmt_str = gom_utils.format_comment(cmt, gom_utils.MAX_CHARS_GRADESHEET-len(self._indent), len(self._indent))
+            # headers have newline before them
+            #print("Look for **", s)
+            if gom_utils.COMMENT_HEADER in s: 
+                cmt_str = '\n' + cmt_str.lstrip() # not sure where the extra space _before_ severity is coming from...
+            self._rendered = cmt_str
         # print all subcomments
-        for sc in self._subcomments:
-            cmt_str += '\n' + str(sc)
-        return cmt_str
+        # (each caches its own str(), so the whole thing only needs re-joining
+        #  if one of those changed since last time, i.e. is a new str)
+        parts = [self._rendered] + [str(sc) for sc in self._subcomments]
+        if self._memo is None or len(self._memo[0]) != len(parts) or any(p is not m for (p, m) in zip(parts, self._memo[0])):
+            self._memo = (parts, '\n'.join(parts))
+        return self._memo[1]
     
     def __len__(self):
         ''' Returns the length of this comment, including severity, indent, etc.
@@ -955,7 +1167,7 @@ class Comment:
             return False    
 
         # around the same length of shared words?
-        return get_match_percent(other_txt, self.text) > 0.8
+        return get_match_percent(other_txt, self.text) > gom_utils.LOOSE_MATCH
    
     def __eq__(self, o):
         ''' Compares this comment to either another _Comment object, 
@@ -1027,6 +1239,17 @@ class _Requirement:
         self._subreqs = []
         self._req = rq
 
+    def copy(self):
+        ''' Returns a copy of this requirement, with its own subrequirements list
+        >>> r1 = _Requirement("1. Write efficient code.")
+        >>> r1.copy().add_subreq("Use only what is necessary.")
+        >>> r1.subreqs
+        []
+        '''
+        req = _Requirement(self._req)
+        req._subreqs = list(self._subreqs)
+        return req
+
     def add_subreq(self, sr:str):
         ''' Adds the given (str) subrequirement
         >>> r1 = _Requirement("1. Write efficient code.")
@@ -0,0 +1,164 @@
+'''
+The GradeSheetCache module keeps recently used GradeSheet.txt files in memory,
+both as text and (parsed lazily, when first asked for) as GradeSheet objects.
+
+Graders go back and forth between students a lot, and the Rubric-O-Matic's
+retroactive replacement parses the same GradeSheets the Grade-O-Matic just
+showed. Entries are keyed on (path, modification time, size), so a GradeSheet
+changed on disk (by us, a TA, or the BatchOmatic) is just a cache miss, and
+re-read. Only the gom_utils.GS_CACHE_CAPACITY most recently used GradeSheets
+are kept.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import os, io, threading
+from collections import OrderedDict
+import CS1GradeOmaticUtils as gom_utils
+from CS1GradeSheet import GradeSheet
+
+__all__ = ['GradeSheetCache']
+
+#############################
+### GRADESHEETCACHE CLASS ###
+#############################
+class GradeSheetCache:
+    ''' Bounded LRU cache of GradeSheet.txt files: path -> (key, text, parsed GradeSheet, prettified text)
+    Safe to share between threads.
+    '''
+    __slots__ = ['_capacity', '_entries', '_hits', '_misses', '_lock', 'parsed']
+
+    def __init__(self, capacity=gom_utils.GS_CACHE_CAPACITY):
+        ''' Creates an empty cache holding at most capacity GradeSheets
+        >>> cache = GradeSheetCache(2)
+        >>> [len(cache), cache.capacity, cache.hits, cache.misses]
+        [0, 2, 0, 0]
+        '''
+        self._capacity = max(capacity, 1)
+        self._entries = OrderedDict() # path -> [key, text, GradeSheet or None, prettified text or None]
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        self.parsed = None # ParsedCache of the lab, to load GradeSheets from rather than parse them (see CS1ParsedCache)
+
+    #############################
+    ###       LOOKING UP      ###
+    def text(self, fname:str) -> str:
+        ''' Returns the text of the GradeSheet file at fname (same as gom_utils.read_str_file)
+        >>> cache = GradeSheetCache()
+        >>> cache.text('test/GradeSheet-new.txt') == gom_utils.read_str_file('test/GradeSheet-new.txt')
+        True
+        >>> _ = cache.text('test/GradeSheet-new.txt')
+        >>> [cache.hits, cache.misses]
+        [1, 1]
+        '''
+        return self._entry(fname)[1]
+
+    def gradesheet(self, fname:str) -> GradeSheet:
+        ''' Returns the GradeSheet at fname, parsed (same as GradeSheet.parse_gradesheet_fromfile).
+        It's a copy, so it's fine to modify it.
+        >>> cache = GradeSheetCache()
+        >>> gs1 = cache.gradesheet('test/GradeSheet-filled.txt')
+        >>> gs1.replace_comment('++ Great work!', '++ Changed!')
+        True
+        >>> [str(c) for c in cache.gradesheet('test/GradeSheet-filled.txt').comments] == [str(c) for c in GradeSheet.parse_gradesheet_fromfile('test/GradeSheet-filled.txt').comments]
+        True
+        '''
+        entry = self._entry(fname)
+        with self._lock:
+            parsed = entry[2]
+        if parsed is None: # parse on first use, the same way parse_gradesheet_fromfile does
+            if self.parsed is not None:
+                parsed = self.parsed.gradesheet(fname, entry[1], entry[0])
+            else:
+                parsed = GradeSheet.parse_gradesheet_fromstr(io.StringIO(entry[1]).readlines())
+        with self._lock:
+            if entry[2] is None:
+                entry[2] = parsed
+            return entry[2].copy()
+
+    def prettified(self, fname:str) -> str:
+        ''' Returns the text of the GradeSheet at fname, prettified (see GradeSheet.prettify_str)
+        >>> GradeSheetCache().prettified('test/GradeSheet-fixprettify.txt') == GradeSheet.prettify_str(gom_utils.read_str_file('test/GradeSheet-fixprettify.txt'))
+        True
+        '''
+        entry = self._entry(fname)
+        with self._lock:
+            if entry[3] is None:
+                entry[3] = GradeSheet.prettify_str(entry[1])
+            return entry[3]
+
+    def _entry(self, fname:str) -> list:
+        ''' Returns the up-to-date cache entry for fname, (re-)reading the file if
+        it isn't cached, or changed since it was. Raises FileNotFoundError like open() would.
+        '''
+        stat = os.stat(fname)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(fname)
+            if entry is not None and entry[0] == key:
+                self._hits += 1
+                self._entries.move_to_end(fname)
+                return entry
+            self._misses += 1
+        entry = [key, gom_utils.read_str_file(fname), None, None] # read outside the lock, could be slow
+        with self._lock:
+            self._entries[fname] = entry
+            self._entries.move_to_end(fname)
+            while len(self._entries) > self._capacity: # evict least recently used
+                self._entries.popitem(last=False)
+        return entry
+
+    #############################
+    ###       UPDATING        ###
+    def invalidate(self, fname:str):
+        ''' Forgets the GradeSheet at fname, e.g. after writing to it (in case the
+        new version has the same size and modification time)
+        >>> cache = GradeSheetCache()
+        >>> _ = cache.text('test/GradeSheet-new.txt')
+        >>> cache.invalidate('test/GradeSheet-new.txt')
+        >>> len(cache)
+        0
+        '''
+        with self._lock:
+            self._entries.pop(fname, None)
+
+    def clear(self):
+        ''' Forgets every cached GradeSheet (hit/miss counts are kept)
+        '''
+        with self._lock:
+            self._entries.clear()
+
+    #############################
+    ###      PROPERTIES      ###
+    @property
+    def capacity(self) -> int:
+        ''' Returns the most GradeSheets this cache holds at once '''
+        return self._capacity
+
+    @property
+    def hits(self) -> int:
+        ''' Returns the number of lookups that were already cached
+        >>> cache = GradeSheetCache(1)
+        >>> for f in ['test/GradeSheet-new.txt', 'test/GradeSheet-filled.txt', 'test/GradeSheet-new.txt']:
+        ...     _ = cache.text(f)
+        >>> [cache.hits, cache.misses, len(cache)] # only holds 1, so GradeSheet-new got evicted
+        [0, 3, 1]
+        '''
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        ''' Returns the number of lookups that had to read the file '''
+        return self._misses
+
+    def __len__(self):
+        ''' Returns the number of GradeSheets currently cached '''
+        return len(self._entries)
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
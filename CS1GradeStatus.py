@@ -0,0 +1,160 @@
+'''
+The GradeStatus module keeps track of which students have been graded yet,
+i.e., which GradeSheet.txt files have something on their Grade: line.
+
+Only the Grade: line of each GradeSheet is read (see
+GradeSheet.read_grade_fromfile), and grades are remembered with the
+GradeSheet's modification time, so checking a whole lab again only re-reads
+the GradeSheets that changed. Those are read on a few threads at once, as
+it's mostly waiting on (possibly network-mounted) files, and on a background
+thread when a lab's opened (start_refresh), so the first student shows up
+straight away. A GradeSheet that can't be read (e.g., it isn't valid text) is
+left out, like one that doesn't exist, and listed by unreadable().
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import os, threading
+from concurrent.futures import ThreadPoolExecutor
+import CS1GradeOmaticUtils as gom_utils
+from CS1GradeSheet import GradeSheet
+
+__all__ = ['GradeStatus']
+
+#############################
+###   GRADESTATUS CLASS   ###
+#############################
+class GradeStatus:
+    ''' Grades of each student subdir, cached by GradeSheet modification time.
+    '''
+    __slots__ = ['_grades', '_errors', '_lock']
+
+    def __init__(self):
+        ''' Creates an empty grade status tracker
+        >>> len(GradeStatus())
+        0
+        '''
+        self._grades = {} # subdir -> (mtime_ns, size, grade or None)
+        self._errors = {} # subdir -> why its GradeSheet couldn't be read
+        self._lock = threading.Lock()
+
+    def grade(self, subdir:str):
+        ''' Returns the grade in the given (full path) student subdir's GradeSheet,
+        '' if it's not graded yet, or None if it doesn't have a GradeSheet (or a Grade: line),
+        or it can't be read. Only reads the GradeSheet if it changed since last time.
+        '''
+        fname = gom_utils.format_filename(subdir, gom_utils.FILENAME_GS)
+        try:
+            stat = os.stat(fname)
+        except OSError:
+            with self._lock:
+                self._grades.pop(subdir, None)
+                self._errors.pop(subdir, None)
+            return None
+        with self._lock:
+            cached = self._grades.get(subdir)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        try:
+            grade = GradeSheet.read_grade_fromfile(fname)
+        except (OSError, ValueError) as e: # (UnicodeDecodeError is a ValueError)
+            print("GradeStatus:: could not read the grade in", fname, e)
+            with self._lock:
+                self._grades[subdir] = (stat.st_mtime_ns, stat.st_size, None) # (not re-read until it changes)
+                self._errors[subdir] = type(e).__name__
+            return None
+        with self._lock:
+            self._grades[subdir] = (stat.st_mtime_ns, stat.st_size, grade)
+            self._errors.pop(subdir, None)
+        return grade
+
+    def is_graded(self, subdir:str) -> bool:
+        ''' Returns True if the student subdir's GradeSheet has a grade
+        >>> GradeStatus().is_graded('test/no-such-student')
+        False
+        '''
+        return bool(self.grade(subdir))
+
+    def refresh(self, subdirs, workers=gom_utils.STATUS_WORKERS) -> dict:
+        ''' Brings the grades of all the given (full path) subdirs up to date,
+        and returns them as {subdir: grade}
+        '''
+        subdirs = list(subdirs)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            grades = list(pool.map(self.grade, subdirs))
+        return dict(zip(subdirs, grades))
+
+    def start_refresh(self, subdirs, workers=gom_utils.STATUS_WORKERS) -> threading.Thread:
+        ''' Starts refresh() on a background thread, and returns the thread (the GUI can
+        check is_alive() with after(), rather than waiting on every GradeSheet in the lab)
+        '''
+        thread = threading.Thread(target=self.refresh, args=(list(subdirs), workers), daemon=True)
+        thread.start()
+        return thread
+
+    def unreadable(self, subdirs) -> dict:
+        ''' Returns {subdir: error name} of the given subdirs whose GradeSheet couldn't be read
+        (as of the last time they were checked).
+        >>> import tempfile, contextlib, io
+        >>> lab = tempfile.mkdtemp()
+        >>> for (name, gs_bytes) in [('s1', b'Grade: A\\n'), ('s2', b'\\xe9\\xff Grade: B\\n')]:
+        ...     os.mkdir(os.path.join(lab, name))
+        ...     with open(os.path.join(lab, name, gom_utils.FILENAME_GS), 'wb') as f:
+        ...         _ = f.write(gs_bytes)
+        >>> status = GradeStatus()
+        >>> with contextlib.redirect_stdout(io.StringIO()): # (the warning)
+        ...     grades = status.refresh([os.path.join(lab, sd) for sd in ('s1', 's2')])
+        >>> [sorted(grades.values(), key=str), list(status.unreadable(grades).values())]
+        [['A', None], ['UnicodeDecodeError']]
+        '''
+        with self._lock:
+            return {sd: self._errors[sd] for sd in subdirs if sd in self._errors}
+
+    def next_ungraded(self, roster, current=None):
+        ''' Returns the (full path) of the first ungraded student after current in the
+        roster, wrapping around to the start, or None if everyone's graded.
+        Students without a GradeSheet are skipped.
+        >>> import tempfile
+        >>> from CS1Roster import Roster
+        >>> lab = tempfile.mkdtemp()
+        >>> for (name, grade) in [('s1', 'A'), ('s2', ''), ('s3', 'B+'), ('s4', '')]:
+        ...     os.mkdir(os.path.join(lab, name))
+        ...     gom_utils.write_str_file('Requirements of this lab:\\n' + gom_utils.GRADE_TXT + grade + '\\n', os.path.join(lab, name, gom_utils.FILENAME_GS))
+        >>> roster = Roster([os.path.join(lab, sd) for sd in ['s1', 's2', 's3', 's4', 's5']])
+        >>> status = GradeStatus()
+        >>> status.progress(roster)
+        (2, 4)
+        >>> gom_utils.get_filename(status.next_ungraded(roster, roster[1]))
+        's4'
+        >>> gom_utils.get_filename(status.next_ungraded(roster, roster[3])) # wraps around
+        's2'
+        '''
+        start = roster.index(current)+1 if current is not None and current in roster else 0
+        for i in range(len(roster)):
+            subdir = roster[(start+i) % len(roster)]
+            if subdir != current and self.grade(subdir) == '':
+                return subdir
+        return None
+
+    def progress(self, roster, refresh=True) -> tuple:
+        ''' Returns (number graded, number of students with a GradeSheet) in the roster.
+        If refresh is False, just counts what's already known (no file access at all).
+        '''
+        if refresh:
+            grades = self.refresh(roster)
+        else:
+            with self._lock:
+                grades = {sd: self._grades[sd][2] for sd in roster if sd in self._grades}
+        with_gs = [g for g in grades.values() if g is not None]
+        return (sum(1 for g in with_gs if g), len(with_gs))
+
+    def __len__(self):
+        ''' Returns the number of GradeSheets we know the grade of '''
+        return len(self._grades)
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,181 @@
+'''
+The LabIndex module lists a lab directory's student subdirectories, and the
+files in each, using os.scandir. The listing is saved alongside the lab (see
+gom_utils.FILENAME_LAB_INDEX) with each directory's modification time, so
+re-opening a lab only re-lists the directories that changed since: a
+directory's modification time changes whenever files are added, removed or
+renamed in it.
+
+Only the files directly inside each student subdirectory are listed, as those
+are the only ones the Grade-O-Matic opens.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import os, json, threading
+import CS1GradeOmaticUtils as gom_utils
+
+__all__ = ['LabIndex', 'list_files']
+
+def list_files(directory:str) -> list:
+    ''' Returns the (sorted) names of the files directly inside directory
+    >>> 'GradeSheet-new.txt' in list_files('test')
+    True
+    '''
+    with os.scandir(directory) as entries:
+        return sorted(e.name for e in entries if e.is_file())
+
+#############################
+###    LABINDEX CLASS     ###
+#############################
+class LabIndex:
+    ''' Cached listing of a lab directory: student subdir -> files in it.
+    Safe to share between threads.
+    '''
+    __slots__ = ['_labdir', '_mtime', '_subdirs', '_changed', '_lock']
+
+    VERSION = 1 # bump if the saved format changes
+
+    def __init__(self, lab_directory:str, load=True):
+        ''' Creates a listing of the given lab directory, loading the saved listing
+        from the lab directory if there is one (and load is True). Call refresh()
+        to bring it up to date.
+        >>> len(LabIndex('test', load=False))
+        0
+        '''
+        self._labdir = lab_directory
+        self._mtime = 0 # of the lab directory, when we last listed it
+        self._subdirs = {} # subdir name -> {'mtime': int, 'files': [names]}
+        self._changed = False # since last saved
+        self._lock = threading.Lock()
+        if load:
+            self.load()
+
+    def refresh(self) -> int:
+        ''' Brings the listing up to date, only re-listing subdirectories modified
+        since they were listed (and the lab directory itself, if subdirs were added/removed).
+        Saves the listing if anything changed. Returns the number of re-listed subdirectories.
+        >>> import tempfile
+        >>> lab = tempfile.mkdtemp()
+        >>> for name in ['s2', 's1', 'testing']: os.mkdir(os.path.join(lab, name))
+        >>> gom_utils.write_str_file('', os.path.join(lab, 's1', 'hello.py'))
+        >>> li = LabIndex(lab)
+        >>> li.refresh()
+        2
+        >>> li.files(os.path.join(lab, 's1'))
+        ['hello.py']
+        >>> LabIndex(lab).refresh() # saved, nothing changed since
+        0
+        '''
+        lab_mtime = os.stat(self._labdir).st_mtime_ns
+        with self._lock:
+            if lab_mtime != self._mtime: # subdirs might've been added/removed
+                with os.scandir(self._labdir) as entries:
+                    names = [e.name for e in entries if e.is_dir() and e.name not in gom_utils.IGNORE_DIRS]
+                for name in set(self._subdirs) - set(names):
+                    del self._subdirs[name]
+                self._mtime = lab_mtime
+                self._changed = True
+            else:
+                names = list(self._subdirs)
+        count = 0
+        for name in names:
+            if self._relist(name):
+                count += 1
+        self.save()
+        return count
+
+    def _relist(self, name:str) -> bool:
+        ''' Re-lists the files in the subdir with the given name, if it changed
+        since it was last listed. Returns True if it was re-listed.
+        '''
+        path = os.path.join(self._labdir, name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with self._lock:
+                listed = self._subdirs.get(name)
+                if listed is not None and listed['mtime'] == mtime:
+                    return False
+            files = list_files(path)
+        except OSError: # it's gone
+            with self._lock:
+                if self._subdirs.pop(name, None) is not None:
+                    self._changed = True
+            return False
+        with self._lock:
+            self._subdirs[name] = {'mtime': mtime, 'files': files}
+            self._changed = True
+        return True
+
+    #############################
+    ###       LOOKING UP      ###
+    def subdirs(self) -> list:
+        ''' Returns the (sorted) student subdirectories, as full filepaths
+        (same as gom_utils.list_subdirs, as of the last refresh())
+        '''
+        with self._lock:
+            return [os.path.join(self._labdir, name) for name in sorted(self._subdirs)]
+
+    def files(self, subdir:str) -> list:
+        ''' Returns the names of the files in the given (full path) student subdir,
+        re-listing it first if it changed since it was listed.
+        '''
+        name = gom_utils.get_filename(subdir)
+        self._relist(name)
+        with self._lock:
+            listed = self._subdirs.get(name)
+            return list(listed['files']) if listed else []
+
+    #############################
+    ###      LOAD / SAVE      ###
+    @property
+    def filename(self) -> str:
+        ''' Returns where this listing is saved.
+        >>> LabIndex('test', load=False).filename
+        'test/.gradeomatic-index.json'
+        '''
+        return gom_utils.format_filename(self._labdir, gom_utils.FILENAME_LAB_INDEX)
+
+    def load(self) -> bool:
+        ''' Loads the saved listing from the lab directory. Returns False (and starts
+        an empty listing) if there isn't one, or it can't be read.
+        '''
+        try:
+            with open(self.filename, 'r') as f:
+                saved = json.load(f)
+            if saved.get('version') != LabIndex.VERSION:
+                raise ValueError('old version')
+            with self._lock:
+                self._mtime = saved['mtime']
+                self._subdirs = saved['subdirs']
+                self._changed = False
+            return True
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._mtime = 0
+                self._subdirs = {}
+            return False
+
+    def save(self):
+        ''' Saves the listing to the lab directory (overwriting), if it changed since last saved.
+        '''
+        with self._lock:
+            if not self._changed:
+                return
+            try:
+                with open(self.filename, 'w') as f:
+                    json.dump({'version': LabIndex.VERSION, 'mtime': self._mtime, 'subdirs': self._subdirs}, f)
+                self._changed = False
+            except OSError as e:
+                print("LabIndex:: save: could not save the lab listing:", e)
+
+    def __len__(self):
+        ''' Returns the number of student subdirectories listed '''
+        return len(self._subdirs)
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
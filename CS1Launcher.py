@@ -0,0 +1,121 @@
+'''
+The Launcher module opens a student's files (code, text, images) in their
+default viewers for grading.
+
+All of a student's files are opened with one run of the opener command
+(gom_utils.OPENER_CMD, 'open' on a Mac), or one run per file if it can only
+take one at a time (e.g., xdg-open), without a shell, so paths with spaces
+are fine. That runs on a background thread, so the GUI doesn't wait for it.
+RecordingLauncher opens nothing and just remembers what it was asked to open,
+for testing and headless runs.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import CS1GradeOmaticUtils as gom_utils
+
+__all__ = ['Launcher', 'RecordingLauncher']
+
+#############################
+###     LAUNCHER CLASS    ###
+#############################
+class Launcher:
+    ''' Opens files with the opener command, off the calling thread.
+    '''
+    __slots__ = ['_opener', '_multiple_files', '_pool']
+
+    def __init__(self, opener=gom_utils.OPENER_CMD, multiple_files=gom_utils.OPENER_MULTIPLE_FILES):
+        ''' Creates a launcher for the given opener command, a list of the program
+        and any arguments (files to open are added to the end). multiple_files is
+        whether it can open more than one file at once.
+        >>> Launcher(['xdg-open'], multiple_files=False).opener
+        ['xdg-open']
+        '''
+        self._opener = list(opener)
+        self._multiple_files = multiple_files
+        self._pool = ThreadPoolExecutor(max_workers=1) # one at a time, in order
+
+    def launch(self, files:list):
+        ''' Opens all of the given files, in the background. Returns a Future of
+        the commands' return code (0 if they all worked), or None if there's nothing to open.
+        >>> Launcher().launch([]) is None
+        True
+        '''
+        if not files:
+            return None
+        return self._pool.submit(self._run, list(files))
+
+    def commands(self, files:list) -> list:
+        ''' Returns the commands (argument lists) that'll open the given files
+        >>> Launcher(['open'], multiple_files=True).commands(['s1/a.py', 's1/my file.py'])
+        [['open', 's1/a.py', 's1/my file.py']]
+        >>> Launcher(['xdg-open'], multiple_files=False).commands(['s1/a.py', 's1/my file.py'])
+        [['xdg-open', 's1/a.py'], ['xdg-open', 's1/my file.py']]
+        '''
+        if self._multiple_files:
+            return [self._opener + files]
+        return [self._opener + [f] for f in files]
+
+    def _run(self, files:list) -> int:
+        ''' Runs the opener on files (on the pool's thread)
+        '''
+        returncode = 0
+        for cmd in self.commands(files):
+            try:
+                proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            except OSError as e: # e.g., opener isn't installed
+                print("Launcher:: could not run", cmd[0], e)
+                return -1
+            if proc.returncode:
+                print("Launcher::", ' '.join(cmd), "failed:", proc.stderr.strip())
+                returncode = proc.returncode
+        return returncode
+
+    def shutdown(self):
+        ''' Stops the background thread, once it's opened everything asked for
+        '''
+        self._pool.shutdown(wait=False)
+
+    @property
+    def opener(self) -> list:
+        ''' Returns the opener command '''
+        return self._opener
+
+#############################
+### RECORDINGLAUNCHER CLASS ###
+#############################
+class RecordingLauncher(Launcher):
+    ''' Doesn't open anything, just records each list of files it was asked to open.
+    '''
+    __slots__ = ['launched']
+
+    def __init__(self, opener=gom_utils.OPENER_CMD, multiple_files=gom_utils.OPENER_MULTIPLE_FILES):
+        ''' Creates a launcher that records instead of opening
+        >>> rl = RecordingLauncher()
+        >>> rl.launch(['s1/a.py', 's1/b.py'])
+        >>> rl.launched
+        [['s1/a.py', 's1/b.py']]
+        '''
+        self._opener = list(opener)
+        self._multiple_files = multiple_files
+        self._pool = None
+        self.launched = []
+
+    def launch(self, files:list):
+        ''' Records the files, if there are any
+        '''
+        if files:
+            self.launched.append(list(files))
+
+    def shutdown(self):
+        ''' Nothing to stop '''
+        pass
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
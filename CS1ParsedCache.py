@@ -0,0 +1,371 @@
+'''
+The ParsedCache module keeps already-parsed GradeSheets in a sidecar file in
+the lab directory (.gradeomatic-parsed.bin), so bulk passes over a lab (e.g.,
+retroactive replacement & previews) can load a GradeSheet's requirements,
+grade and comments straight back, rather than re-running all of the parser's
+heuristics on its text every time.
+
+Each GradeSheet is stored in a compact binary layout (no pickle: strings and
+counts packed with struct), along with its file's (modification time, size)
+and a hash of its text. If the time & size are unchanged it's loaded as is;
+if not, but the text hashes the same (e.g., it was just touched or copied),
+it's still loaded; otherwise it's parsed again (lazily, when first asked for)
+and the sidecar is updated the next time it's saved.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import os, io, struct, hashlib, threading
+import CS1GradeOmaticUtils as gom_utils
+from CS1GradeSheet import GradeSheet, Comment, _Requirement
+from CS1FileTransaction import atomic_write
+
+__all__ = ['ParsedCache', 'dump_gradesheet', 'load_gradesheet', 'text_digest']
+
+MAGIC = b'GOMP' # start of the sidecar file
+_HEADER = struct.Struct('<4sHI') # magic, version, number of GradeSheets
+_ENTRY = struct.Struct('<qQ16sI') # modification time (ns), size, text digest, length of the GradeSheet's bytes
+_COUNT = struct.Struct('<I') # string lengths & list lengths
+_FLAGS = struct.Struct('<B')
+
+# flags of a GradeSheet's lab number, and of each (sub)comment
+_NUM_INT = 0
+_NUM_STR = 1
+_IS_COMMENT = 1
+_IS_CODE = 2
+
+def text_digest(txt:str) -> bytes:
+    ''' Returns a (16 byte) hash of a GradeSheet's text
+    >>> len(text_digest('Grade:   A'))
+    16
+    '''
+    return hashlib.blake2b(txt.encode('utf-8'), digest_size=16).digest()
+
+#############################
+###   BINARY GRADESHEETS  ###
+#############################
+def _dump_str(parts:list, s:str):
+    ''' Adds the length & utf-8 bytes of s to parts '''
+    b = s.encode('utf-8')
+    parts.append(_COUNT.pack(len(b)))
+    parts.append(b)
+
+def _dump_comment(parts:list, cmnt):
+    ''' Adds a Comment (and its subcomments), or a plain str subcomment, to parts '''
+    if not isinstance(cmnt, Comment):
+        parts.append(_FLAGS.pack(0))
+        _dump_str(parts, cmnt)
+        return
+    parts.append(_FLAGS.pack(_IS_COMMENT | (_IS_CODE if cmnt._is_code else 0)))
+    for s in (cmnt._severity, cmnt._filename, cmnt._text, cmnt._indent):
+        _dump_str(parts, s)
+    parts.append(_COUNT.pack(len(cmnt._subcomments)))
+    for sc in cmnt._subcomments:
+        _dump_comment(parts, sc)
+
+def dump_gradesheet(gradesheet) -> bytes:
+    ''' Returns the GradeSheet packed into bytes (see load_gradesheet)
+    '''
+    parts = []
+    if isinstance(gradesheet._num, str):
+        parts.append(_FLAGS.pack(_NUM_STR))
+        _dump_str(parts, gradesheet._num)
+    else: # 0, when there's no lab number
+        parts.append(_FLAGS.pack(_NUM_INT))
+        parts.append(_COUNT.pack(gradesheet._num))
+    _dump_str(parts, gradesheet._desc)
+    _dump_str(parts, gradesheet._grade)
+    parts.append(_COUNT.pack(len(gradesheet._reqs)))
+    for req in gradesheet._reqs:
+        _dump_str(parts, req._req)
+        parts.append(_COUNT.pack(len(req._subreqs)))
+        for sr in req._subreqs:
+            _dump_str(parts, sr)
+    parts.append(_COUNT.pack(len(gradesheet._comments)))
+    for cmnt in gradesheet._comments:
+        _dump_comment(parts, cmnt)
+    return b''.join(parts)
+
+class _Reader:
+    ''' Reads back what the _dump functions wrote, from the start of some bytes '''
+    __slots__ = ['_buf', '_pos']
+
+    def __init__(self, buf:bytes):
+        self._buf = buf
+        self._pos = 0
+
+    def take(self, n:int) -> bytes:
+        ''' Returns the next n bytes. Raises ValueError if there aren't n left (e.g., a truncated file).
+        >>> _Reader(b'abc').take(4)
+        Traceback (most recent call last):
+        ...
+        ValueError: expected 4 bytes, only 3 left
+        '''
+        if self._pos + n > len(self._buf):
+            raise ValueError('expected ' + str(n) + ' bytes, only ' + str(len(self._buf) - self._pos) + ' left')
+        b = self._buf[self._pos:self._pos+n]
+        self._pos += n
+        return b
+
+    def unpack(self, st:struct.Struct) -> tuple:
+        ''' Returns the next values, packed with st '''
+        vals = st.unpack_from(self._buf, self._pos)
+        self._pos += st.size
+        return vals
+
+    def count(self) -> int:
+        ''' Returns the next length/count '''
+        return self.unpack(_COUNT)[0]
+
+    def str(self) -> str:
+        ''' Returns the next string '''
+        return str(self.take(self.count()), 'utf-8')
+
+    def bytes(self, n:int) -> bytes:
+        ''' Returns the next n bytes '''
+        return self.take(n)
+
+    def comment(self):
+        ''' Returns the next Comment (with its subcomments), or str subcomment '''
+        (flags,) = self.unpack(_FLAGS)
+        if not flags & _IS_COMMENT:
+            return self.str()
+        cmnt = Comment.__new__(Comment) # without re-parsing its text
+        cmnt._is_code = bool(flags & _IS_CODE)
+        (cmnt._severity, cmnt._filename, cmnt._text, cmnt._indent) = (self.str(), self.str(), self.str(), self.str())
+        cmnt._rendered = None
+        cmnt._memo = None
+        cmnt._subcomments = [self.comment() for i in range(self.count())]
+        return cmnt
+
+def load_gradesheet(data:bytes):
+    ''' Returns the GradeSheet packed into data by dump_gradesheet
+    >>> import contextlib
+    >>> gs = GradeSheet.parse_gradesheet_fromfile('test/GradeSheet-filled.txt')
+    >>> gs2 = load_gradesheet(dump_gradesheet(gs))
+    >>> with contextlib.redirect_stdout(io.StringIO()): # (GradeSheet's printing)
+    ...     same = str(gs2) == str(gs)
+    >>> same
+    True
+    '''
+    r = _Reader(data)
+    (num_flag,) = r.unpack(_FLAGS)
+    num = r.str() if num_flag == _NUM_STR else r.count()
+    (desc, grade) = (r.str(), r.str())
+    reqs = []
+    for i in range(r.count()):
+        req = _Requirement(r.str())
+        req._subreqs = [r.str() for j in range(r.count())]
+        reqs.append(req)
+    comments = [r.comment() for i in range(r.count())]
+    return GradeSheet(num, desc, reqs, grade, comments)
+
+#############################
+###   PARSEDCACHE CLASS   ###
+#############################
+class ParsedCache:
+    ''' Parsed GradeSheets of a lab, kept in a binary sidecar file: relative filename -> (mtime_ns, size, text digest, GradeSheet bytes).
+    Safe to share between threads.
+    >>> import shutil, tempfile
+    >>> with tempfile.TemporaryDirectory() as lab:
+    ...     fname = os.path.join(lab, 'GradeSheet.txt')
+    ...     _ = shutil.copy('test/GradeSheet-filled.txt', fname)
+    ...     pc = ParsedCache(lab)
+    ...     first = pc.gradesheet(fname).grade
+    ...     pc.save()
+    ...     pc2 = ParsedCache(lab) # e.g., the next time the lab's opened
+    ...     [first, pc2.gradesheet(fname).grade, len(pc2), pc.misses, pc2.hits, pc2.misses]
+    ['A', 'A', 1, 1, 1, 0]
+    '''
+    __slots__ = ['_labdir', '_entries', '_dirty', '_hits', '_misses', '_lock']
+
+    VERSION = 1 # of the saved sidecar, bump if its layout (or the parser's output) changes
+
+    def __init__(self, lab_directory:str, load=True):
+        ''' Creates the cache of parsed GradeSheets for the given lab directory,
+        loading the saved sidecar if there is one (and load is True)
+        '''
+        self._labdir = lab_directory
+        self._entries = {} # relative filename -> (mtime_ns, size, digest, GradeSheet bytes)
+        self._dirty = False # changed since loading/saving?
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        if load:
+            self.load()
+
+    #############################
+    ###       LOOKING UP      ###
+    def gradesheet(self, fname:str, txt=None, stat_key=None):
+        ''' Returns the GradeSheet at fname (same as GradeSheet.parse_gradesheet_fromfile),
+        from the sidecar if it's up to date, otherwise parsing it (and keeping the result).
+        txt is the file's text, and stat_key its (mtime_ns, size) from before it was read,
+        if they're already known. If stat_key is the same as when it was kept, txt isn't even
+        hashed. It's a new GradeSheet each time, so it's fine to modify it.
+        Raises FileNotFoundError like open() would.
+        >>> import shutil, tempfile
+        >>> with tempfile.TemporaryDirectory() as lab:
+        ...     fname = shutil.copy('test/GradeSheet-filled.txt', os.path.join(lab, 'GradeSheet.txt'))
+        ...     stat = os.stat(fname)
+        ...     pc = ParsedCache(lab, load=False)
+        ...     txt = gom_utils.read_str_file(fname)
+        ...     first = pc.gradesheet(fname, txt, (stat.st_mtime_ns, stat.st_size))
+        ...     again = pc.gradesheet(fname, 'not even looked at', (stat.st_mtime_ns, stat.st_size))
+        ...     [again.grade, pc.hits, pc.misses]
+        ['A', 1, 1]
+        '''
+        key = os.path.relpath(fname, self._labdir)
+        if stat_key is None and txt is None:
+            stat = os.stat(fname)
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and stat_key is not None and entry[:2] == tuple(stat_key): # unchanged file
+            gradesheet = self._load(key, entry)
+            if gradesheet is not None:
+                return gradesheet
+            entry = None
+
+        if txt is None:
+            txt = gom_utils.read_str_file(fname)
+        digest = text_digest(txt)
+        if entry is not None and entry[2] == digest: # touched, but the same text
+            gradesheet = self._load(key, entry)
+            if gradesheet is not None:
+                with self._lock:
+                    if stat_key is not None and entry[:2] != stat_key:
+                        self._entries[key] = tuple(stat_key) + entry[2:]
+                        self._dirty = True
+                return gradesheet
+
+        # parse it, the same way parse_gradesheet_fromfile does
+        gradesheet = GradeSheet.parse_gradesheet_fromstr(io.StringIO(txt).readlines())
+        with self._lock:
+            self._misses += 1
+            self._entries[key] = tuple(stat_key or (0, 0)) + (digest, dump_gradesheet(gradesheet))
+            self._dirty = True
+        return gradesheet
+
+    def _load(self, key:str, entry:tuple):
+        ''' Returns the GradeSheet packed in the entry, or None (forgetting the entry)
+        if it can't be unpacked, so it gets parsed again.
+        >>> import contextlib
+        >>> pc = ParsedCache('test', load=False)
+        >>> with contextlib.redirect_stdout(io.StringIO()): # (the warning)
+        ...     gradesheet = pc._load('GradeSheet.txt', (0, 0, b'', b'\\x01 not a GradeSheet'))
+        >>> gradesheet is None
+        True
+        '''
+        try:
+            gradesheet = load_gradesheet(entry[3])
+        except (ValueError, struct.error) as e:
+            print("ParsedCache:: could not load the parsed", key, "parsing it again:", e)
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    self._dirty = True
+            return None
+        with self._lock:
+            self._hits += 1
+        return gradesheet
+
+    #############################
+    ###      LOAD / SAVE      ###
+    @property
+    def filename(self) -> str:
+        ''' Returns where this cache is saved.
+        >>> ParsedCache('test', load=False).filename
+        'test/.gradeomatic-parsed.bin'
+        '''
+        return gom_utils.format_filename(self._labdir, gom_utils.FILENAME_PARSED)
+
+    def load(self) -> bool:
+        ''' Loads the saved sidecar from the lab directory. Returns False (and starts
+        an empty cache) if there isn't one, or it can't be read (e.g., it's cut short).
+        >>> import shutil, tempfile
+        >>> with tempfile.TemporaryDirectory() as lab:
+        ...     fname = shutil.copy('test/GradeSheet-filled.txt', os.path.join(lab, 'GradeSheet.txt'))
+        ...     pc = ParsedCache(lab)
+        ...     _ = pc.gradesheet(fname)
+        ...     pc.save()
+        ...     with open(pc.filename, 'rb') as f:
+        ...         data = f.read()
+        ...     with open(pc.filename, 'wb') as f:
+        ...         _ = f.write(data[:-40]) # e.g., partly copied
+        ...     [ParsedCache(lab).load(), len(ParsedCache(lab))]
+        [False, 0]
+        '''
+        entries = {}
+        try:
+            with open(self.filename, 'rb') as f:
+                r = _Reader(f.read())
+            (magic, version, num) = r.unpack(_HEADER)
+            if magic != MAGIC or version != ParsedCache.VERSION:
+                raise ValueError('not a sidecar of this version')
+            for i in range(num):
+                key = r.str()
+                (mtime, size, digest, length) = r.unpack(_ENTRY)
+                entries[key] = (mtime, size, digest, r.bytes(length))
+        except (OSError, ValueError, struct.error): # (UnicodeDecodeError is a ValueError)
+            entries = {}
+        with self._lock:
+            self._entries = entries
+            self._dirty = False
+        return bool(entries)
+
+    def save(self):
+        ''' Saves the cache to the lab directory (overwriting), if anything changed.
+        GradeSheets that don't exist anymore are dropped first.
+        >>> import shutil, tempfile
+        >>> with tempfile.TemporaryDirectory() as lab:
+        ...     fname = shutil.copy('test/GradeSheet-filled.txt', os.path.join(lab, 'GradeSheet.txt'))
+        ...     pc = ParsedCache(lab)
+        ...     _ = pc.gradesheet(fname)
+        ...     pc.save()
+        ...     os.remove(fname)
+        ...     pc.save()
+        ...     [len(pc), len(ParsedCache(lab))]
+        [0, 0]
+        '''
+        with self._lock:
+            keys = list(self._entries)
+        gone = [key for key in keys if not os.path.exists(os.path.join(self._labdir, key))] # (outside the lock, could be slow)
+        with self._lock:
+            for key in gone:
+                if self._entries.pop(key, None) is not None:
+                    self._dirty = True
+            if not self._dirty:
+                return
+            parts = [_HEADER.pack(MAGIC, ParsedCache.VERSION, len(self._entries))]
+            for (key, (mtime, size, digest, data)) in self._entries.items():
+                _dump_str(parts, key)
+                parts.append(_ENTRY.pack(mtime, size, digest, len(data)))
+                parts.append(data)
+            self._dirty = False
+        try:
+            atomic_write(self.filename, b''.join(parts))
+        except OSError as e:
+            print("ParsedCache:: save: could not save the parsed GradeSheets:", e)
+
+    #############################
+    ###      PROPERTIES      ###
+    @property
+    def hits(self) -> int:
+        ''' Returns the number of GradeSheets loaded without parsing '''
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        ''' Returns the number of GradeSheets that had to be parsed '''
+        return self._misses
+
+    def __len__(self):
+        ''' Returns the number of GradeSheets in this cache '''
+        return len(self._entries)
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,147 @@
+'''
+The Prefetcher module gets the next (and previous) student subdirectories ready
+while the grader is still working on the current one, so that moving between
+students doesn't wait on a (possibly network-mounted) grading directory.
+
+A worker thread walks each requested subdirectory and reads its GradeSheet.txt
+into the shared GradeSheetCache (prettifying it too, if asked). Finished
+subdirectories come back through a thread-safe queue, which the GUI drains
+with poll() from its own thread (e.g. with tk's after()), so Tk itself is
+never touched off the main thread.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import os, queue, threading
+import CS1GradeOmaticUtils as gom_utils
+
+__all__ = ['Prefetcher', 'walk_subdir']
+
+def walk_subdir(subdir:str) -> list:
+    ''' Returns the names of all files in the student subdir, in os.walk order
+    (i.e., what GradeOmatic.load_subdir iterates over)
+    >>> 'GradeSheet-new.txt' in walk_subdir('test')
+    True
+    '''
+    all_files = []
+    for (r2, d2, files) in os.walk(subdir, topdown=True):
+        all_files.extend(files)
+    return all_files
+
+#############################
+###    PREFETCHER CLASS   ###
+#############################
+class Prefetcher:
+    ''' Walks & reads student subdirectories on a background thread, ahead of time.
+    '''
+    __slots__ = ['_cache', '_requests', '_results', '_ready', '_thread', 'lister']
+
+    def __init__(self, gs_cache, lister=walk_subdir):
+        ''' Starts a prefetching thread that reads GradeSheets into gs_cache, a GradeSheetCache.
+        lister(subdir) returns the names of the files in a subdir (must be thread-safe).
+        >>> from CS1GradeSheetCache import GradeSheetCache
+        >>> pf = Prefetcher(GradeSheetCache())
+        >>> pf.take('test') is None # nothing requested yet
+        True
+        >>> pf.stop()
+        '''
+        self._cache = gs_cache
+        self.lister = lister
+        self._requests = queue.Queue() # (subdir, prettify) to prefetch, or None to stop
+        self._results = queue.Queue() # (subdir, files) that are ready
+        self._ready = {} # subdir -> files, only touched by the thread calling poll()/take()
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def request(self, subdirs:list, prettify=False):
+        ''' Asks for the given (full path) subdirectories to be prefetched, in order.
+        Anything prefetched earlier that isn't one of these is thrown out.
+        '''
+        self.poll()
+        for sd in list(self._ready):
+            if sd not in subdirs:
+                del self._ready[sd]
+        for sd in subdirs:
+            if sd not in self._ready:
+                self._requests.put((sd, prettify))
+
+    def poll(self) -> int:
+        ''' Collects whatever the worker thread has finished. Doesn't wait.
+        Returns the number of subdirectories that became ready.
+        '''
+        count = 0
+        while True:
+            try:
+                (subdir, files) = self._results.get_nowait()
+            except queue.Empty:
+                return count
+            self._ready[subdir] = files
+            count += 1
+
+    def take(self, subdir:str):
+        ''' Returns the file names of the given subdirectory if it's been prefetched
+        (removing it), otherwise None. Its GradeSheet will be in the GradeSheetCache.
+        >>> from CS1GradeSheetCache import GradeSheetCache
+        >>> pf = Prefetcher(GradeSheetCache())
+        >>> pf.request(['test'])
+        >>> pf.wait()
+        >>> 'GradeSheet-new.txt' in pf.take('test')
+        True
+        >>> pf.take('test') is None # only once
+        True
+
+        A GradeSheet that can't be read is left to load the slow way, without stopping the prefetching:
+
+        >>> import tempfile, contextlib, io
+        >>> bad = tempfile.mkdtemp()
+        >>> with open(os.path.join(bad, gom_utils.FILENAME_GS), 'wb') as f:
+        ...     _ = f.write(b'\\xe9\\xff')
+        >>> with contextlib.redirect_stdout(io.StringIO()): # (the warning)
+        ...     pf.request([bad, 'test'])
+        ...     pf.wait()
+        >>> [pf.take(bad), 'GradeSheet-new.txt' in pf.take('test')]
+        [None, True]
+        >>> pf.stop()
+        '''
+        self.poll()
+        return self._ready.pop(subdir, None)
+
+    def wait(self):
+        ''' Blocks until every requested subdirectory has been prefetched
+        (for testing, the GUI should never need to wait)
+        '''
+        self._requests.join()
+
+    def stop(self):
+        ''' Stops the worker thread, once it finishes what it's doing
+        '''
+        self._requests.put(None)
+
+    def _work(self):
+        ''' Worker thread: prefetches requested subdirectories until stopped
+        '''
+        while True:
+            request = self._requests.get()
+            try:
+                if request is None:
+                    return
+                (subdir, prettify) = request
+                files = self.lister(subdir)
+                if gom_utils.FILENAME_GS in files:
+                    gs_fname = gom_utils.format_filename(subdir, gom_utils.FILENAME_GS)
+                    if prettify:
+                        self._cache.prettified(gs_fname)
+                    else:
+                        self._cache.text(gs_fname)
+                self._results.put((subdir, files))
+            except Exception as e: # it'll just get loaded the slow way (keep prefetching the rest)
+                print("Prefetcher:: could not prefetch", request[0], e)
+            finally:
+                self._requests.task_done()
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
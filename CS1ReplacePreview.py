@@ -0,0 +1,226 @@
+'''
+The ReplacePreview module works out what a Rubric-O-Matic retroactive
+replacement would do to each GradeSheet, without writing anything, so graders
+can see how many GradeSheets would change (and how) before replacing.
+
+First (in the background, as it can mean re-parsing GradeSheets) the lab's
+CommentIndex picks out the GradeSheets that might have the comments. Then a
+pool of worker threads does each one's replacement (same rules as the real
+thing), and puts a unified diff of it on a thread-safe queue as soon as it's
+done. The GUI drains the queue with poll() from its own thread (e.g. with
+tk's after()), the same way as the Prefetcher, so it stays responsive while a
+whole lab is previewed.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import difflib, queue, threading
+from concurrent.futures import ThreadPoolExecutor
+import CS1GradeOmaticUtils as gom_utils
+from CS1GradeSheet import GradeSheet
+
+__all__ = ['ReplacePreview', 'replaced_text', 'gradesheet_text', 'gradesheet_diff', 'matching_fnames', 'candidate_comments']
+
+def gradesheet_text(fname:str, gs_cache=None) -> str:
+    ''' Returns the text of the GradeSheet at fname, from gs_cache (a GradeSheetCache) if there is one
+    >>> gradesheet_text('test/GradeSheet-new.txt') == gom_utils.read_str_file('test/GradeSheet-new.txt')
+    True
+    '''
+    return gs_cache.text(fname) if gs_cache is not None else gom_utils.read_str_file(fname)
+
+def replaced_text(fname:str, pairs, gs_cache=None):
+    ''' Returns the text of the GradeSheet at fname after replacing each (former, new)
+    comment pair (see GradeSheet.replace_comment), or None if there's nothing to write:
+    nothing was found, or *significant* data loss (more than 50% of characters lost).
+    gs_cache is a GradeSheetCache to parse it from, if there is one.
+    >>> import contextlib, io
+    >>> with contextlib.redirect_stdout(io.StringIO()): # (GradeSheet's printing)
+    ...     results = [replaced_text('test/GradeSheet-filled.txt', [('++ Great work!', '++ Changed!')]),
+    ...                replaced_text('test/GradeSheet-filled.txt', [('++ Not in there at all', '++ Changed!')])]
+    >>> [results[0].count('Changed!'), results[1]]
+    [1, None]
+    '''
+    if gs_cache is not None:
+        gradesheet = gs_cache.gradesheet(fname)
+    else:
+        gradesheet = GradeSheet.parse_gradesheet_fromfile(fname)
+    len_gs_orig = len(str(gradesheet))
+    found = False
+    for (former_cmnt, new_cmnt) in pairs:
+        found = gradesheet.replace_comment(former_cmnt, new_cmnt) or found
+    new_txt = str(gradesheet)
+    if found and len_gs_orig//2 < len(new_txt):
+        return new_txt
+    return None
+
+def candidate_comments(pairs) -> list:
+    ''' Returns the comments a GradeSheet needs (one of) for replacing the (former, new) comment
+    pairs, in order, to change it: every former comment, and the new comment of every pair but
+    the last, as a later pair can replace what an earlier one put in (e.g., A -> B, then B -> C).
+    >>> candidate_comments([('++ A', '++ B'), ('++ B', '++ C'), ('- D', '- E')])
+    ['++ A', '++ B', '- D', '++ C']
+    '''
+    pairs = list(pairs)
+    cmnts = [former_cmnt for (former_cmnt, new_cmnt) in pairs] + [new_cmnt for (former_cmnt, new_cmnt) in pairs[:-1]]
+    return list(dict.fromkeys(cmnts)) # (without repeats, in order)
+
+def matching_fnames(fnames:list, pairs, comment_index=None) -> list:
+    ''' Returns just the GradeSheets at fnames that (might) have any of the candidate_comments of the
+    (former, new) comment pairs, according to the comment index (or all of them, if there isn't one).
+    Refreshes the index first, which re-parses any GradeSheet changed since, so keep it off the GUI thread.
+    >>> import os, shutil, tempfile, contextlib, io
+    >>> from CS1CommentIndex import CommentIndex
+    >>> with tempfile.TemporaryDirectory() as lab:
+    ...     ci = CommentIndex(lab, load=False)
+    ...     fnames = []
+    ...     for (sd, src) in [('s1', 'test/GradeSheet-filled.txt'), ('s2', 'test/GradeSheet-new.txt')]:
+    ...         os.mkdir(os.path.join(lab, sd))
+    ...         fnames.append(shutil.copy(src, os.path.join(lab, sd, gom_utils.FILENAME_GS)))
+    ...         with contextlib.redirect_stdout(io.StringIO()): # (GradeSheet's printing)
+    ...             ci.update_str(sd, gom_utils.read_str_file(fnames[-1]), os.stat(fnames[-1]).st_mtime)
+    ...     [os.path.relpath(fname, lab) for fname in matching_fnames(fnames, [('++ Great work!', '++ Changed!')], ci)]
+    ['s1/GradeSheet.txt']
+    >>> matching_fnames(['s1/GradeSheet.txt'], [('++ Great work!', '++ Changed!')])
+    ['s1/GradeSheet.txt']
+    '''
+    if comment_index is None:
+        return list(fnames)
+    subdirs = [gom_utils.get_filepath(fname) for fname in fnames]
+    comment_index.refresh(subdirs)
+    found_in = set()
+    for found in comment_index.find_many(candidate_comments(pairs)):
+        found_in.update(found)
+    return [fname for (fname, sd) in zip(fnames, subdirs) if gom_utils.get_filename(sd) in found_in]
+
+def gradesheet_diff(fname:str, old_txt:str, new_txt:str) -> str:
+    ''' Returns a unified diff of a GradeSheet's old and new text
+    >>> print(gradesheet_diff('s01/GradeSheet.txt', 'a\\nb\\n', 'a\\nc\\n'), end='')
+    --- s01/GradeSheet.txt
+    +++ s01/GradeSheet.txt (replaced)
+    @@ -1,2 +1,2 @@
+     a
+    -b
+    +c
+    '''
+    return ''.join(difflib.unified_diff(old_txt.splitlines(keepends=True), new_txt.splitlines(keepends=True),
+                                        fromfile=fname, tofile=fname+' (replaced)'))
+
+def _preview(fname:str, pairs, gs_cache):
+    ''' Returns (fname, new text or None, diff or '') of replacing pairs in the GradeSheet at fname '''
+    old_txt = gradesheet_text(fname, gs_cache)
+    new_txt = replaced_text(fname, pairs, gs_cache)
+    return (fname, new_txt, gradesheet_diff(fname, old_txt, new_txt) if new_txt is not None else '')
+
+#############################
+###  REPLACEPREVIEW CLASS ###
+#############################
+class ReplacePreview:
+    ''' A dry run of a retroactive replacement, done in the background.
+    >>> import contextlib, io
+    >>> with contextlib.redirect_stdout(io.StringIO()): # (GradeSheet's printing)
+    ...     preview = ReplacePreview(['test/GradeSheet-filled.txt', 'test/GradeSheet-new.txt', 'test/nope.txt'], [('++ Great work!', '++ Changed!')])
+    ...     preview.wait()
+    >>> results = sorted(preview.poll())
+    >>> [(fname, bool(diff), error) for (fname, new_txt, diff, error) in results]
+    [('test/GradeSheet-filled.txt', True, None), ('test/GradeSheet-new.txt', False, None), ('test/nope.txt', False, 'FileNotFoundError')]
+    >>> [preview.done, preview.selecting, preview.finished, preview.changed, len(preview)]
+    [True, False, 3, 1, 3]
+    '''
+    __slots__ = ['_pool', '_futures', '_results', '_lock', '_num_done', '_total', '_all_done', '_cancelled', 'finished', 'changed']
+
+    def __init__(self, fnames:list, pairs, gs_cache=None, comment_index=None, workers=gom_utils.PREVIEW_WORKERS):
+        ''' Starts previewing replacing each (former, new) comment pair in the GradeSheets at fnames
+        (just those that might have the comments, if there's a CommentIndex of the lab).
+        gs_cache is a (thread-safe) GradeSheetCache to parse them from, if there is one.
+        '''
+        self._results = queue.Queue() # (fname, new text or None, diff, error or None) that are done
+        self.finished = 0 # GradeSheets poll() has returned
+        self.changed = 0 # ... that would be changed
+        self._lock = threading.RLock() # (a future that's already done calls _done while it's being added)
+        self._num_done = 0 # GradeSheets finished (or cancelled) by the workers
+        self._all_done = threading.Event()
+        self._cancelled = threading.Event()
+        self._total = None # until the GradeSheets to preview have been picked out
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._futures = []
+        threading.Thread(target=self._start, args=(list(fnames), list(pairs), gs_cache, comment_index), daemon=True).start()
+
+    def _start(self, fnames:list, pairs:list, gs_cache, comment_index):
+        ''' (Starter thread) Picks out the GradeSheets to preview, then hands them to the workers '''
+        try:
+            fnames = matching_fnames(fnames, pairs, comment_index)
+        except Exception as e: # still preview, just all of them
+            print("ReplacePreview:: could not check the comment index, previewing every GradeSheet:", e)
+        with self._lock:
+            if self._cancelled.is_set():
+                fnames = []
+            self._total = len(fnames) # (the futures are still being made as the first ones finish)
+            if not fnames:
+                self._all_done.set()
+            for fname in fnames:
+                future = self._pool.submit(_preview, fname, pairs, gs_cache)
+                future.add_done_callback(lambda f, fname=fname: self._done(fname, f))
+                self._futures.append(future)
+        self._pool.shutdown(wait=False) # threads finish up once the work's done
+
+    def _done(self, fname:str, future):
+        ''' (Worker thread) Puts a finished GradeSheet on the results queue '''
+        if not future.cancelled():
+            error = future.exception()
+            if error is not None:
+                self._results.put((fname, None, '', type(error).__name__))
+            else:
+                self._results.put(future.result() + (None,))
+        with self._lock:
+            self._num_done += 1
+            if self._num_done == self._total:
+                self._all_done.set()
+
+    def poll(self) -> list:
+        ''' Returns the GradeSheets that finished since the last poll, as a list of
+        (fname, new text or None if unchanged, unified diff, error name or None). Doesn't wait.
+        '''
+        results = []
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            results.append(result)
+            self.finished += 1
+            self.changed += result[1] is not None
+        return results
+
+    @property
+    def selecting(self) -> bool:
+        ''' Returns True while the GradeSheets to preview are still being picked out '''
+        return self._total is None
+
+    @property
+    def done(self) -> bool:
+        ''' Returns True once every GradeSheet has been previewed (and poll()'d) or cancelled '''
+        return self._all_done.is_set() and self._results.empty()
+
+    def wait(self):
+        ''' Blocks until every GradeSheet has been previewed (for testing, the GUI should never need to wait)
+        '''
+        self._all_done.wait()
+
+    def cancel(self):
+        ''' Stops previewing any GradeSheets that haven't been started yet
+        '''
+        with self._lock:
+            self._cancelled.set()
+            for f in self._futures:
+                f.cancel()
+
+    def __len__(self):
+        ''' Returns the number of GradeSheets being previewed (0 while they're being picked out) '''
+        return self._total or 0
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,283 @@
+'''
+The Reports module summarizes a whole lab directory's GradeSheets at once,
+without opening every file by hand.
+
+The rubric usage report counts how many students got each rubric criterion
+(by the same exact/loose matching rules as the Rubric-O-Matic's retroactive
+replacement), how many comments there are of each severity and about each
+filename, and which custom (non-rubric) comments keep coming up, as candidates
+for adding to the rubric. GradeSheets are parsed via the lab's CommentIndex,
+i.e., on a pool of worker processes and only if they changed since last time.
+
+The grade distribution report lists every student's grade, and how many
+students got each grade. Only the Grade: line of each GradeSheet is read
+(via GradeStatus), a few GradeSheets at a time. GradeSheets that can't be read
+are counted as unreadable, rather than stopping the report.
+
+Usage (from the terminal):
+    python3 CS1Reports.py /grading-cs1/lab02 rubrics/rubric02.csv usage.csv
+    python3 CS1Reports.py /grading-cs1/lab02 rubrics/rubric02.csv usage.json
+    python3 CS1Reports.py /grading-cs1/lab02 grades grades.csv
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import csv, json
+import CS1GradeOmaticUtils as gom_utils
+from CS1CommentIndex import CommentIndex
+from CS1GradeStatus import GradeStatus
+from CS1Rubric import Rubric
+
+__all__ = ['GradeReport', 'UsageReport', 'grade_distribution', 'rubric_usage']
+
+UNREADABLE_GRADE = '?' # grade written to a CSV for a student whose GradeSheet couldn't be read
+
+def criteria_texts(rubric:Rubric) -> list:
+    ''' Returns the rubric's criteria (not headers) as comment text, the same way
+    the Rubric-O-Matic loads them
+    >>> criteria_texts(Rubric([['Major'], ['++', '', 'Great work!'], ['-', 'intro.py', 'Needs comments']]))
+    ['++  Great work!', '- intro.py Needs comments']
+    '''
+    return [c[0] + gom_utils.RUBRIC_SPACING + c[1] + gom_utils.RUBRIC_SPACING + c[2] for c in rubric.criteria if len(c) == 3]
+
+def normalize(txt:str) -> str:
+    ''' Returns comment text lowercased, with runs of whitespace as single spaces,
+    for counting custom comments that are the same apart from that
+    >>> normalize('  Great   work!\\n Nice job.')
+    'great work! nice job.'
+    '''
+    return ' '.join(txt.lower().split())
+
+def grade_key(grade:str) -> tuple:
+    ''' Sort key for grades: by letter, then + before plain before -
+    >>> sorted(['B', 'A-', 'B+', 'A', 'P'], key=grade_key)
+    ['A', 'A-', 'B+', 'B', 'P']
+    '''
+    return (grade[:1].upper(), {'+': 0, '': 1, '-': 2}.get(grade[1:], 3), grade)
+
+#############################
+###   USAGEREPORT CLASS   ###
+#############################
+class UsageReport:
+    ''' How a rubric was used across a lab's GradeSheets.
+    '''
+    __slots__ = ['students', 'criteria', 'severities', 'filenames', 'recurring']
+
+    def __init__(self, students=0):
+        ''' Creates an empty report over the given number of students (with GradeSheets)
+        >>> UsageReport(3).rows()
+        [['students', '', 3, '']]
+        '''
+        self.students = students
+        self.criteria = [] # [criteria text, number of students, number of comments]
+        self.severities = {} # severity -> number of comments
+        self.filenames = {} # filename -> number of comments
+        self.recurring = [] # [custom comment text, number of students], most common first
+
+    def rows(self) -> list:
+        ''' Returns the report as [section, item, students, comments] rows, e.g., for a CSV
+        '''
+        rows = [['students', '', self.students, '']]
+        rows += [['criteria', txt, num_sd, num_cmnts] for (txt, num_sd, num_cmnts) in self.criteria]
+        rows += [['severity', sev, '', num] for (sev, num) in self.severities.items()]
+        rows += [['filename', fname, '', num] for (fname, num) in self.filenames.items()]
+        rows += [['recurring', txt, num_sd, ''] for (txt, num_sd) in self.recurring]
+        return rows
+
+    def to_dict(self) -> dict:
+        ''' Returns the report as a dict, e.g., for JSON
+        >>> sorted(UsageReport(3).to_dict())
+        ['criteria', 'filenames', 'recurring', 'severities', 'students']
+        '''
+        return {'students': self.students, 'criteria': self.criteria, 'severities': self.severities,
+                'filenames': self.filenames, 'recurring': self.recurring}
+
+    def write(self, fname:str):
+        ''' Writes the report to fname (overwriting): JSON if it ends with .json, otherwise CSV
+        '''
+        with open(fname, 'w', newline='') as f:
+            if fname.lower().endswith('.json'):
+                json.dump(self.to_dict(), f, indent=1)
+            else:
+                csvwriter = csv.writer(f)
+                csvwriter.writerow(['section', 'item', 'students', 'comments'])
+                csvwriter.writerows(self.rows())
+
+#############################
+###   GRADEREPORT CLASS   ###
+#############################
+class GradeReport:
+    ''' Every student's grade in a lab, and how many students got each grade.
+    '''
+    __slots__ = ['grades', 'unreadable']
+
+    def __init__(self, grades=None, unreadable=None):
+        ''' Creates a report of the given (student subdir name, grade) pairs;
+        the grade is '' for ungraded students. unreadable are the names of the
+        students whose GradeSheets couldn't be read.
+        >>> report = GradeReport([('s1', 'A'), ('s2', 'B+'), ('s3', 'A'), ('s4', '')], ['s5'])
+        >>> [report.histogram(), report.ungraded(), report.unreadable]
+        [{'A': 2, 'B+': 1}, ['s4'], ['s5']]
+        '''
+        self.grades = list(grades) if grades else []
+        self.unreadable = list(unreadable) if unreadable else []
+
+    def histogram(self) -> dict:
+        ''' Returns {grade: number of students}, best grade first, not counting ungraded students
+        '''
+        counts = {}
+        for (student, grade) in self.grades:
+            if grade:
+                counts[grade] = counts.get(grade, 0) + 1
+        return {g: counts[g] for g in sorted(counts, key=grade_key)}
+
+    def ungraded(self) -> list:
+        ''' Returns the students who don't have a grade yet '''
+        return [student for (student, grade) in self.grades if not grade]
+
+    def histogram_str(self, width=50) -> str:
+        ''' Returns the histogram as text, one bar per grade (the longest bar is width long)
+        >>> print(GradeReport([('s1', 'A'), ('s2', 'B+'), ('s3', 'A')]).histogram_str(4))
+        A     2 ####
+        B+    1 ##
+        '''
+        counts = self.histogram()
+        most = max(counts.values(), default=1)
+        return '\n'.join(g.ljust(4) + str(n).rjust(3) + ' ' + '#'*round(n*width/most) for (g, n) in counts.items())
+
+    def to_dict(self) -> dict:
+        ''' Returns the report as a dict, e.g., for JSON
+        >>> GradeReport([('s1', 'A')]).to_dict()
+        {'grades': {'s1': 'A'}, 'histogram': {'A': 1}, 'ungraded': [], 'unreadable': []}
+        '''
+        return {'grades': dict(self.grades), 'histogram': self.histogram(), 'ungraded': self.ungraded(),
+                'unreadable': self.unreadable}
+
+    def write(self, fname:str):
+        ''' Writes the report to fname (overwriting): JSON if it ends with .json, otherwise
+        a CSV of the students' grades (with UNREADABLE_GRADE for unreadable GradeSheets)
+        '''
+        with open(fname, 'w', newline='') as f:
+            if fname.lower().endswith('.json'):
+                json.dump(self.to_dict(), f, indent=1)
+            else:
+                csvwriter = csv.writer(f)
+                csvwriter.writerow(['student', 'grade'])
+                csvwriter.writerows(self.grades)
+                csvwriter.writerows([student, UNREADABLE_GRADE] for student in self.unreadable)
+
+def grade_distribution(lab_directory:str, subdirs=None, workers=gom_utils.STATUS_WORKERS, grade_status=None) -> GradeReport:
+    ''' Returns a GradeReport of the given (full path) student subdirs (all of the lab
+    directory's, if subdirs not given), reading only the Grade: line of each GradeSheet,
+    on workers threads. Students without a GradeSheet (or a Grade: line) are left out, and
+    those whose GradeSheet can't be read are listed in the report's unreadable.
+    >>> import os, tempfile, contextlib, io
+    >>> lab = tempfile.mkdtemp()
+    >>> for (sd, grade) in [('s1', 'A-'), ('s2', ''), ('s3', 'A-'), ('s4', None), ('s5', '\\xe9\\xff')]:
+    ...     os.mkdir(os.path.join(lab, sd))
+    ...     if grade is not None:
+    ...         with open(os.path.join(lab, sd, gom_utils.FILENAME_GS), 'wb') as f:
+    ...             _ = f.write(('Requirements of this lab:\\n' + gom_utils.GRADE_TXT + grade + '\\n').encode('latin-1'))
+    >>> with contextlib.redirect_stdout(io.StringIO()): # (the warning)
+    ...     report = grade_distribution(lab)
+    >>> report.grades
+    [('s1', 'A-'), ('s2', ''), ('s3', 'A-')]
+    >>> report.histogram()
+    {'A-': 2}
+    >>> report.unreadable
+    ['s5']
+    '''
+    if subdirs is None:
+        subdirs = gom_utils.list_subdirs(lab_directory)
+    status = GradeStatus() if grade_status is None else grade_status
+    grades = status.refresh(subdirs, workers)
+    unreadable = status.unreadable(subdirs)
+    return GradeReport([(gom_utils.get_filename(sd), grades[sd]) for sd in subdirs if grades[sd] is not None],
+                       [gom_utils.get_filename(sd) for sd in subdirs if sd in unreadable])
+
+def rubric_usage(lab_directory:str, rubric:Rubric, subdirs=None, min_recurring=gom_utils.REPORT_MIN_RECURRING,
+                 workers=gom_utils.BATCH_WORKERS, comment_index=None) -> UsageReport:
+    ''' Returns a UsageReport of how the rubric was used in the GradeSheets of the given
+    (full path) student subdirs (all of the lab directory's, if subdirs not given).
+    Custom comments are the ones matching no criteria; those given to at least
+    min_recurring students are reported as recurring. comment_index is the lab's
+    CommentIndex if there already is one (e.g., the Grade-O-Matic's); either way,
+    nothing's saved to the lab directory.
+    >>> import os, tempfile
+    >>> lab = tempfile.mkdtemp()
+    >>> gs_txt = 'GRADE SHEET FOR CS1 LAB 2\\nRequirements of this lab:\\nGrade:   A\\n\\nComments from Graders:\\n'
+    >>> for (sd, cmnts) in [('s1', '++ Great work!\\n- intro.py: Needs more comments in the code'),
+    ...                     ('s2', '- intro.py: Needs more comments in your code\\n~ Watch your indents'),
+    ...                     ('s3', '~ Watch your  indents')]:
+    ...     os.mkdir(os.path.join(lab, sd))
+    ...     gom_utils.write_str_file(gs_txt + cmnts + '\\n', os.path.join(lab, sd, gom_utils.FILENAME_GS))
+    >>> rubric = Rubric(['++ Great work!', '- intro.py: Needs more comments in the code', '---- intro.py: Missing!'])
+    >>> report = rubric_usage(lab, rubric, min_recurring=2, workers=1)
+    >>> [report.students, sorted(os.listdir(lab))] # (no index saved in the lab)
+    [3, ['s1', 's2', 's3']]
+    >>> [crit[1:] for crit in report.criteria]
+    [[1, 1], [2, 2], [0, 0]]
+    >>> report.severities
+    {'-': 2, '~': 2, '++': 1}
+    >>> report.filenames
+    {'intro.py': 2}
+    >>> report.recurring
+    [['watch your indents', 2]]
+    '''
+    if subdirs is None:
+        subdirs = gom_utils.list_subdirs(lab_directory)
+    ci = CommentIndex(lab_directory) if comment_index is None else comment_index
+    ci.refresh(subdirs, workers, save=False) # just a report, don't write to the lab
+    names = [gom_utils.get_filename(sd) for sd in subdirs]
+    sheets = {name: ci.comments(name) for name in names if name in ci} # students with a GradeSheet
+
+    report = UsageReport(len(sheets))
+    crit_txts = criteria_texts(rubric)
+    matched = {name: set() for name in sheets} # comment positions matching some criteria
+    for (txt, found) in zip(crit_txts, ci.find_many(crit_txts)):
+        found = {name: ps for (name, ps) in found.items() if name in sheets}
+        report.criteria.append([txt, len(found), sum(len(ps) for ps in found.values())])
+        for (name, ps) in found.items():
+            matched[name].update(ps)
+
+    custom = {} # normalized text -> students who got it
+    for (name, cmnts) in sheets.items():
+        for (pos, (sev, fname, txt)) in enumerate(cmnts):
+            sev = sev.strip()
+            report.severities[sev] = report.severities.get(sev, 0) + 1
+            if fname:
+                report.filenames[fname] = report.filenames.get(fname, 0) + 1
+            if pos not in matched[name] and txt.strip():
+                custom.setdefault(normalize(txt), set()).add(name)
+    report.severities = dict(sorted(report.severities.items(), key=lambda kv: -kv[1]))
+    report.filenames = dict(sorted(report.filenames.items(), key=lambda kv: -kv[1]))
+    report.recurring = sorted([[txt, len(sds)] for (txt, sds) in custom.items() if len(sds) >= min_recurring],
+                              key=lambda r: (-r[1], r[0]))
+    return report
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 3:
+        print("Usage: python3 CS1Reports.py LAB_DIRECTORY [RUBRIC_CSV|grades] [REPORT.csv|REPORT.json]")
+        print("-=-=- Doctests of basic functions -=-=-")
+        import doctest
+        doctest.testmod()
+        sys.exit()
+
+    if sys.argv[2] == 'grades':
+        report = grade_distribution(sys.argv[1])
+        print(report.histogram_str())
+        print(len(report.ungraded()), 'ungraded:', ' '.join(report.ungraded()))
+        if report.unreadable:
+            print(len(report.unreadable), 'unreadable:', ' '.join(report.unreadable))
+        if len(sys.argv) > 3:
+            report.write(sys.argv[3])
+        sys.exit()
+
+    usage = rubric_usage(sys.argv[1], Rubric(Rubric.parse_rubric_from_file(sys.argv[2])))
+    if len(sys.argv) > 3:
+        usage.write(sys.argv[3])
+    else:
+        csv.writer(sys.stdout).writerows(usage.rows())
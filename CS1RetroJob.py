@@ -0,0 +1,224 @@
+'''
+The RetroJob module runs a Rubric-O-Matic retroactive replacement on a
+background thread, so the window keeps responding (and can show progress)
+while a whole lab is replaced.
+
+The job first picks out the GradeSheets that might have the comments (with
+the lab's CommentIndex, which can mean re-parsing some), then they're replaced
+one at a time, checking between each one whether the
+job's been cancelled. The changed GradeSheets are then written all together
+(see CS1FileTransaction), so cancelling leaves every GradeSheet either fully
+replaced or untouched: those replaced before the cancel are written, and
+listed in the job's written, and the rest are left as they were. A GradeSheet
+saved (e.g., in the Grade-O-Matic) while the job was running isn't
+overwritten: it's left as it was, and listed in the job's failed. The GUI polls
+the job's progress with after(), so Tk is never touched off the main thread.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import threading, time
+from CS1FileTransaction import FileTransaction
+from CS1ReplacePreview import replaced_text, gradesheet_text, matching_fnames
+
+__all__ = ['RetroJob', 'throughput', 'eta', 'format_seconds']
+
+CHANGED = 'changed since it was read' # why a GradeSheet saved while the job ran was left alone
+
+def throughput(done:int, seconds:float) -> float:
+    ''' Returns how many things were done per second (0.0 if no time's passed)
+    >>> throughput(30, 12.0)
+    2.5
+    >>> throughput(0, 0.0)
+    0.0
+    '''
+    return done / seconds if seconds > 0 else 0.0
+
+def eta(done:int, total:int, seconds:float):
+    ''' Returns the estimated seconds left to do total things, having done done of them
+    in seconds, or None if there's no estimate yet
+    >>> eta(30, 120, 12.0)
+    36.0
+    >>> eta(0, 120, 1.0) is None
+    True
+    '''
+    rate = throughput(done, seconds)
+    return (total - done) / rate if rate else None
+
+def format_seconds(seconds) -> str:
+    ''' Returns seconds as m:ss, or '?' if None
+    >>> [format_seconds(36.0), format_seconds(601.4), format_seconds(None)]
+    ['0:36', '10:01', '?']
+    '''
+    if seconds is None:
+        return '?'
+    (minutes, secs) = divmod(int(round(seconds)), 60)
+    return str(minutes) + ':' + str(secs).zfill(2)
+
+#############################
+###     RETROJOB CLASS    ###
+#############################
+class RetroJob:
+    ''' A retroactive replacement of comment pairs in a list of GradeSheets, on a background thread.
+    >>> import os, shutil, tempfile, contextlib, io
+    >>> with tempfile.TemporaryDirectory() as lab:
+    ...     fnames = [os.path.join(lab, name) for name in ('gs1.txt', 'gs2.txt')]
+    ...     for fname in fnames:
+    ...         _ = shutil.copy('test/GradeSheet-filled.txt', fname)
+    ...     with contextlib.redirect_stdout(io.StringIO()): # (GradeSheet's printing)
+    ...         job = RetroJob(lab, fnames + [os.path.join(lab, 'nope.txt')], [('++ Great work!', '++ Changed!')])
+    ...         job.start()
+    ...         job.wait()
+    ...     [job.finished, job.selecting, job.cancelled, job.done, job.total, len(job.written), len(job.missing), job.error]
+    [True, False, False, 3, 3, 2, 1, None]
+
+    A GradeSheet that can't be read or parsed is skipped (and listed in failed), rather than stopping the job:
+
+    >>> with tempfile.TemporaryDirectory() as lab:
+    ...     fname = os.path.join(lab, 'gs1.txt')
+    ...     with open(fname, 'wb') as f:
+    ...         _ = f.write(b'GRADE SHEET FOR CS1 LAB 2\\n\\xff\\xfe not utf-8')
+    ...     with contextlib.redirect_stdout(io.StringIO()): # (the job's warning)
+    ...         job = RetroJob(lab, [fname], [('++ Great work!', '++ Changed!')])
+    ...         job.start()
+    ...         job.wait()
+    ...     [job.finished, job.done, job.written, [err for (fn, err) in job.failed], job.error]
+    [True, 1, [], ['UnicodeDecodeError'], None]
+
+    A GradeSheet saved by someone else after it was read, but before the job writes it, is left as they saved it:
+
+    >>> import pathlib
+    >>> from CS1GradeSheetCache import GradeSheetCache
+    >>> class SavedMeanwhile(GradeSheetCache): # the grader saves just after the job reads it
+    ...     def gradesheet(self, fname):
+    ...         gradesheet = super().gradesheet(fname)
+    ...         _ = shutil.copy('test/GradeSheet-new.txt', fname)
+    ...         return gradesheet
+    >>> with tempfile.TemporaryDirectory() as lab:
+    ...     fname = shutil.copy('test/GradeSheet-filled.txt', os.path.join(lab, 'gs1.txt'))
+    ...     with contextlib.redirect_stdout(io.StringIO()):
+    ...         job = RetroJob(lab, [fname], [('++ Great work!', '++ Changed!')], SavedMeanwhile())
+    ...         job.start()
+    ...         job.wait()
+    ...     [job.written, job.failed == [(fname, CHANGED)], pathlib.Path(fname).read_text() == pathlib.Path('test/GradeSheet-new.txt').read_text()]
+    [[], True, True]
+    '''
+    __slots__ = ['_labdir', '_candidates', '_fnames', '_pairs', '_gs_cache', '_comment_index', '_thread', '_cancel', '_start_time', '_end_time']
+    __slots__ += ['done', 'written', 'missing', 'failed', 'error']
+
+    def __init__(self, lab_directory:str, fnames:list, pairs, gs_cache=None, comment_index=None):
+        ''' Sets up replacing each (former, new) comment pair, in order, in the GradeSheets at fnames
+        (just those that might have the comments, if there's a CommentIndex of the lab),
+        journaled in lab_directory (see FileTransaction). gs_cache is a (thread-safe) GradeSheetCache
+        to parse them from, if there is one. Doesn't start until start().
+        '''
+        self._labdir = lab_directory
+        self._candidates = list(fnames)
+        self._fnames = None # until the GradeSheets to replace in have been picked out
+        self._pairs = list(pairs)
+        self._gs_cache = gs_cache
+        self._comment_index = comment_index
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._cancel = threading.Event()
+        self._start_time = None
+        self._end_time = None
+        self.done = 0 # GradeSheets replaced (or found unchanged) so far
+        self.written = [] # filenames of the GradeSheets written, once finished
+        self.missing = [] # filenames that didn't exist
+        self.failed = [] # (filename, error name) of the GradeSheets that couldn't be read or replaced in
+        self.error = None # why the GradeSheets couldn't be written, if they couldn't
+
+    def start(self):
+        ''' Starts replacing, in the background '''
+        self._start_time = time.perf_counter()
+        self._thread.start()
+
+    def cancel(self):
+        ''' Stops replacing after the current GradeSheet. Those already replaced still get written.
+        '''
+        self._cancel.set()
+
+    def wait(self):
+        ''' Blocks until finished (for testing, the GUI should never need to wait)
+        '''
+        self._thread.join()
+
+    def _work(self):
+        ''' Worker thread: replaces in each GradeSheet until done or cancelled, then writes them all
+        '''
+        try:
+            try:
+                fnames = matching_fnames(self._candidates, self._pairs, self._comment_index)
+            except Exception as e: # still replace, just checking all of them
+                print("RetroJob:: could not check the comment index, replacing in every GradeSheet:", e)
+                fnames = self._candidates
+            self._fnames = fnames
+            transaction = FileTransaction(self._labdir)
+            for fname in fnames:
+                if self._cancel.is_set():
+                    break
+                try:
+                    old_txt = gradesheet_text(fname, self._gs_cache)
+                    new_txt = replaced_text(fname, self._pairs, self._gs_cache)
+                    if new_txt is not None:
+                        transaction.write(fname, new_txt, expected=old_txt) # (unless it's saved again before then)
+                except FileNotFoundError:
+                    self.missing.append(fname)
+                except Exception as e: # one bad GradeSheet shouldn't stop the whole job
+                    print("RetroJob:: could not replace in", fname, e)
+                    self.failed.append((fname, type(e).__name__))
+                self.done += 1
+            try:
+                self.written = transaction.commit()
+                self.failed += [(fname, CHANGED) for fname in transaction.conflicts]
+            except Exception as e:
+                self.error = e
+        finally: # always finish, so the GUI stops waiting on it
+            self._end_time = time.perf_counter()
+
+    #############################
+    ###       PROGRESS        ###
+    @property
+    def selecting(self) -> bool:
+        ''' Returns True while the GradeSheets to replace in are still being picked out '''
+        return self._fnames is None and not self.finished
+
+    @property
+    def total(self) -> int:
+        ''' Returns the number of GradeSheets to replace in (0 while they're being picked out) '''
+        return len(self._fnames) if self._fnames is not None else 0
+
+    @property
+    def finished(self) -> bool:
+        ''' Returns True once the GradeSheets have been written (or failed to be) '''
+        return self._end_time is not None
+
+    @property
+    def cancelled(self) -> bool:
+        ''' Returns True if cancel() was called before every GradeSheet was replaced '''
+        return self._cancel.is_set() and self.done < self.total
+
+    @property
+    def elapsed(self) -> float:
+        ''' Returns seconds since started (until finished) '''
+        if self._start_time is None:
+            return 0.0
+        return (self._end_time if self._end_time is not None else time.perf_counter()) - self._start_time
+
+    def progress_str(self) -> str:
+        ''' Returns e.g. '30/120 GradeSheets, 2.5/sec, 0:36 left'
+        '''
+        if self.selecting:
+            return 'Finding the GradeSheets with the comment(s)...'
+        (done, elapsed) = (self.done, self.elapsed)
+        msg = str(done) + '/' + str(self.total) + ' GradeSheets, ' + str(round(throughput(done, elapsed), 1)) + '/sec'
+        if not self.finished:
+            msg += ', ' + format_seconds(eta(done, self.total, elapsed)) + ' left'
+        return msg
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
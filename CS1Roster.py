@@ -0,0 +1,145 @@
+'''
+The Roster module keeps the ordered list of student subdirectories in a lab,
+indexed by both subdirectory name and full filepath, so moving to the
+next/previous student, jumping to a student, or picking out a range of
+students ("s03 through s12") doesn't need to search through the whole list.
+
+Shared between the Grade-O-Matic and the Rubric-O-Matic.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import CS1GradeOmaticUtils as gom_utils
+
+__all__ = ['Roster']
+
+#############################
+###     ROSTER CLASS      ###
+#############################
+class Roster:
+    ''' Ordered student subdirectories (full filepaths), indexed by name and by path.
+    '''
+    __slots__ = ['_paths', '_by_path', '_by_name']
+
+    def __init__(self, subdirs:list):
+        ''' Creates a roster of the given (full path) student subdirectories, in the given order
+        >>> roster = Roster(['lab/s1', 'lab/s2', 'lab/s3'])
+        >>> [len(roster), roster[0], roster[-1]]
+        [3, 'lab/s1', 'lab/s3']
+        '''
+        self._paths = list(subdirs)
+        self._by_path = {path: i for (i, path) in enumerate(self._paths)}
+        self._by_name = {gom_utils.get_filename(path): i for (i, path) in enumerate(self._paths)}
+
+    #############################
+    ###       LOOKING UP      ###
+    def index(self, student:str) -> int:
+        ''' Returns the position of the given student (subdir name or full path).
+        Raises ValueError if they're not in the roster, like list.index.
+        >>> roster = Roster(['lab/s1', 'lab/s2', 'lab/s3'])
+        >>> [roster.index('lab/s2'), roster.index('s2')]
+        [1, 1]
+        '''
+        if student in self._by_path:
+            return self._by_path[student]
+        if student in self._by_name:
+            return self._by_name[student]
+        raise ValueError(str(student) + ' is not in the roster')
+
+    def jump(self, student:str):
+        ''' Returns the full path of the given student (subdir name or full path),
+        or None if they're not in the roster
+        >>> roster = Roster(['lab/s1', 'lab/s2', 'lab/s3'])
+        >>> [roster.jump('s3'), roster.jump('s4')]
+        ['lab/s3', None]
+        '''
+        return self._paths[self.index(student)] if student in self else None
+
+    def next(self, student:str):
+        ''' Returns the full path of the student after the given one, or None if it's the last
+        >>> roster = Roster(['lab/s1', 'lab/s2', 'lab/s3'])
+        >>> [roster.next('lab/s1'), roster.next('lab/s3')]
+        ['lab/s2', None]
+        '''
+        ind = self.index(student)+1
+        return self._paths[ind] if ind < len(self._paths) else None
+
+    def prev(self, student:str):
+        ''' Returns the full path of the student before the given one, or None if it's the first
+        >>> roster = Roster(['lab/s1', 'lab/s2', 'lab/s3'])
+        >>> [roster.prev('lab/s2'), roster.prev('lab/s1')]
+        ['lab/s1', None]
+        '''
+        ind = self.index(student)-1
+        return self._paths[ind] if ind >= 0 else None
+
+    def neighbors(self, student:str) -> list:
+        ''' Returns the full paths of the students either side of the given one (next first)
+        >>> Roster(['lab/s1', 'lab/s2', 'lab/s3']).neighbors('s2')
+        ['lab/s3', 'lab/s1']
+        >>> Roster(['lab/s1', 'lab/s2', 'lab/s3']).neighbors('s3')
+        ['lab/s2']
+        '''
+        return [sd for sd in [self.next(student), self.prev(student)] if sd is not None]
+
+    def range(self, start:str, end:str) -> list:
+        ''' Returns the full paths of the students from start through end (inclusive).
+        Raises ValueError if either isn't in the roster, or end comes before start.
+        >>> roster = Roster(['lab/s1', 'lab/s2', 'lab/s3', 'lab/s4'])
+        >>> roster.range('s2', 's3')
+        ['lab/s2', 'lab/s3']
+        >>> roster.range('s3', 's3')
+        ['lab/s3']
+        >>> roster.range('s3', 's1')
+        Traceback (most recent call last):
+        ...
+        ValueError: s1 comes before s3
+        '''
+        (ind_start, ind_end) = (self.index(start), self.index(end))
+        if ind_end < ind_start:
+            raise ValueError(str(end) + ' comes before ' + str(start))
+        return self._paths[ind_start:ind_end+1]
+
+    def filter(self, is_kept):
+        ''' Returns a new Roster of only the students where is_kept(full path) is True,
+        e.g., only the ungraded ones
+        >>> Roster(['lab/s1', 'lab/s2', 'lab/s3']).filter(lambda sd: sd != 'lab/s2').names()
+        ['s1', 's3']
+        '''
+        return Roster([sd for sd in self._paths if is_kept(sd)])
+
+    def names(self) -> list:
+        ''' Returns the student subdirectory names, in order '''
+        return [gom_utils.get_filename(path) for path in self._paths]
+
+    def paths(self) -> list:
+        ''' Returns the student subdirectory full paths, in order '''
+        return list(self._paths)
+
+    #############################
+    ###     LIST-LIKE-NESS    ###
+    def __contains__(self, student):
+        ''' Returns True if the student (subdir name or full path) is in the roster
+        >>> 's1' in Roster(['lab/s1'])
+        True
+        '''
+        return student in self._by_path or student in self._by_name
+
+    def __getitem__(self, index):
+        ''' Returns the full path at index (or a list of them, for a slice) '''
+        return self._paths[index]
+
+    def __iter__(self):
+        ''' Iterates over the full paths, in order '''
+        return iter(self._paths)
+
+    def __len__(self):
+        ''' Returns the number of students '''
+        return len(self._paths)
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
@@ -8,10 +8,14 @@ Held together by duct tape & if-loops by Iris Howley (2023)
 import tkinter as tk # abbrev
 from tkinter import messagebox as mb
 from tkinter import filedialog as fd
+from tkinter import ttk
 import os
 from CS1Rubric import Rubric
 import CS1GradeOmaticUtils as gom_utils
-from CS1GradeSheet import GradeSheet as gs
+from CS1Roster import Roster
+from CS1FileTransaction import FileTransaction
+from CS1ReplacePreview import ReplacePreview
+from CS1RetroJob import RetroJob
 
 class RubricOmatic(tk.Frame):
     # constants
@@ -21,9 +25,10 @@ class RubricOmatic(tk.Frame):
 
     __slots__ = ['rubric', 'custom_cmts', 'loaded_cmts', 'entriesframe', 'rubric_entries']
     __slots__ += ['entry_rubpath', 'btn_saverub']
-    __slots__ += ['all_subdirs', 'entry_subdir_start', 'entry_subdir_end']
+    __slots__ += ['roster', 'entry_subdir_start', 'entry_subdir_end', 'comment_index', 'gs_cache', 'preview']
+    __slots__ += ['job', 'progressbar', 'lbl_progress', 'btn_cancel']
 
-    def __init__(self, rubric, custom_comments, all_subdirectories, save_as:str, parent=None):
+    def __init__(self, rubric, custom_comments, all_subdirectories, save_as:str, parent=None, comment_index=None, gs_cache=None):
         # Not entirely sure what this code does
         # src: https://pythonbasics.org/tkinter-button/
         tk.Frame.__init__(self, parent)        
@@ -31,7 +36,12 @@ class RubricOmatic(tk.Frame):
         # widget can take all window
         self.pack(fill=tk.BOTH, expand=1)
 
-        self.all_subdirs = all_subdirectories # need to know filepath for retroactive replacement
+        # need to know filepath for retroactive replacement (a Roster, shared with the GradeOmatic, or a list)
+        self.roster = all_subdirectories if isinstance(all_subdirectories, Roster) else Roster(all_subdirectories)
+        self.comment_index = comment_index # CommentIndex of the lab, for finding which GradeSheets to replace in
+        self.gs_cache = gs_cache # GradeSheetCache shared with the GradeOmatic, so we don't re-parse what it's seen
+        self.preview = None # ReplacePreview of the last previewed replacement
+        self.job = None # RetroJob of the running (or last) retroactive replacement
 
         #############################
         ###   KEYBOARD SHORCUTS   ###
@@ -52,6 +62,8 @@ class RubricOmatic(tk.Frame):
         self.entriesframe.pack(side=tk.TOP, fill=tk.BOTH, expand=1)
         bottomframe = tk.Frame(self)
         bottomframe.pack(side=tk.TOP, fill=tk.X, expand=1)        
+        progressframe = tk.Frame(self)
+        progressframe.pack(side=tk.TOP, fill=tk.X)
 
         #############################
         ###      GUI CONTENT      ###
@@ -107,19 +119,33 @@ class RubricOmatic(tk.Frame):
         btn_save_exit.pack(side=tk.LEFT) 
         btn_nosave_exit = tk.Button(nav_btn_frame, text='Cancel', command=self.nosave_exit)
         btn_nosave_exit.pack(side=tk.LEFT) 
+        btn_preview_all = tk.Button(nav_btn_frame, text='Preview All Changed', command=self.preview_all_comments)
+        btn_preview_all.pack(side=tk.LEFT) 
+        btn_replace_all = tk.Button(nav_btn_frame, text='Replace All Changed', command=self.replace_all_comments)
+        btn_replace_all.pack(side=tk.LEFT) 
+        btn_undo_replace = tk.Button(nav_btn_frame, text='Undo Retro-activate', command=self.undo_replace)
+        btn_undo_replace.pack(side=tk.LEFT) 
+
+        ###   Retro-activate Progress   ###
+        self.progressbar = ttk.Progressbar(progressframe, orient=tk.HORIZONTAL, mode='determinate')
+        self.progressbar.pack(side=tk.LEFT, fill=tk.X, expand=1)
+        self.lbl_progress = tk.Label(progressframe, text='', anchor='w')
+        self.lbl_progress.pack(side=tk.LEFT)
+        self.btn_cancel = tk.Button(progressframe, text='Cancel Retro-activate', command=self.cancel_replace, state=tk.DISABLED)
+        self.btn_cancel.pack(side=tk.LEFT)
 
         ###   Sub Dir Select   ###
         lbl_stardir = tk.Label(subdir_frame, text='Start: ', anchor='w')
         lbl_stardir.pack(side=tk.LEFT)
         self.entry_subdir_start = tk.Entry(subdir_frame, width=gom_utils.ENTRY_SM)
         self.entry_subdir_start.pack(side=tk.LEFT) 
-        self.entry_subdir_start.insert(0, gom_utils.get_filename(self.all_subdirs[0])) # default start subdir
+        self.entry_subdir_start.insert(0, gom_utils.get_filename(self.roster[0])) # default start subdir
 
         lbl_enddir = tk.Label(subdir_frame, text='End: ', anchor='w')
         lbl_enddir.pack(side=tk.LEFT)
         self.entry_subdir_end = tk.Entry(subdir_frame, width=gom_utils.ENTRY_SM)
         self.entry_subdir_end.pack(side=tk.RIGHT) 
-        self.entry_subdir_end.insert(0, gom_utils.get_filename(self.all_subdirs[-1])) # default end subdir
+        self.entry_subdir_end.insert(0, gom_utils.get_filename(self.roster[-1])) # default end subdir
 
         ###     Rubric     ### 
         self.rubric = rubric
@@ -167,6 +193,8 @@ class RubricOmatic(tk.Frame):
             rvrt_btns.append(tk.Button(critframe, text='Revert', command=lambda i=i: self.revert_comment(i)))
             rvrt_btns[-1].pack(side=tk.LEFT)
             #state=tk.DISABLED, 
+            retro_btns.append(tk.Button(critframe, text='Preview', command=lambda i=i: self.preview_comment(i)))
+            retro_btns[-1].pack(side=tk.LEFT)
             retro_btns.append(tk.Button(critframe, text='Replace', command=lambda i=i: self.replace_comment(i)))
             retro_btns[-1].pack(side=tk.LEFT)      
 
@@ -193,6 +221,8 @@ class RubricOmatic(tk.Frame):
             rvrt_btns.append(tk.Button(newcmtframe, text='Revert', command=lambda i=i: self.revert_comment(i+len(self.rubric.criteria))))
             rvrt_btns[-1].pack(side=tk.LEFT)
             # state=tk.DISABLED, 
+            retro_btns.append(tk.Button(newcmtframe, text='Preview', command=lambda i=i: self.preview_comment(i+len(self.rubric.criteria))))
+            retro_btns[-1].pack(side=tk.LEFT)
             retro_btns.append(tk.Button(newcmtframe, text='Replace', command=lambda i=i: self.replace_comment(i+len(self.rubric.criteria))))
             retro_btns[-1].pack(side=tk.LEFT) 
 
@@ -206,41 +236,17 @@ class RubricOmatic(tk.Frame):
         self.status_clear() # clear status messages 
 
         # ERROR CHECKING - basic
-        if not len(self.all_subdirs):
+        if not len(self.roster):
             self.status('!', "No student subdirectories to retroactively replace!")
             return 
         elif ind >= len(self.loaded_cmts):
             self.status('ERROR', "Index for reverting comment did not exist at load time.")
 
-        # ERROR CHECKING - start/end sub directories
-        # set some defaults in case they're empty
-        if not self.entry_subdir_start.get(): # empty start dir
-            self.entry_subdir_start.insert(0, gom_utils.get_filename(self.all_subdirs[0])) # default start subdir
-        if not self.entry_subdir_end.get(): # empty end dir
-            self.entry_subdir_end.insert(0, gom_utils.get_filename(self.all_subdirs[-1])) # default end subdir
+        selected_subdirs = self.selected_subdirs()
+        if selected_subdirs is None:
+            return
         startdir = self.entry_subdir_start.get()
         enddir = self.entry_subdir_end.get()
-        # Checking that these subdirs exist in our list from Grade O Matic
-        valid_start_subdir = False
-        valid_end_subdir = False
-        selected_subdirs = []
-        for sd in self.all_subdirs:
-            if not valid_start_subdir  and startdir == gom_utils.get_filename(sd): # catch only first stardir
-                valid_start_subdir = True
-            if valid_start_subdir and enddir == gom_utils.get_filename(sd): # enddir comes after startdir
-                valid_end_subdir = True
-                selected_subdirs.append(sd) # catch the last one
-            elif not valid_start_subdir and enddir == gom_utils.get_filename(sd):
-                self.status('WARNING', "Ending subdirectory needs to come after startdir:", startdir, '-', enddir)
-                return
-            if valid_start_subdir and not valid_end_subdir: # keep track of subdirs we want to use
-                selected_subdirs.append(sd)
-        if not valid_start_subdir:
-            self.status('WARNING', "Starting subdirectory not in our current subdirs:", startdir)
-            return
-        elif not valid_end_subdir:
-            self.status('WARNING', "Ending subdirectory not in our current subdirs:", enddir)
-            return
 
         # Capture replacements
         former_cmnt = self.loaded_cmts[ind]
@@ -252,43 +258,255 @@ class RubricOmatic(tk.Frame):
         msg += "\n'" + former_cmnt + "'\nwith\n'" + new_cmnt + "'\n" 
         msg += "in the following GradeSheets? " + '\n'
         msg += fp + ' :: ' + startdir + ' - ' + enddir
-        msg += "\n(This isn't the most robust feature...)"
+        msg += "\n(This isn't the most robust feature... use Preview to see what would change first)"
         do_replace = mb.askyesno("Confirm Retroactive Replacement", msg) 
         if not do_replace:
             return
         
-        # Do the retroactive replacement
-        for filepath in selected_subdirs:
-            # iterate over files
-            print("RubricOmatic:: replace_comment: Retroactivating:", gom_utils.get_filename(filepath))
-            fname  = gom_utils.format_filename(filepath, gom_utils.FILENAME_GS)
-            try:                    
-                # Convert gs_str to GradeSheet object
-                gradesheet = gs.parse_gradesheet_fromfile(fname)
-                len_gs_orig = len(str(gradesheet))
-                '''
-                if('10' in filepath): # selective debug printing 
-                    print('*'*25, "AFTER PARSING", '*'*25)
-                    print(gradesheet)
-                '''
-                found = gradesheet.replace_comment(former_cmnt, new_cmnt) # find former_cmnt, replace with new_cmnt
-                len_gs_mod = len(str(gradesheet))
-                '''
-                if('10' in filepath):  # selective debug printing 
-                    print('*'*25, "AFTER REPLACING", '*'*25) 
-                    print(gradesheet)
-                '''
-                # only write file if we actually modified it
-                # and don't have *significant* data loss
-                # currently operationalized as more than 50% character loss
-                if found and len_gs_orig//2 < len_gs_mod: 
-                    gradesheet.write_file(fname) 
-
-            except FileNotFoundError:
-                self.status('!', filepath+ " does not have a " + gom_utils.FILENAME_GS )
-
-        mb.showinfo("Retroactive Replacement Complete", "Retroactive replacement for criteria " + str(ind) + " is complete.")                       
+        self.retroactivate([(former_cmnt, new_cmnt)], selected_subdirs, "Retroactive replacement for criteria " + str(ind))
+
+    def replace_all_comments(self):
+        ''' Retroactively replaces every comment that's been edited since it was loaded,
+        all in one go: each GradeSheet is only parsed & written once, however many changed.
+        '''
+        self.status_clear() # clear status messages 
+
+        if not len(self.roster):
+            self.status('!', "No student subdirectories to retroactively replace!")
+            return 
+        pairs = self.changed_pairs()
+        if not pairs:
+            self.status('!', "No comments have been changed since loading, nothing to replace.")
+            return
+        selected_subdirs = self.selected_subdirs()
+        if selected_subdirs is None:
+            return
+
+        # Confirm retroactive replacement
+        msg = "Are you sure you want to RETROACTIVELY REPLACE these " + str(len(pairs)) + " comments"
+        msg += "\nin the following GradeSheets? " + '\n'
+        msg += gom_utils.get_filepath(selected_subdirs[0]) + ' :: ' + self.entry_subdir_start.get() + ' - ' + self.entry_subdir_end.get() + '\n'
+        for (former_cmnt, new_cmnt) in pairs:
+            msg += "\n'" + former_cmnt + "'\n  --> '" + new_cmnt + "'"
+        msg += "\n\n(This isn't the most robust feature... use Preview All Changed to see what would change first)"
+        if not mb.askyesno("Confirm Retroactive Replacement", msg):
+            return
+
+        self.retroactivate(pairs, selected_subdirs, "Retroactive replacement of " + str(len(pairs)) + " comments")
+
+    def changed_pairs(self) -> list:
+        ''' Returns (comment when loaded, comment now) for each rubric entry that's been edited
+        (and not cleared) since it was loaded, in rubric order
+        '''
+        pairs = []
+        for ind in range(min(len(self.loaded_cmts), len(self.rubric_entries))):
+            new_cmnt = self.rubric_entries[ind].get()
+            if new_cmnt and new_cmnt != self.loaded_cmts[ind]:
+                pairs.append((self.loaded_cmts[ind], new_cmnt))
+        return pairs
+
+    def retroactivate(self, pairs:list, selected_subdirs:list, description:str):
+        ''' Starts replacing each (former, new) comment pair, in order, in the GradeSheets of the
+        selected subdirs that have any of them, in the background (see RetroJob): parsing each
+        GradeSheet once, and writing all the changed ones together at the end. Progress is shown
+        at the bottom of the window, and description is what's done when it's finished.
+        '''
+        if self.job is not None and not self.job.finished:
+            self.status('WARNING', "A retroactive replacement is still running, wait for it (or cancel it) first.")
+            return
+        # The job only looks at GradeSheets that actually have (one of) the comments
+        fnames = [gom_utils.format_filename(sd, gom_utils.FILENAME_GS) for sd in selected_subdirs]
+        print("RubricOmatic:: retroactivate: Retroactivating in", len(fnames), "subdirs")
+
+        self.job = RetroJob(gom_utils.get_filepath(selected_subdirs[0]), fnames, pairs, self.gs_cache, self.comment_index)
+        self.progressbar.configure(maximum=1, value=0)
+        self.btn_cancel['state'] = tk.NORMAL
+        self.job.start()
+        self.poll_replace(self.job, description)
+
+    def poll_replace(self, job, description:str):
+        ''' Updates the progress bar with how far the retroactive replacement's got,
+        and checks back later, until it's finished.
+        '''
+        self.progressbar.configure(maximum=max(job.total, 1), value=job.done)
+        self.lbl_progress.configure(text=job.progress_str())
+        if not job.finished:
+            self.after(gom_utils.JOB_POLL_MS, lambda: self.poll_replace(job, description))
+            return
+
+        self.btn_cancel['state'] = tk.DISABLED
+        for fname in job.missing:
+            self.status('!', gom_utils.get_filepath(fname) + " does not have a " + gom_utils.FILENAME_GS)
+        for (fname, error) in job.failed:
+            self.status('WARNING', fname + " couldn't be replaced in (" + error + "), it was left as it was")
+        if job.error is not None:
+            self.status('ERROR', "Retroactive replacement failed, no GradeSheets were changed: " + str(job.error))
+            return
+        self.invalidate_cached(job.written)
+        if self.gs_cache is not None and self.gs_cache.parsed is not None: # keep what was parsed for next time
+            self.gs_cache.parsed.save()
+        changed = [gom_utils.get_filename(gom_utils.get_filepath(fname)) for fname in job.written]
+        for subdir in changed:
+            print("RubricOmatic:: poll_replace: Retroactivated:", subdir)
+        if job.cancelled:
+            msg = description + " was cancelled after " + str(job.done) + " of " + str(job.total) + " GradeSheets."
+            msg += "\nThe rest weren't changed. These " + str(len(changed)) + " GradeSheets were:\n" + ', '.join(changed)
+            mb.showinfo("Retroactive Replacement Cancelled", msg)
+        else:
+            mb.showinfo("Retroactive Replacement Complete", description + " is complete (" + str(len(changed)) + " GradeSheets changed).")
 
+    def cancel_replace(self):
+        ''' Stops the running retroactive replacement after the GradeSheet it's on
+        (keeping the GradeSheets already replaced).
+        '''
+        if self.job is not None and not self.job.finished:
+            self.job.cancel()
+            self.status('!', "Cancelling retroactive replacement...")
+
+    def undo_replace(self):
+        ''' Puts back every GradeSheet the last retroactive replacement changed
+        (except any saved again since).
+        '''
+        self.status_clear() # clear status messages 
+
+        if not len(self.roster):
+            self.status('!', "No student subdirectories to undo the retroactive replacement in!")
+            return
+        if self.job is not None and not self.job.finished:
+            self.status('WARNING', "A retroactive replacement is still running, wait for it (or cancel it) first.")
+            return
+        transaction = FileTransaction(gom_utils.get_filepath(self.roster[0]))
+        if not os.path.exists(transaction.journal):
+            self.status('!', "No retroactive replacement to undo.")
+            return
+        msg = "Are you sure you want to UNDO the last retroactive replacement?"
+        msg += "\n(GradeSheets saved since then are left as they are.)"
+        if not mb.askyesno("Confirm Undo Retroactive Replacement", msg):
+            return
+        restored = transaction.rollback()
+        self.invalidate_cached(restored)
+        mb.showinfo("Undo Retroactive Replacement Complete", str(len(restored)) + " GradeSheets put back.")
+
+    def invalidate_cached(self, fnames:list):
+        ''' Tells the shared GradeSheetCache these GradeSheets were just (re-)written
+        '''
+        if self.gs_cache is not None:
+            for fname in fnames:
+                self.gs_cache.invalidate(fname)
+
+    def preview_comment(self, ind:int):
+        ''' Shows what retroactively replacing the comment would change, without changing
+        anything: how many GradeSheets, and a diff of each, as they're worked out in the background.
+        '''
+        self.status_clear() # clear status messages 
+
+        if not len(self.roster):
+            self.status('!', "No student subdirectories to preview replacing in!")
+            return 
+        elif ind >= len(self.loaded_cmts):
+            self.status('ERROR', "Index for previewing comment did not exist at load time.")
+            return
+        former_cmnt = self.loaded_cmts[ind]
+        new_cmnt = self.rubric_entries[ind].get()
+        self.preview_pairs([(former_cmnt, new_cmnt)], lambda: self.replace_comment(ind))
+
+    def preview_all_comments(self):
+        ''' Shows what Replace All Changed would change, without changing anything.
+        '''
+        self.status_clear() # clear status messages 
+
+        if not len(self.roster):
+            self.status('!', "No student subdirectories to preview replacing in!")
+            return 
+        pairs = self.changed_pairs()
+        if not pairs:
+            self.status('!', "No comments have been changed since loading, nothing to preview.")
+            return
+        self.preview_pairs(pairs, self.replace_all_comments)
+
+    def preview_pairs(self, pairs:list, replace_cmd):
+        ''' Opens a window showing (as they're worked out in the background) how many GradeSheets
+        replacing each (former, new) comment pair would change, and a diff of each.
+        Its Replace button closes it and calls replace_cmd.
+        '''
+        selected_subdirs = self.selected_subdirs()
+        if selected_subdirs is None:
+            return
+        fnames = [gom_utils.format_filename(sd, gom_utils.FILENAME_GS) for sd in selected_subdirs]
+
+        # only one preview at a time
+        if self.preview is not None:
+            self.preview.cancel()
+        preview = self.preview = ReplacePreview(fnames, pairs, self.gs_cache, self.comment_index)
+
+        window = tk.Toplevel(self)
+        window.title('Preview Retroactive Replacement')
+        lbl_summary = tk.Label(window, text='', font=gom_utils.FONT_H2, anchor='w')
+        lbl_summary.pack(side=tk.TOP, fill=tk.X)
+        btnframe = tk.Frame(window)
+        btnframe.pack(side=tk.BOTTOM, fill=tk.X)
+        def close():
+            preview.cancel()
+            window.destroy()
+        def replace():
+            close()
+            replace_cmd()
+        btn_replace = tk.Button(btnframe, text='Replace', command=replace)
+        btn_replace.pack(side=tk.LEFT)
+        btn_close = tk.Button(btnframe, text='Close', command=close)
+        btn_close.pack(side=tk.LEFT)
+        window.protocol('WM_DELETE_WINDOW', close)
+        scrollbar = tk.Scrollbar(window, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text_diffs = tk.Text(window, font=gom_utils.FONT_GRADESHEET, width=gom_utils.TEXT_GRADESHEET, yscrollcommand=scrollbar.set)
+        text_diffs.pack(side=tk.LEFT, fill=tk.BOTH, expand=1)
+        scrollbar.config(command=text_diffs.yview)
+        self.poll_preview(preview, window, lbl_summary, text_diffs)
+
+    def poll_preview(self, preview, window, lbl_summary, text_diffs):
+        ''' Adds whatever the preview's finished in the background to its window,
+        and checks back later if it's not done.
+        '''
+        if not window.winfo_exists(): # closed
+            return
+        for (fname, new_txt, diff, error) in preview.poll():
+            if error is not None:
+                text_diffs.insert(tk.END, fname + ': could not preview (' + error + ')\n\n')
+            elif diff:
+                text_diffs.insert(tk.END, diff + '\n')
+        summary = str(preview.changed) + ' of ' + str(preview.finished) + ' GradeSheets checked would change'
+        if preview.done:
+            lbl_summary.configure(text=summary + '.')
+            return
+        elif preview.selecting:
+            lbl_summary.configure(text='Finding the GradeSheets with the comment(s)...')
+        else:
+            lbl_summary.configure(text=summary + ' (' + str(len(preview)) + ' to check)...')
+        self.after(gom_utils.JOB_POLL_MS, lambda: self.poll_preview(preview, window, lbl_summary, text_diffs))
+
+    def selected_subdirs(self):
+        ''' Returns the student subdirectories from the Start to End subdirectory entries,
+        (filling in the defaults if they're empty), or None if they aren't a valid range.
+        '''
+        # ERROR CHECKING - start/end sub directories
+        # set some defaults in case they're empty
+        if not self.entry_subdir_start.get(): # empty start dir
+            self.entry_subdir_start.insert(0, gom_utils.get_filename(self.roster[0])) # default start subdir
+        if not self.entry_subdir_end.get(): # empty end dir
+            self.entry_subdir_end.insert(0, gom_utils.get_filename(self.roster[-1])) # default end subdir
+        startdir = self.entry_subdir_start.get()
+        enddir = self.entry_subdir_end.get()
+        # Checking that these subdirs exist in our list from Grade O Matic
+        if startdir not in self.roster:
+            self.status('WARNING', "Starting subdirectory not in our current subdirs: " + startdir)
+            return None
+        elif enddir not in self.roster:
+            self.status('WARNING', "Ending subdirectory not in our current subdirs: " + enddir)
+            return None
+        elif self.roster.index(enddir) < self.roster.index(startdir):
+            self.status('WARNING', "Ending subdirectory needs to come after startdir: " + startdir + ' - ' + enddir)
+            return None
+        return self.roster.range(startdir, enddir)
 
     def remove_comment(self, ind:int): 
         ''' Clears the comment at the given location in the rubric o matic.
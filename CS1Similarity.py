@@ -0,0 +1,119 @@
+'''
+The Similarity module scores many comments against many others at once, by
+the same rules as GradeSheet.get_match_percent: the share of unique words two
+comments have in common (or unique letters, if either has no spaces).
+
+Each comment is tokenized just once. Every word/letter gets an integer id, and
+a comment's set of tokens becomes an int with those bits set, so comparing two
+comments is a single AND and a count of its 1 bits, rather than building and
+intersecting Python sets for every pair. (Counted with bin().count('1'), as
+int.bit_count() needs Python 3.10, and macOS's python3 is 3.9.)
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import CS1GradeOmaticUtils as gom_utils
+
+__all__ = ['TokenBits', 'Vocabulary', 'match_matrix', 'loose_matches']
+
+#############################
+###   VOCABULARY CLASS    ###
+#############################
+class Vocabulary:
+    ''' Gives each token (word or letter) its own integer id, i.e., bit position.
+    '''
+    __slots__ = ['_ids']
+
+    def __init__(self):
+        ''' Creates an empty vocabulary
+        >>> v = Vocabulary()
+        >>> [v.bits(['great', 'work!']), v.bits(['work!']), len(v)]
+        [3, 2, 2]
+        '''
+        self._ids = {} # token -> id
+
+    def bits(self, tokens) -> int:
+        ''' Returns an int with the bit of each token set, adding new tokens as needed
+        '''
+        bits = 0
+        for t in tokens:
+            tid = self._ids.get(t)
+            if tid is None:
+                tid = self._ids[t] = len(self._ids)
+            bits |= 1 << tid
+        return bits
+
+    def __len__(self):
+        ''' Returns the number of tokens given ids '''
+        return len(self._ids)
+
+#############################
+###    TOKENBITS CLASS    ###
+#############################
+class TokenBits:
+    ''' A comment's text, tokenized once: its set of words & its set of letters, as bits.
+    '''
+    __slots__ = ['spaced', 'words', 'num_words', 'letters', 'num_letters']
+
+    def __init__(self, txt:str, vocab:Vocabulary):
+        ''' Tokenizes txt into words (lowercased, split on whitespace) and letters
+        (lowercased, without whitespace), like get_match_percent does
+        >>> tb = TokenBits('Great work, great job', Vocabulary())
+        >>> [tb.spaced, tb.num_words, tb.num_letters]
+        [True, 3, 11]
+        '''
+        lowered = txt.lower()
+        words = set(lowered.split())
+        letters = set(''.join(lowered.split()))
+        self.spaced = ' ' in txt
+        self.words = vocab.bits(words)
+        self.num_words = len(words)
+        self.letters = vocab.bits(letters)
+        self.num_letters = len(letters)
+
+    def match_percent(self, other) -> float:
+        ''' Returns get_match_percent of the two comments' texts, or 0.0 if
+        neither has any tokens to compare
+        >>> v = Vocabulary()
+        >>> TokenBits('A single comment.', v).match_percent(TokenBits('A single comment.', v))
+        1.0
+        >>> TokenBits('AC._match_words', v).match_percent(TokenBits('AutoComplete._match_words()', v))
+        0.8
+        '''
+        if self.spaced and other.spaced: # words in common
+            (common, total) = (self.words & other.words, self.num_words + other.num_words)
+        else: # letters in common
+            (common, total) = (self.letters & other.letters, self.num_letters + other.num_letters)
+        return (bin(common).count('1')*2) / total if total else 0.0
+
+#############################
+###   BATCHED MATCHING    ###
+#############################
+def match_matrix(rows:list, cols:list, vocab=None) -> list:
+    ''' Returns get_match_percent(rows[i], cols[j]) at [i][j] for every pair of
+    texts, tokenizing each text only once (0.0 where neither has any tokens).
+    >>> m = match_matrix(['A single comment.', 'ABCDEFG'], ['A different comment.', 'abcdefg', ''])
+    >>> [[round(p, 2) for p in row] for row in m]
+    [[0.67, 0.42, 0.0], [0.53, 1.0, 0.0]]
+    '''
+    vocab = Vocabulary() if vocab is None else vocab
+    row_bits = [TokenBits(txt, vocab) for txt in rows]
+    col_bits = [TokenBits(txt, vocab) for txt in cols]
+    return [[rb.match_percent(cb) for cb in col_bits] for rb in row_bits]
+
+def loose_matches(rows:list, cols:list, threshold=gom_utils.LOOSE_MATCH) -> list:
+    ''' Returns, for each of the row texts, the (ascending) indices of the column texts
+    it loosely matches (see Comment._loose_equals): more than threshold in common.
+    >>> rubric = ['Needs more comments in the code', 'Great work!']
+    >>> cmnts = ['Needs more comments in your code', 'Great work! Nice job.', 'great  work!', 'Nope']
+    >>> loose_matches(rubric, cmnts)
+    [[0], [2]]
+    '''
+    return [[j for (j, p) in enumerate(row) if p > threshold] for row in match_matrix(rows, cols)]
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,76 @@
+'''
+The TextPatch module updates a tk.Text to hold new text by only changing the
+lines that differ (found with difflib), rather than deleting everything and
+inserting it all back. Tk then only re-lays-out the changed lines, and the
+cursor, scroll position and any marks (see CS1EditJournal) outside of them
+stay where they were.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import difflib
+import CS1GradeOmaticUtils as gom_utils
+import tkinter as tk # abbrev
+
+__all__ = ['line_patches', 'apply_patches', 'patch_text']
+
+def line_patches(old:str, new:str) -> list:
+    ''' Returns the edits that turn old into new as a list of (start index, end index,
+    text to insert) in Tk 'line.column' indices: delete start to end, then insert
+    the text at start. Edits are last-first, so each one's indices are still good
+    after making the ones before it.
+    >>> line_patches('a\\nb\\nc', 'a\\nB\\nc')
+    [('2.0', '2.end', 'B')]
+    >>> line_patches('a\\nb\\nc', 'a\\nc\\nd')
+    [('3.end', '3.end', '\\nd'), ('2.0', '3.0', '')]
+    >>> line_patches('a\\nb', 'x\\na\\nb')
+    [('1.0', '1.0', 'x\\n')]
+    >>> line_patches('same', 'same')
+    []
+    '''
+    old_lines = old.split('\n')
+    new_lines = new.split('\n')
+    patches = []
+    opcodes = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes()
+    for (tag, i1, i2, j1, j2) in reversed(opcodes):
+        txt = '\n'.join(new_lines[j1:j2])
+        if tag == 'equal':
+            continue
+        elif tag == 'replace':
+            patches.append((str(i1+1) + '.0', str(i2) + '.end', txt))
+        elif tag == 'delete' and i2 < len(old_lines): # take the lines' newlines with them
+            patches.append((str(i1+1) + '.0', str(i2+1) + '.0', ''))
+        elif tag == 'delete': # last lines: take the newline before them
+            patches.append((str(i1) + '.end', str(i2) + '.end', ''))
+        elif i1 < len(old_lines): # insert before line i1+1
+            patches.append((str(i1+1) + '.0', str(i1+1) + '.0', txt + '\n'))
+        else: # insert after the last line
+            patches.append((str(i1) + '.end', str(i1) + '.end', '\n' + txt))
+    return patches
+
+def apply_patches(text_widget, patches:list):
+    ''' Makes the given line_patches edits to the text widget
+    '''
+    for (start, end, txt) in patches:
+        if start != end:
+            text_widget.delete(start, end)
+        if txt:
+            text_widget.insert(start, txt)
+
+def patch_text(text_widget, new_txt:str, old_txt=None) -> int:
+    ''' Changes the text widget's contents to new_txt, only touching the lines
+    that are different. old_txt is what's in the text widget now, if already known.
+    Returns the number of edits made.
+    '''
+    if old_txt is None:
+        old_txt = text_widget.get(gom_utils.TEXT_0, tk.END+'-1c')
+    patches = line_patches(old_txt, new_txt)
+    apply_patches(text_widget, patches)
+    return len(patches)
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()
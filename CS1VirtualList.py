@@ -0,0 +1,182 @@
+'''
+The VirtualList module is a scrollable list of buttons (and header labels)
+that only creates widgets for the rows that can be seen, for rubrics with
+hundreds of criteria.
+
+Like the VerticalScrolledFrame, it's a canvas with a vertical scrollbar, but
+rather than one widget per row inside a frame, every row's position is worked
+out from its number of lines of text (the rubric font is monospaced), and a
+small pool of widgets is moved & relabelled to whichever rows are in view as
+the list scrolls. Loading a new set of rows re-uses the same widgets, and
+changing a few rows (replace_rows) only touches those in view at or after them.
+
+Held together by duct tape & if-loops by Iris Howley (2023)
+'''
+import bisect, itertools, textwrap
+import tkinter as tk # abbrev
+from tkinter import font as tkfont
+import CS1GradeOmaticUtils as gom_utils
+
+__all__ = ['VirtualList', 'wrap_text', 'wrap_width', 'row_tops', 'visible_range']
+
+def wrap_text(txt:str, wrap_chars:int) -> str:
+    ''' Returns txt with each of its lines longer than wrap_chars wrapped onto more lines
+    >>> wrap_text('++ Great work, nice job', 10)
+    '++ Great\\nwork, nice\\njob'
+    >>> wrap_text('short\\n  `code`', 10)
+    'short\\n  `code`'
+    '''
+    return '\n'.join(textwrap.fill(line, wrap_chars) if len(line) > wrap_chars else line for line in txt.split('\n'))
+
+def wrap_width(width:int, char_width:int, pad:int, border:int) -> int:
+    ''' Returns how many (monospaced) characters char_width pixels wide fit on a button
+    width pixels wide, with pad pixels of padding and border pixels of border on each side
+    >>> wrap_width(400, 8, 4, 3)
+    48
+    >>> wrap_width(10, 8, 4, 3)
+    1
+    '''
+    return max(1, (width - 2*(pad + border)) // char_width)
+
+def row_tops(heights:list) -> list:
+    ''' Returns the y position of the top of each row, plus the bottom of the last one
+    >>> row_tops([10, 20, 10])
+    [0, 10, 30, 40]
+    '''
+    return [0] + list(itertools.accumulate(heights))
+
+def visible_range(tops:list, y_top:float, y_bottom:float) -> range:
+    ''' Returns the range of rows (given their row_tops) that are at least partly
+    between y_top and y_bottom
+    >>> tops = row_tops([10, 20, 10, 10])
+    >>> list(visible_range(tops, 15, 35))
+    [1, 2]
+    >>> list(visible_range(tops, 0, 1000))
+    [0, 1, 2, 3]
+    '''
+    first = max(bisect.bisect_right(tops, y_top) - 1, 0)
+    last = min(bisect.bisect_left(tops, y_bottom), len(tops) - 1)
+    return range(first, last)
+
+#############################
+###  VIRTUALLIST CLASS    ###
+#############################
+class VirtualList(tk.Frame):
+    ''' Scrollable list of rows: buttons, or header labels, created only when in view.
+    '''
+    __slots__ = ['_canvas', '_width', '_fonts', '_wrap_chars', '_rows', '_heights', '_tops', '_shown', '_pool']
+
+    # (set on every button, rather than left to the platform's defaults, so rows can be sized from them)
+    BUTTON_PADX = 4 # pixels between a button's border and its text, left & right
+    BUTTON_PADY = 2 # ... top & bottom
+    BUTTON_BD = 2 # pixels of a button's border
+    BUTTON_HIGHLIGHT = 1 # pixels of a button's focus highlight, outside its border
+    ROW_PAD = 2 * (BUTTON_PADY + BUTTON_BD + BUTTON_HIGHLIGHT) # pixels above & below a row's text
+
+    def __init__(self, parent, height=gom_utils.RUBRIC_LIST_HEIGHT, width=gom_utils.ENTRY_LG*20,
+                 font=gom_utils.FONT_RUBRIC, header_font=gom_utils.FONT_H2):
+        ''' Creates an empty list, height x width pixels
+        '''
+        tk.Frame.__init__(self, parent)
+        self._width = width
+        self._fonts = {'button': tkfont.Font(font=font), 'label': tkfont.Font(font=header_font)}
+        self._wrap_chars = wrap_width(width, self._fonts['button'].measure('0'), VirtualList.BUTTON_PADX,
+                                      VirtualList.BUTTON_BD + VirtualList.BUTTON_HIGHLIGHT)
+        self._rows = [] # (display text, command, or None for a header)
+        self._heights = [] # of each row, in pixels
+        self._tops = [0]
+        self._shown = {} # row -> (kind, widget, canvas window id)
+        self._pool = {'button': [], 'label': []} # (widget, canvas window id) not in use
+
+        vscrollbar = tk.Scrollbar(self, orient=tk.VERTICAL)
+        vscrollbar.pack(fill=tk.Y, side=tk.RIGHT, expand=tk.FALSE)
+        def _yscroll(first, last): # view changed: scrolled or resized
+            vscrollbar.set(first, last)
+            self._refresh()
+        self._canvas = tk.Canvas(self, bd=0, highlightthickness=0, height=height, width=width, yscrollcommand=_yscroll)
+        self._canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=tk.TRUE)
+        vscrollbar.config(command=self._canvas.yview)
+        self._canvas.bind('<MouseWheel>', self._on_mousewheel)
+
+    def set_rows(self, rows:list):
+        ''' Replaces the list's rows with rows, a list of (text, command) for a button,
+        or (text, None) for a header label, and scrolls back to the top
+        '''
+        self.replace_rows(0, len(self._rows), rows)
+        self._canvas.yview_moveto(0)
+
+    def replace_rows(self, start:int, end:int, rows:list):
+        ''' Replaces rows start up to (not including) end with rows, a list of
+        (text, command) like set_rows. Only the widgets in view from start on change.
+        '''
+        for row in [r for r in self._shown if r >= start]: # moved or replaced
+            self._hide(row)
+        rows = [(wrap_text(txt, self._wrap_chars) if cmd else txt, cmd) for (txt, cmd) in rows]
+        heights = []
+        for (txt, cmd) in rows:
+            kind = 'button' if cmd else 'label'
+            heights.append((txt.count('\n')+1) * self._fonts[kind].metrics('linespace') + VirtualList.ROW_PAD)
+        self._rows[start:end] = rows
+        self._heights[start:end] = heights
+        self._tops = row_tops(self._heights)
+        self._canvas.config(scrollregion=(0, 0, self._width, self._tops[-1]))
+        self._refresh()
+
+    def _refresh(self):
+        ''' Shows the rows in view, and hides (recycles) the ones that aren't
+        '''
+        y_top = self._canvas.canvasy(0)
+        in_view = visible_range(self._tops, y_top, y_top + self._canvas.winfo_height())
+        for row in [r for r in self._shown if r not in in_view]:
+            self._hide(row)
+        for row in in_view:
+            if row not in self._shown:
+                self._show(row)
+
+    def _show(self, row:int):
+        ''' Puts a (recycled, if possible) widget at the given row
+        '''
+        (txt, cmd) = self._rows[row]
+        kind = 'button' if cmd else 'label'
+        if self._pool[kind]:
+            (widget, window) = self._pool[kind].pop()
+        else:
+            if cmd:
+                widget = tk.Button(self._canvas, justify=tk.LEFT, anchor='w', font=self._fonts[kind],
+                                   padx=VirtualList.BUTTON_PADX, pady=VirtualList.BUTTON_PADY,
+                                   bd=VirtualList.BUTTON_BD, highlightthickness=VirtualList.BUTTON_HIGHLIGHT)
+            else:
+                widget = tk.Label(self._canvas, fg='#666', font=self._fonts[kind])
+            widget.bind('<MouseWheel>', self._on_mousewheel)
+            window = self._canvas.create_window(0, 0, window=widget, anchor=tk.NW, width=self._width)
+        widget.config(text=txt)
+        if cmd:
+            widget.config(command=cmd)
+        self._canvas.coords(window, 0, self._tops[row])
+        self._canvas.itemconfigure(window, height=self._tops[row+1] - self._tops[row], state=tk.NORMAL)
+        self._shown[row] = (kind, widget, window)
+
+    def _hide(self, row:int):
+        ''' Hides the widget at the given row, keeping it to re-use
+        '''
+        (kind, widget, window) = self._shown.pop(row)
+        self._canvas.itemconfigure(window, state=tk.HIDDEN)
+        self._pool[kind].append((widget, window))
+
+    def _on_mousewheel(self, event):
+        ''' Scrolls this list (rather than the whole window)
+        '''
+        self._canvas.yview_scroll(int(-1*(event.delta)), "units")
+        return 'break'
+
+    def __len__(self):
+        ''' Returns the number of rows '''
+        return len(self._rows)
+
+#############################
+###         main()        ###
+#############################
+if __name__ == '__main__':
+    print("-=-=- Doctests of basic functions -=-=-")
+    import doctest
+    doctest.testmod()